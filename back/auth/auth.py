@@ -1,21 +1,24 @@
+import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 import jwt
 from fastapi import Depends,HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
 from back.schemas import UserInDB, TokenData
 from back import models
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from back.database import get_db
+from back.auth import hashing
+from back.auth.hashing import pwd_context, password_hasher, HashingQueueFull
+from back.auth.principal_cache import Principal, principal_cache
 
 
 SECRET_KEY = "love_penises"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 def verify_password(plain_password, hashed_password):
@@ -24,14 +27,32 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def get_user(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+async def _offload_hashing(func, *args):
+    try:
+        return await password_hasher.run(func, *args)
+    except HashingQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис перегружен, повторите попытку позже",
+        )
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _offload_hashing(hashing.verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    return await _offload_hashing(hashing.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _offload_hashing(hashing.hash_password, password)
+
+async def get_user(db: AsyncSession, username: str):
+    return await db.scalar(select(models.User).where(models.User.username == username))
 
-def authenticate_user(username: str, password: str, db: Session = Depends(get_db)):
-    user = get_user(db, username)
+async def authenticate_user(username: str, password: str, db: AsyncSession = Depends(get_db)):
+    user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -42,25 +63,42 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str, scope: str | None = None) -> dict:
+    """Проверяет подпись и срок токена. Токен с ограниченной областью (scope),
+    например билет ленты изменений, не принимается вместо обычного и наоборот."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
     except InvalidTokenError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+        raise credentials_exception()
+    if payload.get("sub") is None or payload.get("scope") != scope:
+        raise credentials_exception()
+    return payload
+
+async def load_principal(payload: dict, db: AsyncSession) -> Principal:
+    token_data = TokenData(username=payload["sub"])
+    cache_key = (token_data.username, payload.get("jti"))
+    principal = await principal_cache.get(cache_key)
+    if principal is not None:
+        return principal
+    generation = await principal_cache.generation(token_data.username)
+    user = await get_user(db, token_data.username)
     if user is None:
         print(f"Пользователь не найден: {token_data.username}")
-        raise credentials_exception
-    return user
+        raise credentials_exception()
+    principal = Principal.from_user(user)
+    principal_cache.set(cache_key, principal, payload.get("exp"), generation)
+    return principal
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession = Depends(get_db)):
+    return await load_principal(decode_token(token), db)
@@ -5,24 +5,27 @@ from fastapi import APIRouter
 from fastapi.security import OAuth2PasswordRequestForm
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from back import schemas, models
 from back.auth import auth
 from back.auth.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from back.auth.hashing import PASSWORD_REHASH_ON_LOGIN
+from back.compression import route_compression
 from back.database import get_db
 from back.schemas import User
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Такое имя уже существует"
         )
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await auth.get_password_hash_async(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -31,14 +34,30 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         company_id=user.company_id
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+# Токен в ответе нельзя сжимать: длина сжатого ответа выдавала бы его (BREACH)
+@route_compression(enabled=False)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await auth.get_user(db, form_data.username)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверное имя или пароль",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if PASSWORD_REHASH_ON_LOGIN:
+        verified, new_hash = await auth.verify_and_update_password_async(form_data.password, user.hashed_password)
+        if verified and new_hash:
+            # Пароль захеширован устаревшими параметрами CryptContext - обновляем хеш
+            user.hashed_password = new_hash
+            await db.commit()
+    else:
+        verified = await auth.verify_password_async(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверное имя или пароль",
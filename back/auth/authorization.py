@@ -0,0 +1,147 @@
+"""Контекст авторизации изменяющих маршрутов.
+
+Роль и компания берутся из Principal (кэш пользователей), а целевая сущность
+загружается одним запросом вместе со всем, что нужно для проверок прав: проектом
+дефекта, текущим и назначаемым исполнителем. Загруженные объекты попадают в
+identity map сессии, поэтому последующие flush и учёт версий компаний не ходят
+за ними в БД повторно.
+"""
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from back import models
+from back.auth import auth
+from back.auth.principal_cache import Principal
+from back.database import get_db
+
+
+@dataclass
+class DefectAccess:
+    principal: Principal
+    defect: models.Defect
+    project: models.Project | None
+    engineer: models.User | None = None
+
+    @property
+    def manages_project(self) -> bool:
+        return self.project is not None and self.project.user_manager_id == self.principal.id
+
+
+@dataclass
+class ProjectAccess:
+    principal: Principal
+    project: models.Project
+    manager: models.User | None
+    # Запрошенные пользователи нужной роли и те из них, кто уже в команде проекта
+    targets: dict[int, models.User] = field(default_factory=dict)
+    linked_target_ids: set[int] = field(default_factory=set)
+    engineers: list[models.User] = field(default_factory=list)
+
+    @property
+    def manages_project(self) -> bool:
+        return self.project.user_manager_id == self.principal.id
+
+
+class AuthorizationContext:
+    def __init__(self, db: AsyncSession, principal: Principal):
+        self.db = db
+        self.principal = principal
+
+    @property
+    def is_manager(self) -> bool:
+        return self.principal.role == models.UserRole.MANAGER
+
+    async def defect(self, defect_id: int, engineer_id: int | None = None) -> DefectAccess:
+        """Дефект, его проект и исполнитель, а также инженер engineer_id, если он есть."""
+        current_engineer = aliased(models.User, name="current_engineer")
+        query = (
+            select(models.Defect, models.Project, current_engineer)
+            .outerjoin(models.Project, models.Project.id == models.Defect.project_id)
+            .outerjoin(current_engineer, current_engineer.id == models.Defect.user_engineer_id)
+            .where(models.Defect.id == defect_id)
+        )
+        if engineer_id is not None:
+            target = aliased(models.User, name="target")
+            query = query.add_columns(target).outerjoin(target, and_(
+                target.id == engineer_id,
+                target.role == models.UserRole.ENGINEER,
+            ))
+
+        row = (await self.db.execute(query)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Дефект не найден")
+        return DefectAccess(
+            principal=self.principal,
+            defect=row.Defect,
+            project=row.Project,
+            engineer=row.target if engineer_id is not None else None,
+        )
+
+    async def project(
+            self,
+            project_id: int,
+            target_ids: Iterable[int] = (),
+            target_role: models.UserRole | None = None,
+            with_engineers: bool = False,
+    ) -> ProjectAccess:
+        """Проект с менеджером; target_ids - пользователи target_role с признаком членства
+        в команде, with_engineers - текущая команда проекта.
+
+        Цели и команда - два независимых соединения «один ко многим» с проектом, и в
+        одном запросе дали бы их произведение. Поэтому при обоих команда читается
+        вторым запросом."""
+        manager = aliased(models.User, name="manager")
+        query = (
+            select(models.Project, manager)
+            .outerjoin(manager, manager.id == models.Project.user_manager_id)
+            .where(models.Project.id == project_id)
+        )
+        target_ids = list(target_ids)
+        if target_ids:
+            target = aliased(models.User, name="target")
+            link = models.projects_engineers.alias("target_link")
+            query = query.add_columns(target, link.c.user_engineer_id.label("linked_id")).outerjoin(
+                target, and_(target.id.in_(target_ids), target.role == target_role)
+            ).outerjoin(link, and_(link.c.project_id == models.Project.id, link.c.user_engineer_id == target.id))
+        team_joined = with_engineers and not target_ids
+        if team_joined:
+            engineer = aliased(models.User, name="engineer")
+            team = models.projects_engineers.alias("team")
+            query = query.add_columns(engineer).outerjoin(
+                team, team.c.project_id == models.Project.id
+            ).outerjoin(engineer, engineer.id == team.c.user_engineer_id).order_by(engineer.id)
+
+        rows = (await self.db.execute(query)).all()
+        if not rows:
+            raise HTTPException(status_code=404, detail="Проект не найден")
+
+        access = ProjectAccess(principal=self.principal, project=rows[0].Project, manager=rows[0].manager)
+        seen_engineers = set()
+        for row in rows:
+            if target_ids and row.target is not None:
+                access.targets[row.target.id] = row.target
+                if row.linked_id is not None:
+                    access.linked_target_ids.add(row.target.id)
+            if team_joined and row.engineer is not None and row.engineer.id not in seen_engineers:
+                seen_engineers.add(row.engineer.id)
+                access.engineers.append(row.engineer)
+        if with_engineers and not team_joined:
+            access.engineers = list((await self.db.scalars(
+                select(models.User)
+                .join(models.projects_engineers, models.projects_engineers.c.user_engineer_id == models.User.id)
+                .where(models.projects_engineers.c.project_id == project_id)
+                .order_by(models.User.id)
+            )).all())
+        return access
+
+
+async def get_authorization_context(
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(auth.get_current_user),
+) -> AuthorizationContext:
+    return AuthorizationContext(db, current_user)
@@ -0,0 +1,117 @@
+"""Кэш аутентифицированных пользователей между запросами.
+
+Запись хранит поколение пользователя из бэкенда кэша чтения на момент загрузки.
+Смена роли или компании повышает поколение (invalidate_user), и при следующем
+обращении запись в любом воркере перестаёт совпадать. Поколения в памяти процесса
+другие воркеры не видят, поэтому без Redis при нескольких воркерах кэш выключен.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from back import models
+from back.cache import ReadCache, read_cache
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_MAX_TTL = float(os.getenv("PRINCIPAL_CACHE_MAX_TTL", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+def principal_namespace(username: str) -> str:
+    return f"principal:{username}"
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    username: str
+    email: str
+    role: models.UserRole
+    company_id: int | None
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            company_id=user.company_id,
+        )
+
+
+class PrincipalCache:
+    def __init__(self, cache: ReadCache, max_size: int, max_ttl: float):
+        self.cache = cache
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        # Ключ - (username, jti) токена; значение - (пользователь, срок, поколение)
+        self._entries: OrderedDict[tuple, tuple[Principal, float, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache.shared
+
+    async def generation(self, username: str) -> int | None:
+        """Поколение пользователя; читается до загрузки из БД, как в ReadCache."""
+        if not self.enabled:
+            return None
+        return await self.cache.version(principal_namespace(username))
+
+    async def get(self, key: tuple) -> Principal | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        principal, expires_at, generation = entry
+        if expires_at <= time.time() or await self.generation(principal.username) != generation:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return principal
+
+    def set(self, key: tuple, principal: Principal, token_exp: float | None, generation: int | None):
+        # Без поколения (кэш выключен или бэкенд недоступен) сброс записи не увидеть
+        if generation is None:
+            return
+        expires_at = time.time() + self.max_ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self._entries[key] = (principal, expires_at, generation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def invalidate_user(self, *usernames: str):
+        """Вызывается после коммита, изменившего роль или компанию пользователей."""
+        await self.cache.invalidate(*(principal_namespace(username) for username in usernames))
+        self.invalidated += len(usernames)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidated": self.invalidated,
+        }
+
+
+principal_cache = PrincipalCache(read_cache, max_size=PRINCIPAL_CACHE_SIZE, max_ttl=PRINCIPAL_CACHE_MAX_TTL)
+if not principal_cache.enabled:
+    logger.warning("Кэш пользователей выключен: несколько воркеров без общего бэкенда кэша (REDIS_URL)")
@@ -0,0 +1,110 @@
+import random
+from dataclasses import dataclass
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Connection
+
+from back.auth.hashing import hash_password
+from back.counters import recount_counters
+from back.models import Company, User, Project, Defect, UserRole, projects_engineers
+
+BENCHMARK_PASSWORD = "password"
+
+DEFECT_WORDS = [
+    "трещина в стяжке",
+    "протечка кровли",
+    "откос окна не заделан",
+    "отслоение штукатурки",
+    "неровность стены",
+    "скол плитки",
+    "протечка под мойкой",
+    "трещина в откосе",
+]
+
+
+@dataclass
+class DatasetSize:
+    companies: int = 10
+    users_per_company: int = 50
+    projects_per_company: int = 20
+    defects_per_project: int = 50
+    engineers_per_project: int = 5
+
+
+def seed_dataset(connection: Connection, size: DatasetSize, seed: int = 42) -> dict:
+    """Заполняет пустую БД синтетическими данными пакетными INSERT'ами.
+
+    В каждой компании один клиент, примерно десятая часть менеджеров, остальные инженеры.
+    Возвращает имена пользователей по ролям, чтобы нагрузочные сценарии могли войти в систему.
+    """
+    rng = random.Random(seed)
+    hashed_password = hash_password(BENCHMARK_PASSWORD)
+    accounts = {role: [] for role in UserRole}
+
+    connection.execute(insert(User), [{
+        "username": "bench_admin",
+        "email": "bench_admin@bench.yugstroyinvest.ru",
+        "hashed_password": hashed_password,
+        "role": UserRole.ADMIN,
+        "company_id": None,
+    }])
+    accounts[UserRole.ADMIN].append("bench_admin")
+
+    connection.execute(insert(Company), [{"name": f"Компания {c}"} for c in range(size.companies)])
+    company_ids = connection.execute(select(Company.id).order_by(Company.id)).scalars().all()
+
+    managers_per_company = max(1, size.users_per_company // 10)
+    for company_id in company_ids:
+        users = []
+        for u in range(size.users_per_company):
+            if u == 0:
+                role = UserRole.CLIENT
+            elif u <= managers_per_company:
+                role = UserRole.MANAGER
+            else:
+                role = UserRole.ENGINEER
+            username = f"c{company_id}_{role.value}_{u}"
+            users.append({
+                "username": username,
+                "email": f"{username}@bench.yugstroyinvest.ru",
+                "hashed_password": hashed_password,
+                "role": role,
+                "company_id": company_id,
+            })
+            accounts[role].append(username)
+        connection.execute(insert(User), users)
+
+        rows = connection.execute(
+            select(User.id, User.role).where(User.company_id == company_id)
+        ).all()
+        manager_ids = [r.id for r in rows if r.role == UserRole.MANAGER]
+        engineer_ids = [r.id for r in rows if r.role == UserRole.ENGINEER]
+
+        connection.execute(insert(Project), [{
+            "name": f"Объект {company_id}-{p}",
+            "company_id": company_id,
+            "user_manager_id": rng.choice(manager_ids),
+        } for p in range(size.projects_per_company)])
+        project_ids = connection.execute(
+            select(Project.id).where(Project.company_id == company_id)
+        ).scalars().all()
+
+        if engineer_ids:
+            links = []
+            for project_id in project_ids:
+                for engineer_id in rng.sample(engineer_ids, min(size.engineers_per_project, len(engineer_ids))):
+                    links.append({"project_id": project_id, "user_engineer_id": engineer_id})
+            connection.execute(insert(projects_engineers), links)
+
+        defects = [{
+            "name": f"Дефект {project_id}-{d}: {rng.choice(DEFECT_WORDS)}",
+            "project_id": project_id,
+            "user_engineer_id": rng.choice(engineer_ids) if engineer_ids else None,
+        } for project_id in project_ids for d in range(size.defects_per_project)]
+        if defects:
+            connection.execute(insert(Defect), defects)
+
+    # Core INSERT'ы идут мимо слушателей сессии, счётчики выставляются одним пересчётом
+    recount_counters(connection)
+    return {role.value: names for role, names in accounts.items()}
+
@@ -0,0 +1,127 @@
+"""Проверка планов всех сочетаний фильтров и сортировок списков дефектов и проектов.
+
+Каждое сочетание (back.list_filters) должно искать по индексу, а не просматривать
+таблицу целиком. На PostgreSQL последовательный просмотр отключается на время
+проверки (enable_seqscan = off): на маленьком наборе он дешевле индекса, и план
+показал бы не то, что будет на миллионах строк. Скрипт завершается с кодом 1,
+если хотя бы одно сочетание идёт полным просмотром.
+
+Запуск:
+    python -m back.benchmarks.filter_plans --database-url sqlite:///./bench_filters.db
+"""
+import argparse
+import itertools
+import json
+import sys
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.engine import Connection
+
+from back.benchmarks.dataset import DatasetSize, seed_dataset
+from back.benchmarks.query_plans import explain
+from back.database import Base
+from back.list_filters import SORT_KEYS, defect_list_query, project_list_query
+from back.models import Defect, Project, User, UserRole, projects_engineers
+from back.pagination import encode_cursor
+
+LIST_LIMIT = 101
+
+
+def cursor_for(sort: str) -> str:
+    return encode_cursor([1] if sort.lstrip("-") == "id" else ["Дефект", 1])
+
+
+def filter_combinations(engineer_id: int, company_id: int, project_id: int, manager_id: int) -> dict:
+    queries = {}
+    for project, prefix, sort, paged in itertools.product((None, project_id), (None, "Дефект"), SORT_KEYS, (False, True)):
+        name = f"my_defects project={project is not None} prefix={prefix is not None} sort={sort} cursor={paged}"
+        queries[name] = defect_list_query(
+            engineer_id, project_id=project, name_prefix=prefix, sort=sort, cursor=cursor_for(sort) if paged else None
+        ).limit(LIST_LIMIT)
+    for manager, engineer, prefix, sort, paged in itertools.product(
+            (None, manager_id), (None, engineer_id), (None, "Объект"), SORT_KEYS, (False, True)):
+        name = (f"my_projects manager={manager is not None} engineer={engineer is not None} "
+                f"prefix={prefix is not None} sort={sort} cursor={paged}")
+        queries[name] = project_list_query(
+            company_id, manager_id=manager, engineer_id=engineer, name_prefix=prefix,
+            sort=sort, cursor=cursor_for(sort) if paged else None,
+        ).limit(LIST_LIMIT)
+    return queries
+
+
+def full_scans(dialect: str, plan: list[str]) -> list[str]:
+    if dialect == "sqlite":
+        # SEARCH - поиск по индексу, SCAN - просмотр всей таблицы или всего индекса
+        return [line for line in plan if line.startswith("SCAN ")]
+    return [line.strip() for line in plan if "Seq Scan" in line]
+
+
+def check_filter_plans(connection: Connection) -> dict:
+    engineer_id, project_id = connection.execute(
+        select(Defect.user_engineer_id, Defect.project_id)
+        .join(projects_engineers, projects_engineers.c.user_engineer_id == Defect.user_engineer_id)
+        .where(Defect.user_engineer_id.is_not(None))
+        .limit(1)
+    ).one()
+    company_id = connection.scalar(select(User.company_id).where(User.id == engineer_id))
+    manager_id = connection.scalar(select(Project.user_manager_id).where(
+        Project.company_id == company_id, Project.user_manager_id.is_not(None)).limit(1))
+    queries = filter_combinations(engineer_id, company_id, project_id, manager_id)
+
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.execute(text("ANALYZE"))
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+
+    report = {}
+    for name, statement in queries.items():
+        plan, elapsed_ms = explain(connection, statement)
+        report[name] = {"plan": plan, "elapsed_ms": round(elapsed_ms, 3), "full_scans": full_scans(dialect, plan)}
+    return report
+
+
+def run_filter_plans(database_url: str, size: DatasetSize) -> dict:
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    try:
+        with engine.begin() as connection:
+            seed_dataset(connection, size)
+            return check_filter_plans(connection)
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_filters.db")
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--users-per-company", type=int, default=50)
+    parser.add_argument("--projects-per-company", type=int, default=20)
+    parser.add_argument("--defects-per-project", type=int, default=50)
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    args = parser.parse_args()
+
+    report = run_filter_plans(args.database_url, DatasetSize(
+        companies=args.companies,
+        users_per_company=args.users_per_company,
+        projects_per_company=args.projects_per_company,
+        defects_per_project=args.defects_per_project,
+    ))
+    for name, entry in report.items():
+        status = "ПОЛНЫЙ ПРОСМОТР" if entry["full_scans"] else "индекс"
+        print(f"{name:<80} {status:<16} {entry['elapsed_ms']:>8.3f} ms  {' | '.join(entry['plan'])}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = [name for name, entry in report.items() if entry["full_scans"]]
+    if failed:
+        print(f"Полным просмотром идут {len(failed)} сочетаний из {len(report)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""Нагрузочный прогон всех маршрутов auth, company, project и defect.
+
+Приложение запускается в процессе через httpx.ASGITransport поверх отдельной базы,
+заполненной синтетическими данными. Для каждого маршрута считаются задержки
+p50/p95/p99, число SQL-запросов на запрос и ошибки, для всего прогона - пропускная способность.
+
+Запуск:
+    python -m back.benchmarks.load --database-url sqlite:///./bench_load.db --output bench_baseline.json
+    python -m back.benchmarks.load --database-url sqlite:///./bench_load.db --compare bench_baseline.json
+
+Для PostgreSQL укажите URL пустой базы: таблицы создаются и удаляются скриптом.
+"""
+import argparse
+import asyncio
+import json
+import math
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from back.auth.auth_routes import router as auth_router
+from back.benchmarks.dataset import BENCHMARK_PASSWORD, DatasetSize, seed_dataset
+from back.company.company_crud_routes import router as company_router
+from back.company.snapshot_store import snapshot_store
+from back.database import Base, TrackedAsyncSession, get_db, get_session_factory, read_router, read_session_factory, to_async_url
+from back.defect.defect_crud_routes import router as defect_router
+from back.feed.change_feed import change_feed
+from back.main import app
+from back.metrics.queries import track_queries
+from back.models import Company, Defect, Project, User, UserRole
+from back.project.project_crud_routes import router as project_router
+from back.search.search_routes import router as search_router
+
+BENCHMARKED_ROUTERS = (auth_router, company_router, project_router, defect_router, search_router)
+BULK_DEFECTS = 50
+IMPORTED_USERS = 20
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def expected_routes() -> set[str]:
+    return {
+        f"{method} {route.path}"
+        for router in BENCHMARKED_ROUTERS
+        for route in router.routes
+        for method in route.methods
+    }
+
+
+@dataclass
+class RouteStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    queries: list[int] = field(default_factory=list)
+    errors: int = 0
+
+    def observe(self, elapsed_ms: float, queries: int, failed: bool):
+        self.latencies_ms.append(elapsed_ms)
+        self.queries.append(queries)
+        if failed:
+            self.errors += 1
+
+    def summary(self) -> dict:
+        count = len(self.latencies_ms)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "latency_ms_p50": round(percentile(self.latencies_ms, 50), 3),
+            "latency_ms_p95": round(percentile(self.latencies_ms, 95), 3),
+            "latency_ms_p99": round(percentile(self.latencies_ms, 99), 3),
+            "latency_ms_max": round(max(self.latencies_ms, default=0.0), 3),
+            "queries_per_request": round(sum(self.queries) / count, 2) if count else 0.0,
+            "queries_max": max(self.queries, default=0),
+        }
+
+
+@dataclass
+class CompanyFixture:
+    company_id: int
+    manager_id: int
+    manager_username: str
+    engineer_id: int
+    engineer_username: str
+    client_username: str
+    project_id: int
+    defect_id: int
+    tokens: dict = field(default_factory=dict)
+
+
+class BenchClient:
+    """Обёртка над httpx-клиентом, замеряющая каждый запрос под именем маршрута."""
+
+    def __init__(self, client: httpx.AsyncClient, session_factory: async_sessionmaker):
+        self.client = client
+        self.session_factory = session_factory
+        self.stats: dict[str, RouteStats] = {}
+
+    async def call(self, route: str, token: str | None = None, **kwargs) -> httpx.Response:
+        method, _, path = route.partition(" ")
+        url = kwargs.pop("url", path)
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        with track_queries() as queries:
+            started = time.perf_counter()
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            await response.aread()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats.setdefault(route, RouteStats()).observe(elapsed_ms, queries.count, response.status_code >= 400)
+        return response
+
+    async def lookup(self, statement):
+        """Служебный запрос к базе в обход API; в статистику не попадает."""
+        async with self.session_factory() as session:
+            return await session.scalar(statement)
+
+    async def cleanup(self, statement):
+        """Служебная запись в обход API, возвращает базу к исходному объёму."""
+        async with self.session_factory() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    async def login(self, username: str) -> str:
+        response = await self.client.post("/auth/token", data={"username": username, "password": BENCHMARK_PASSWORD})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+async def auth_scenario(bench: BenchClient, fixture: CompanyFixture, admin_token: str):
+    await bench.call("POST /auth/token", data={"username": fixture.client_username, "password": BENCHMARK_PASSWORD})
+    await bench.call("GET /auth/users/me/", fixture.tokens[UserRole.CLIENT])
+
+    name = f"bench_{uuid.uuid4().hex[:12]}"
+    await bench.call("POST /auth/register", json={
+        "username": name,
+        "email": f"{name}@bench.yugstroyinvest.ru",
+        "password": BENCHMARK_PASSWORD,
+        "role": UserRole.ENGINEER.value,
+    })
+    user_id = await bench.lookup(select(User.id).where(User.username == name))
+    await bench.call("POST /company/{company_id}/users", admin_token,
+                     url=f"/company/{fixture.company_id}/users", json={"user_id": user_id})
+    await bench.call("DELETE /company/{company_id}/users/{user_id}", admin_token,
+                     url=f"/company/{fixture.company_id}/users/{user_id}")
+
+
+async def company_scenario(bench: BenchClient, fixture: CompanyFixture, admin_token: str):
+    await bench.call("GET /company/all", admin_token)
+    await bench.call("GET /company/my-companies", fixture.tokens[UserRole.MANAGER],
+                     params={"company_id": fixture.company_id})
+    await bench.call("GET /company/my-companies?stream=true", fixture.tokens[UserRole.MANAGER],
+                     url="/company/my-companies", params={"company_id": fixture.company_id, "stream": "true"})
+
+    name = f"Бенчмарк {uuid.uuid4().hex[:12]}"
+    await bench.call("POST /company/create", admin_token, json={"name": name})
+    company_id = await bench.lookup(select(Company.id).where(Company.name == name))
+    await bench.call("DELETE /company/{company_id}", admin_token, url=f"/company/{company_id}")
+
+    batch = f"bench_import_{uuid.uuid4().hex[:12]}"
+    rows = "".join(
+        f"{batch}_{i},{batch}_{i}@bench.yugstroyinvest.ru,{BENCHMARK_PASSWORD},engineer\n" for i in range(IMPORTED_USERS)
+    )
+    await bench.call("POST /company/{company_id}/users/import", admin_token,
+                     url=f"/company/{fixture.company_id}/users/import",
+                     content=("username,email,password,role\n" + rows).encode(),
+                     headers={"Content-Type": "text/csv"})
+    await bench.cleanup(delete(User).where(User.username.startswith(batch)))
+
+
+async def project_scenario(bench: BenchClient, fixture: CompanyFixture, admin_token: str):
+    manager_token = fixture.tokens[UserRole.MANAGER]
+    await bench.call("GET /project/my-projects", manager_token)
+    await bench.call("GET /project/my-projects/{project_id}", manager_token,
+                     url=f"/project/my-projects/{fixture.project_id}")
+
+    name = f"Бенчмарк {uuid.uuid4().hex[:12]}"
+    await bench.call("POST /project", admin_token, json={"name": name, "company_id": fixture.company_id})
+    project_id = await bench.lookup(select(Project.id).where(Project.name == name))
+    await bench.call("PATCH /project/{project_id}/assign-manager", admin_token,
+                     url=f"/project/{project_id}/assign-manager", json={"manager_id": fixture.manager_id})
+    await bench.call("DELETE /project/{project_id}/manager", admin_token, url=f"/project/{project_id}/manager")
+    engineers = {"engineer_ids": [fixture.engineer_id]}
+    await bench.call("POST /project/{project_id}/engineers", admin_token,
+                     url=f"/project/{project_id}/engineers", json=engineers)
+    await bench.call("DELETE /project/{project_id}/engineers", admin_token,
+                     url=f"/project/{project_id}/engineers", json=engineers)
+    await bench.call("DELETE /project/{project_id}", admin_token, url=f"/project/{project_id}")
+
+
+async def defect_scenario(bench: BenchClient, fixture: CompanyFixture, admin_token: str):
+    engineer_token = fixture.tokens[UserRole.ENGINEER]
+    await bench.call("GET /defect/my-defects", engineer_token)
+    await bench.call("GET /defect/my-defects/{defect_id}", engineer_token,
+                     url=f"/defect/my-defects/{fixture.defect_id}")
+
+    name = f"Бенчмарк {uuid.uuid4().hex[:12]}"
+    await bench.call("POST /defect", engineer_token, json={"name": name, "project_id": fixture.project_id})
+    defect_id = await bench.lookup(select(Defect.id).where(Defect.name == name))
+    await bench.call("DELETE /defect/{defect_id}/remove-engineer", admin_token,
+                     url=f"/defect/{defect_id}/remove-engineer")
+    await bench.call("PATCH /defect/defects/{defect_id}/assign-engineer", admin_token,
+                     url=f"/defect/defects/{defect_id}/assign-engineer", json={"engineer_id": fixture.engineer_id})
+    await bench.call("DELETE /defect/{defect_id}", engineer_token, url=f"/defect/{defect_id}")
+
+    batch = f"Бенчмарк пакет {uuid.uuid4().hex[:12]}"
+    await bench.call("POST /defect/bulk", engineer_token, json={"defects": [
+        {"name": f"{batch} {i}", "project_id": fixture.project_id} for i in range(BULK_DEFECTS)
+    ]})
+    await bench.cleanup(delete(Defect).where(Defect.name.startswith(batch)))
+
+
+async def search_scenario(bench: BenchClient, fixture: CompanyFixture, admin_token: str):
+    manager_token = fixture.tokens[UserRole.MANAGER]
+    # Префикс, полное слово и слово с опечаткой
+    for query in ("трещ", "протечка кровли", "откас"):
+        await bench.call("GET /search", manager_token, params={"q": query})
+
+
+SCENARIOS = {
+    "auth": auth_scenario,
+    "company": company_scenario,
+    "project": project_scenario,
+    "defect": defect_scenario,
+    "search": search_scenario,
+}
+
+
+def load_fixtures(connection) -> list[CompanyFixture]:
+    """По каждой компании выбирает менеджера с проектом и инженера с дефектом в этом проекте."""
+    fixtures = []
+    for company_id in connection.execute(select(Company.id).order_by(Company.id)).scalars():
+        row = connection.execute(
+            select(Project.id, Project.user_manager_id, Defect.id.label("defect_id"), Defect.user_engineer_id)
+            .join(Defect, Defect.project_id == Project.id)
+            .where(
+                Project.company_id == company_id,
+                Project.user_manager_id.is_not(None),
+                Defect.user_engineer_id.is_not(None),
+            )
+            .order_by(Project.id, Defect.id)
+            .limit(1)
+        ).first()
+        client_username = connection.scalar(
+            select(User.username).where(User.company_id == company_id, User.role == UserRole.CLIENT).limit(1)
+        )
+        if row is None or client_username is None:
+            continue
+        usernames = dict(connection.execute(
+            select(User.id, User.username).where(User.id.in_([row.user_manager_id, row.user_engineer_id]))
+        ).all())
+        fixtures.append(CompanyFixture(
+            company_id=company_id,
+            manager_id=row.user_manager_id,
+            manager_username=usernames[row.user_manager_id],
+            engineer_id=row.user_engineer_id,
+            engineer_username=usernames[row.user_engineer_id],
+            client_username=client_username,
+            project_id=row.id,
+            defect_id=row.defect_id,
+        ))
+    return fixtures
+
+
+async def run_load(async_url: str, fixtures: list[CompanyFixture], scenarios: list[str],
+                   concurrency: int, iterations: int) -> tuple[dict[str, RouteStats], float]:
+    bench_engine = create_async_engine(async_url)
+    session_factory = async_sessionmaker(bind=bench_engine, class_=TrackedAsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def bench_get_db():
+        async with session_factory() as db:
+            try:
+                yield db
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    previous_overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    previous_snapshot_factory = snapshot_store.session_factory
+    snapshot_store.session_factory = session_factory
+    previous_read_factory = read_router.primary.session_factory
+    read_router.primary.session_factory = read_session_factory(bench_engine)
+    try:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            bench = BenchClient(client, session_factory)
+            admin_token = await bench.login("bench_admin")
+            for fixture in fixtures:
+                fixture.tokens = {
+                    UserRole.MANAGER: await bench.login(fixture.manager_username),
+                    UserRole.ENGINEER: await bench.login(fixture.engineer_username),
+                    UserRole.CLIENT: await bench.login(fixture.client_username),
+                }
+
+            async def worker(index: int):
+                fixture = fixtures[index % len(fixtures)]
+                for _ in range(iterations):
+                    for name in scenarios:
+                        await SCENARIOS[name](bench, fixture, admin_token)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous_overrides)
+        snapshot_store.session_factory = previous_snapshot_factory
+        read_router.primary.session_factory = previous_read_factory
+        # События прогона относятся к его собственной БД
+        change_feed.clear()
+        await bench_engine.dispose()
+
+    return bench.stats, elapsed
+
+
+def build_report(stats: dict[str, RouteStats], elapsed: float, meta: dict) -> dict:
+    total = RouteStats()
+    for route_stats in stats.values():
+        total.latencies_ms.extend(route_stats.latencies_ms)
+        total.queries.extend(route_stats.queries)
+        total.errors += route_stats.errors
+    summary = total.summary()
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["throughput_rps"] = round(summary["requests"] / elapsed, 2) if elapsed else 0.0
+    covered = {route.partition("?")[0] for route in stats}
+    return {
+        "meta": meta,
+        "total": summary,
+        "routes": {route: stats[route].summary() for route in sorted(stats)},
+        "missing_routes": sorted(expected_routes() - covered),
+    }
+
+
+def compare_reports(baseline: dict, current: dict, max_regression: float) -> list[str]:
+    """Сравнивает p95 и число запросов по маршрутам; возвращает список регрессий."""
+    regressions = []
+    for route, entry in current["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if base is None:
+            continue
+        if entry["queries_per_request"] > base["queries_per_request"]:
+            regressions.append(
+                f"{route}: запросов к БД {base['queries_per_request']} -> {entry['queries_per_request']}"
+            )
+        if base["latency_ms_p95"] and entry["latency_ms_p95"] > base["latency_ms_p95"] * (1 + max_regression / 100):
+            regressions.append(
+                f"{route}: p95 {base['latency_ms_p95']:.1f} -> {entry['latency_ms_p95']:.1f} ms"
+            )
+    return regressions
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    total = report["total"]
+    print(f"Запросов: {total['requests']}, ошибок: {total['errors']}, "
+          f"{total['throughput_rps']} rps за {total['elapsed_s']} s")
+    print(f"{'маршрут':<52} {'n':>6} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'sql/req':>8}")
+    for route, entry in report["routes"].items():
+        print(f"{route:<52} {entry['requests']:>6} {entry['errors']:>5} {entry['latency_ms_p50']:>9.2f} "
+              f"{entry['latency_ms_p95']:>9.2f} {entry['latency_ms_p99']:>9.2f} {entry['queries_per_request']:>8}")
+    if report["missing_routes"]:
+        print("Не покрыты сценариями: " + ", ".join(report["missing_routes"]))
+
+
+def run_benchmark(database_url: str, size: DatasetSize, scenarios: list[str],
+                  concurrency: int, iterations: int) -> dict:
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    try:
+        with engine.begin() as connection:
+            seed_dataset(connection, size)
+            fixtures = load_fixtures(connection)
+        if not fixtures:
+            raise RuntimeError("В наборе данных нет компании с менеджером, проектом и дефектом")
+        stats, elapsed = asyncio.run(run_load(to_async_url(database_url), fixtures, scenarios, concurrency, iterations))
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+    meta = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "dialect": engine.dialect.name,
+        "dataset": asdict(size),
+        "scenarios": scenarios,
+        "concurrency": concurrency,
+        "iterations": iterations,
+    }
+    return build_report(stats, elapsed, meta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_load.db")
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--users-per-company", type=int, default=50)
+    parser.add_argument("--projects-per-company", type=int, default=20)
+    parser.add_argument("--defects-per-project", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=10, help="повторов набора сценариев на одного воркера")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", help="сохранить отчёт в JSON (базовая линия для сравнения)")
+    parser.add_argument("--compare", help="JSON базовой линии для сравнения")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="допустимый рост p95, %%")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        args.database_url,
+        DatasetSize(
+            companies=args.companies,
+            users_per_company=args.users_per_company,
+            projects_per_company=args.projects_per_company,
+            defects_per_project=args.defects_per_project,
+        ),
+        args.scenarios,
+        args.concurrency,
+        args.iterations,
+    )
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.max_regression)
+        for line in regressions:
+            print("РЕГРЕССИЯ " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Планы выполнения горячих запросов до и после индексов ревизий c61c13fd201f и d3a7e5b1c820.
+
+Запуск:
+    python -m back.benchmarks.query_plans --database-url sqlite:///./bench_plans.db
+
+Для PostgreSQL укажите URL пустой базы: таблицы создаются и удаляются скриптом.
+"""
+import argparse
+import json
+import time
+
+from sqlalchemy import create_engine, select, func, text
+from sqlalchemy.engine import Connection
+
+from back.benchmarks.dataset import DatasetSize, seed_dataset
+from back.database import Base
+from back.models import Project, Defect, User, UserRole, projects_engineers
+
+INDEXES_UNDER_TEST = [
+    "ix_users_company_id_role",
+    "ix_projects_user_manager_id",
+    "ix_projects_company_id_id",
+    "ix_defects_project_id",
+    "ix_defects_user_engineer_id_id",
+    "ix_projects_engineers_user_engineer_id",
+    # Составные индексы фильтров списков (back.list_filters): без них запросы "до"
+    # нашли бы по ним владельца, и сравнение вышло бы нечестным
+    "ix_projects_company_id_user_manager_id_id",
+    "ix_projects_company_id_name_id",
+    "ix_defects_user_engineer_id_project_id_id",
+    "ix_defects_user_engineer_id_name_id",
+]
+
+
+def hot_queries(company_id: int, manager_id: int, engineer_id: int, project_id: int) -> dict:
+    return {
+        "my_projects": select(Project)
+        .where(Project.company_id == company_id)
+        .order_by(Project.id).limit(101),
+        "my_defects": select(Defect)
+        .where(Defect.user_engineer_id == engineer_id)
+        .order_by(Defect.id).limit(101),
+        "manager_projects_count": select(func.count()).select_from(Project)
+        .where(Project.user_manager_id == manager_id, Project.company_id == company_id),
+        "engineer_defects_count": select(func.count()).select_from(Defect)
+        .join(Project, Project.id == Defect.project_id)
+        .where(Defect.user_engineer_id == engineer_id, Project.company_id == company_id),
+        "company_engineers": select(User.id)
+        .where(User.company_id == company_id, User.role == UserRole.ENGINEER),
+        "engineer_projects": select(projects_engineers.c.project_id)
+        .where(projects_engineers.c.user_engineer_id == engineer_id),
+        "project_defects": select(Defect.id)
+        .where(Defect.project_id == project_id),
+    }
+
+
+def explain(connection: Connection, statement) -> tuple[list[str], float]:
+    sql = str(statement.compile(connection, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    plan = [str(row[-1]) for row in connection.execute(text(prefix + sql))]
+    started = time.perf_counter()
+    connection.execute(statement).all()
+    return plan, (time.perf_counter() - started) * 1000
+
+
+def collect_plans(connection: Connection, queries: dict) -> dict:
+    result = {}
+    for name, statement in queries.items():
+        plan, elapsed_ms = explain(connection, statement)
+        result[name] = {"plan": plan, "elapsed_ms": round(elapsed_ms, 3)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_plans.db")
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--users-per-company", type=int, default=100)
+    parser.add_argument("--projects-per-company", type=int, default=40)
+    parser.add_argument("--defects-per-project", type=int, default=100)
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    try:
+        with engine.begin() as connection:
+            seed_dataset(connection, DatasetSize(
+                companies=args.companies,
+                users_per_company=args.users_per_company,
+                projects_per_company=args.projects_per_company,
+                defects_per_project=args.defects_per_project,
+            ))
+            company_id = args.companies // 2 or 1
+            manager_id = connection.scalar(select(User.id).where(
+                User.company_id == company_id, User.role == UserRole.MANAGER).limit(1))
+            engineer_id = connection.scalar(select(User.id).where(
+                User.company_id == company_id, User.role == UserRole.ENGINEER).limit(1))
+            project_id = connection.scalar(select(Project.id).where(Project.company_id == company_id).limit(1))
+            queries = hot_queries(company_id, manager_id, engineer_id, project_id)
+
+            for name in INDEXES_UNDER_TEST:
+                indexes[name].drop(connection)
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("ANALYZE"))
+            before = collect_plans(connection, queries)
+
+            for name in INDEXES_UNDER_TEST:
+                indexes[name].create(connection)
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("ANALYZE"))
+            after = collect_plans(connection, queries)
+    finally:
+        Base.metadata.drop_all(engine)
+
+    report = {name: {"before": before[name], "after": after[name]} for name in queries}
+    for name, entry in report.items():
+        print(f"== {name}")
+        print(f"   до     ({entry['before']['elapsed_ms']:.3f} ms): {' | '.join(entry['before']['plan'])}")
+        print(f"   после  ({entry['after']['elapsed_ms']:.3f} ms): {' | '.join(entry['after']['plan'])}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
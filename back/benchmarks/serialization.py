@@ -0,0 +1,137 @@
+"""Стоимость сериализации больших ответов до и после back.serialization.
+
+Данные синтетические и собираются в памяти, без БД: снимок компании в форме
+back.company.company_snapshot и страница /project/my-projects в форме кэша чтения.
+Для каждого ответа замеряются:
+    before - прежний путь: проверка по схеме (model_validate для снимка, serialize_response
+             FastAPI для response_model) и JSONResponse;
+    after  - FastJSONResponse: данные сериализуются сразу.
+Время приводится к 10 000 дефектов в ответе.
+
+Запуск:
+    python -m back.benchmarks.serialization --defects 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from back import schemas
+from back.benchmarks.dataset import DEFECT_WORDS
+from back.serialization import FastJSONResponse, orjson
+
+DEFECTS_PER_PROJECT = 50
+ENGINEERS_PER_PROJECT = 5
+
+
+def synthetic_snapshot(defects: int) -> dict:
+    """Снимок компании с заданным числом дефектов; поля в порядке CompanyFullOut."""
+    projects_count = max(1, defects // DEFECTS_PER_PROJECT)
+    managers = [
+        {"id": m, "username": f"manager_{m}", "email": f"manager_{m}@bench.ru", "projects": []}
+        for m in range(1, max(1, projects_count // 4) + 1)
+    ]
+    engineers = [
+        {"id": 10_000 + e, "username": f"engineer_{e}", "email": f"engineer_{e}@bench.ru",
+         "open_defects_count": 0, "defects": []}
+        for e in range(ENGINEERS_PER_PROJECT * 4)
+    ]
+    projects = []
+    for p in range(projects_count):
+        manager = managers[p % len(managers)]
+        # Как в снимке: у инженера проекта только дефекты этого проекта
+        project_engineers = [
+            {**engineers[(p + e) % len(engineers)], "defects": []} for e in range(ENGINEERS_PER_PROJECT)
+        ]
+        project_defects = []
+        for d in range(DEFECTS_PER_PROJECT if p < projects_count - 1 else defects - DEFECTS_PER_PROJECT * p):
+            engineer = project_engineers[d % len(project_engineers)]
+            defect = {
+                "id": p * DEFECTS_PER_PROJECT + d + 1,
+                "name": f"{DEFECT_WORDS[d % len(DEFECT_WORDS)]} №{d}",
+                "project_id": p + 1,
+                "engineer_id": engineer["id"],
+            }
+            project_defects.append(defect)
+            engineer["defects"].append(defect)
+            company_engineer = engineers[(p + d % len(project_engineers)) % len(engineers)]
+            company_engineer["defects"].append(defect)
+            company_engineer["open_defects_count"] += 1
+        manager["projects"].append(f"Объект {p}")
+        projects.append({
+            "id": p + 1,
+            "name": f"Объект {p}",
+            "manager_id": manager["id"],
+            "manager": manager,
+            "defects_count": len(project_defects),
+            "engineers": project_engineers,
+            "defects": project_defects,
+        })
+    return {"id": 1, "name": "Компания", "projects": projects, "managers": managers, "engineers": engineers}
+
+
+def _best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run_serialization_benchmark(defects: int = 10_000, repeat: int = 5) -> dict:
+    snapshot = synthetic_snapshot(defects)
+    page = snapshot["projects"]
+    page_field = create_model_field(name="Response_my_projects", type_=List[schemas.ProjectOut], mode="serialization")
+
+    def snapshot_before():
+        return schemas.CompanyFullOut.model_validate(snapshot).model_dump_json().encode()
+
+    def page_before():
+        content = asyncio.run(serialize_response(field=page_field, response_content=page))
+        return JSONResponse(content).body
+
+    cases = {
+        "company_snapshot": (snapshot_before, lambda: FastJSONResponse(snapshot).body, defects),
+        "my_projects": (page_before, lambda: FastJSONResponse(page).body, sum(len(p["defects"]) for p in page)),
+    }
+    report = {"serializer": "orjson" if orjson is not None else "pydantic_core", "defects": defects, "cases": {}}
+    for name, (before, after, case_defects) in cases.items():
+        # Оба пути должны отдавать один и тот же документ
+        assert json.loads(before()) == json.loads(after()), name
+        before_ms, after_ms = _best_ms(before, repeat), _best_ms(after, repeat)
+        scale = 10_000 / case_defects
+        report["cases"][name] = {
+            "bytes": len(after()),
+            "before_ms_per_10k_defects": round(before_ms * scale, 3),
+            "after_ms_per_10k_defects": round(after_ms * scale, 3),
+            "speedup": round(before_ms / after_ms, 1) if after_ms else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--defects", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    args = parser.parse_args()
+
+    report = run_serialization_benchmark(args.defects, args.repeat)
+    print(f"Сериализатор: {report['serializer']}, дефектов: {report['defects']}")
+    for name, entry in report["cases"].items():
+        print(f"{name:<20} до {entry['before_ms_per_10k_defects']:>9.3f} ms  "
+              f"после {entry['after_ms_per_10k_defects']:>9.3f} ms  x{entry['speedup']}  ({entry['bytes']} байт)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Сравнение пропускной способности профилей запуска development и production.
+
+Каждый профиль запускается через back.serve отдельным процессом на одной и той же
+заполненной базе и нагружается по HTTP одинаковым набором GET-запросов.
+
+Запуск:
+    python -m back.benchmarks.server --database-url sqlite:///./bench_server.db --requests 5000 --concurrency 64
+
+Для PostgreSQL укажите URL пустой базы: таблицы создаются и удаляются скриптом.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+
+import httpx
+from sqlalchemy import create_engine
+
+from back.benchmarks.dataset import BENCHMARK_PASSWORD, DatasetSize, seed_dataset
+from back.benchmarks.load import percentile
+from back.database import Base
+
+DEFAULT_PATHS = ["/company/all", "/auth/users/me/", "/company/my-companies?company_id=1"]
+
+
+def start_server(profile: str, database_url: str, port: int, workers: int | None) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "APP_PROFILE": profile,
+        "DATABASE_URL": database_url,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "GUNICORN_ACCESS_LOG": "",
+    }
+    env.pop("ASYNC_DATABASE_URL", None)
+    if workers:
+        env["WEB_CONCURRENCY"] = str(workers)
+    return subprocess.Popen(
+        [sys.executable, "-m", "back.serve"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def stop_server(process: subprocess.Popen):
+    # Завершаем всю группу: reloader uvicorn и мастер gunicorn держат дочерние процессы
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/docs")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Сервер не поднялся за отведённое время")
+
+
+async def drive(base_url: str, paths: list[str], requests: int, concurrency: int, warmup: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await wait_ready(client)
+        login = await client.post("/auth/token", data={"username": "bench_admin", "password": BENCHMARK_PASSWORD})
+        login.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+
+        for i in range(warmup):
+            await client.get(paths[i % len(paths)])
+
+        latencies_ms, errors = [], 0
+        counter = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(paths[i % len(paths)])
+                    failed = response.status_code >= 400
+                except httpx.TransportError:
+                    failed = True
+                latencies_ms.append((time.perf_counter() - started) * 1000)
+                errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies_ms) / elapsed, 2),
+        "latency_ms_p50": round(percentile(latencies_ms, 50), 3),
+        "latency_ms_p95": round(percentile(latencies_ms, 95), 3),
+        "latency_ms_p99": round(percentile(latencies_ms, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_server.db")
+    parser.add_argument("--profiles", nargs="+", default=["development", "production"])
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, help="WEB_CONCURRENCY для production")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--users-per-company", type=int, default=50)
+    parser.add_argument("--projects-per-company", type=int, default=20)
+    parser.add_argument("--defects-per-project", type=int, default=20)
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    args = parser.parse_args()
+
+    size = DatasetSize(
+        companies=args.companies,
+        users_per_company=args.users_per_company,
+        projects_per_company=args.projects_per_company,
+        defects_per_project=args.defects_per_project,
+    )
+    engine = create_engine(args.database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    results = {}
+    try:
+        with engine.begin() as connection:
+            seed_dataset(connection, size)
+        for profile in args.profiles:
+            process = start_server(profile, args.database_url, args.port, args.workers)
+            try:
+                results[profile] = asyncio.run(drive(
+                    f"http://127.0.0.1:{args.port}", args.paths, args.requests, args.concurrency, args.warmup
+                ))
+            finally:
+                stop_server(process)
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+    print(f"{'профиль':<14} {'rps':>10} {'p50':>9} {'p95':>9} {'p99':>9} {'err':>6}")
+    for profile, entry in results.items():
+        print(f"{profile:<14} {entry['throughput_rps']:>10.1f} {entry['latency_ms_p50']:>9.2f} "
+              f"{entry['latency_ms_p95']:>9.2f} {entry['latency_ms_p99']:>9.2f} {entry['errors']:>6}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"dataset": asdict(size), "paths": args.paths, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+
+from back.serve import worker_count
+
+READ_CACHE_BACKEND = os.getenv("READ_CACHE_BACKEND", "redis" if os.getenv("REDIS_URL") else "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "60"))
+READ_CACHE_LOCAL_SIZE = int(os.getenv("READ_CACHE_LOCAL_SIZE", "1000"))
+READ_CACHE_PREFIX = os.getenv("READ_CACHE_PREFIX", "ysi:read")
+
+# Пространство ключей списка компаний: его счётчики зависят от любой компании
+COMPANIES_NAMESPACE = "companies"
+
+logger = logging.getLogger(__name__)
+
+
+def company_namespace(company_id: int) -> str:
+    return f"company:{company_id}"
+
+
+class LocalCacheBackend:
+    """LRU в памяти процесса. При нескольких воркерах инвалидация видна только
+    своему процессу, а счётчики поколений расходятся между процессами. Поэтому
+    ReadCache и кэш пользователей в этом случае отключаются (ReadCache.shared), а версии
+    для ETag и снимков компаний берутся из БД (back.versioning), а не отсюда.
+
+    Счётчики начинаются со случайного смещения процесса: номера событий ленты
+    (back.feed.change_feed) из разных воркеров и после перезапуска не совпадают, и
+    Last-Event-ID чужого процесса не сойдёт за покрытый буфером."""
+
+    counter_base_bits = 40
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+        # Счётчики поколений хранятся отдельно и не вытесняются, иначе поколение
+        # откатится назад и снова откроет устаревшие ключи
+        self._counters: dict[str, int] = {}
+        self._counter_base = random.getrandbits(self.counter_base_bits)
+
+    async def get(self, key: str) -> bytes | None:
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, self._counter_base) + 1
+        return self._counters[key]
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Записывает значение, только если ключа нет; False, если он уже есть."""
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+        self._counters.clear()
+
+    async def close(self):
+        pass
+
+
+class FakeCacheBackend(LocalCacheBackend):
+    """Бэкенд для тестов: без вытеснения и TTL, с журналом обращений."""
+
+    counter_base_bits = 0
+
+    def __init__(self):
+        super().__init__(max_size=float("inf"))
+        self.calls: list[tuple[str, str]] = []
+
+    async def get(self, key: str) -> bytes | None:
+        self.calls.append(("get", key))
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        self.calls.append(("set", key))
+        self._entries[key] = (value, None)
+
+    async def delete(self, key: str):
+        self.calls.append(("delete", key))
+        await super().delete(key)
+
+    async def clear(self):
+        await super().clear()
+        self.calls.clear()
+
+
+class RedisCacheBackend:
+    def __init__(self, url: str):
+        from redis import asyncio as redis_asyncio
+
+        self._client = redis_asyncio.Redis.from_url(url)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        await self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        return bool(await self._client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    async def clear(self):
+        # Сбрасываем только свои ключи, база Redis может быть общей
+        async for key in self._client.scan_iter(match=f"{READ_CACHE_PREFIX}:*"):
+            await self._client.delete(key)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def create_backend(kind: str):
+    if kind == "redis":
+        return RedisCacheBackend(REDIS_URL)
+    if kind == "fake":
+        return FakeCacheBackend()
+    if kind == "local":
+        return LocalCacheBackend(READ_CACHE_LOCAL_SIZE)
+    raise ValueError(f"Неизвестный бэкенд кэша: {kind}")
+
+
+class ReadCache:
+    """Кэш ответов читающих маршрутов с инвалидацией по поколениям.
+
+    Ключ данных включает номер поколения пространства (компании или списка компаний).
+    Запись увеличивает поколение, и старые ключи просто перестают читаться, а потом
+    вытесняются по TTL. Поколение читается до загрузки из БД, поэтому ответ, собранный
+    параллельно с записью, сохраняется под старым поколением и не всплывает после неё.
+    Ошибки бэкенда не ломают запрос: чтение идёт мимо кэша. Если поколения не общие
+    (бэкенд в памяти при нескольких воркерах), кэш не используется вовсе: запись в
+    одном воркере не сбросила бы ответы, закэшированные в остальных.
+    """
+
+    def __init__(self, backend, ttl: float, prefix: str):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.bypassed = 0
+        self.errors = 0
+
+    @property
+    def shared(self) -> bool:
+        """Видят ли все процессы API одни и те же поколения: с Redis - всегда,
+        с бэкендом в памяти - только если процесс один."""
+        return isinstance(self.backend, RedisCacheBackend) or worker_count() == 1
+
+    def _generation_key(self, namespace: str) -> str:
+        return f"{self.prefix}:gen:{namespace}"
+
+    async def _generation(self, namespace: str) -> int:
+        raw = await self.backend.get(self._generation_key(namespace))
+        return int(raw or 0)
+
+    async def version(self, namespace: str) -> int | None:
+        """Текущее поколение пространства; None, если бэкенд недоступен."""
+        try:
+            return await self._generation(namespace)
+        except Exception:
+            logger.exception("Кэш чтения недоступен")
+            self.errors += 1
+            return None
+
+    async def get_or_load(self, namespace: str, key: str, loader):
+        if not self.shared:
+            self.bypassed += 1
+            return await loader()
+        try:
+            generation = await self._generation(namespace)
+            data_key = f"{self.prefix}:{namespace}:{generation}:{key}"
+            raw = await self.backend.get(data_key)
+        except Exception:
+            logger.exception("Кэш чтения недоступен")
+            self.errors += 1
+            return await loader()
+
+        if raw is not None:
+            self.hits += 1
+            return json.loads(raw)
+
+        self.misses += 1
+        value = await loader()
+        if value is not None:
+            try:
+                await self.backend.set(data_key, json.dumps(value, ensure_ascii=False).encode(), self.ttl)
+            except Exception:
+                logger.exception("Не удалось записать ответ в кэш чтения")
+                self.errors += 1
+        return value
+
+    async def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            try:
+                await self.backend.incr(self._generation_key(namespace))
+                self.invalidations += 1
+            except Exception:
+                logger.exception("Не удалось инвалидировать кэш чтения")
+                self.errors += 1
+
+    async def invalidate_companies(self, *company_ids: int | None):
+        """Сбрасывает ключи затронутых компаний и списка компаний."""
+        namespaces = [company_namespace(company_id) for company_id in set(company_ids) if company_id is not None]
+        await self.invalidate(*namespaces, COMPANIES_NAMESPACE)
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "shared": self.shared,
+            "bypassed": self.bypassed,
+            "errors": self.errors,
+        }
+
+
+read_cache = ReadCache(create_backend(READ_CACHE_BACKEND), ttl=READ_CACHE_TTL, prefix=READ_CACHE_PREFIX)
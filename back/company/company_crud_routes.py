@@ -1,41 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from back import schemas, models
 from back.auth import auth
+from back.auth.principal_cache import principal_cache
+from back.cache import COMPANIES_NAMESPACE, read_cache
+from back.company.company_snapshot import stream_company_snapshot
+from back.company.snapshot_store import snapshot_store
+from back.company.user_import import ImportFormatError, UserImport, detect_format, iter_records
 from back.database import get_db
 from back.decorators import require_role
-from back.models import Company, Project, Defect, UserRole
+from back.feed.change_feed import record_change
+from back.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_next_cursor
+from back.read_session import get_read_db, get_read_session_factory
 from back.schemas import CompanyFullOut, CompanyListItemOut
+from back.versioning import company_version, etag_matches, not_modified, version_etag
 
 router = APIRouter(prefix="/company", tags=["company"])
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SNAPSHOT_AGE_HEADER = "X-Snapshot-Age"
+SNAPSHOT_STALE_HEADER = "X-Snapshot-Stale"
+COMPANY_PAGE_SIZE = 100
+
 @router.post("/create", response_model=schemas.CompanyCreate)
 @require_role(models.UserRole.ADMIN)
-async def create_company(company: schemas.CompanyCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+async def create_company(company: schemas.CompanyCreate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_company = models.Company(name=company.name)
     db.add(db_company)
-    db.commit()
+    await db.flush()
+    record_change(db, db_company.id, "company.created", name=db_company.name)
+    await db.commit()
     return db_company
 
 @router.delete("/{company_id}")
 @require_role(models.UserRole.ADMIN)
-async def delete_company(company_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_company = db.query(models.Company).filter(
+async def delete_company(company_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+    db_company = await db.scalar(select(models.Company).where(
         models.Company.id == company_id
-    ).first()
+    ))
 
     if not db_company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
 
     try:
-        db.delete(db_company)
-        db.commit()
+        # ORM отвяжет пользователей от компании, их закэшированная компания устареет
+        usernames = (await db.scalars(
+            select(models.User.username).where(models.User.company_id == company_id)
+        )).all()
+        record_change(db, company_id, "company.deleted")
+        await db.delete(db_company)
+        await db.commit()
+        await principal_cache.invalidate_user(*usernames)
 
         return {"message": "Компания удалена"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при удалении компании: {str(e)}"
@@ -46,20 +72,20 @@ async def delete_company(company_id: int, db: Session = Depends(get_db), current
 async def add_user_to_company(
         company_id: int,
         user_data: schemas.AddUserToCompany,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(auth.get_current_user)
 ):
 
-    db_company = db.query(models.Company).filter(
+    db_company = await db.scalar(select(models.Company).where(
         models.Company.id == company_id
-    ).first()
+    ))
 
     if not db_company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
 
-    user_to_add = db.query(models.User).filter(
+    user_to_add = await db.scalar(select(models.User).where(
         models.User.id == user_data.user_id
-    ).first()
+    ))
 
     if not user_to_add:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -71,9 +97,9 @@ async def add_user_to_company(
                 detail="Пользователь уже состоит в этой компании"
             )
         else:
-            current_company = db.query(models.Company).filter(
+            current_company = await db.scalar(select(models.Company).where(
                 models.Company.id == user_to_add.company_id
-            ).first()
+            ))
             company_name = current_company.name if current_company else "другой компании"
             raise HTTPException(
                 status_code=400,
@@ -82,8 +108,12 @@ async def add_user_to_company(
 
     try:
         user_to_add.company_id = company_id
-        db.commit()
-        db.refresh(user_to_add)
+        record_change(
+            db, company_id, "company.user_added", user_ids=[user_to_add.id], user_id=user_to_add.id, role=user_to_add.role,
+        )
+        await db.commit()
+        await principal_cache.invalidate_user(user_to_add.username)
+        await db.refresh(user_to_add)
 
         return schemas.UserToCompanyResponse(
             message="Пользователь успешно добавлен в компанию",
@@ -93,135 +123,144 @@ async def add_user_to_company(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при добавлении пользователя в компанию: {str(e)}"
         )
 
 
+@router.post("/{company_id}/users/import", response_model=schemas.UserImportResponse)
+@require_role(models.UserRole.ADMIN)
+async def import_company_users(
+        company_id: int,
+        request: Request,
+        format: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user)
+):
+    try:
+        fmt = detect_format(request.headers.get("content-type"), format)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    exists = await db.scalar(select(models.Company.id).where(models.Company.id == company_id))
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Компания не найдена")
+
+    return await UserImport(db, company_id).run(iter_records(request.stream(), fmt))
+
+
 @router.get("/my-companies", response_model=CompanyFullOut)
-async def get_full_company_info(company_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-
-    company = (
-        db.query(Company)
-        .options(
-            joinedload(Company.projects)
-            .joinedload(Project.engineers),
-            joinedload(Company.projects)
-            .joinedload(Project.defects)
-            .joinedload(Defect.engineer),
-            joinedload(Company.users),
-        )
-        .filter(Company.id == company_id)
-        .first()
-    )
+async def get_full_company_info(
+        company_id: int,
+        request: Request,
+        stream: bool = False,
+        consistent: bool = False,
+        db: AsyncSession = Depends(get_read_db),
+        session_factory=Depends(get_read_session_factory),
+        current_user: models.User = Depends(auth.get_current_user)
+):
 
     if current_user.role == models.UserRole.CLIENT or current_user.role != models.UserRole.ADMIN:
         if current_user.company_id != company_id:
             raise HTTPException(status_code=403, detail="Недостаточно прав для получения данных этой компании")
 
-    if not company:
+    streaming = stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    # Версия читается до загрузки: запись, прошедшая между ними, сменит тег при следующем опросе
+    version = await company_version(db, company_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Company not found")
+    etag = version_etag(company_id, version, "snapshot-ndjson" if streaming else "snapshot-json")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    if streaming:
+        # Сессия запроса закрывается до начала отправки тела, поэтому поток открывает свою
+        return StreamingResponse(
+            stream_company_snapshot(session_factory, company_id),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers={"ETag": etag},
+        )
 
-    managers = [
-        {
-            "id": u.id,
-            "username": u.username,
-            "email": u.email,
-            "projects": [p.name for p in u.managed_projects],
-        }
-        for u in company.users if u.role == UserRole.MANAGER
-    ]
-
-    engineers = [
-        {
-            "id": u.id,
-            "username": u.username,
-            "email": u.email,
-            "defects": [
-                {
-                    "id": d.id,
-                    "name": d.name,
-                    "project_id": d.project_id,
-                    "engineer_id": d.user_engineer_id,
-                }
-                for d in u.defect_as_engineer
-            ],
-        }
-        for u in company.users if u.role == UserRole.ENGINEER
-    ]
-
-    projects = []
-    for p in company.projects:
-        manager_data = None
-        if p.manager:
-            manager_data = {
-                "id": p.manager.id,
-                "username": p.manager.username,
-                "email": p.manager.email,
-                "projects": []
-            }
-        
-        projects.append({
-            "id": p.id,
-            "name": p.name,
-            "manager_id": p.user_manager_id,
-            "manager": manager_data,
-            "engineers": [
-                {
-                    "id": e.id,
-                    "username": e.username,
-                    "email": e.email,
-                    "defects": [
-                        {
-                            "id": d.id,
-                            "name": d.name,
-                            "project_id": d.project_id,
-                            "engineer_id": d.user_engineer_id,
-                        }
-                        for d in e.defect_as_engineer if d.project_id == p.id
-                    ],
-                }
-                for e in p.engineers
-            ],
-            "defects": [
-                {
-                    "id": d.id,
-                    "name": d.name,
-                    "project_id": d.project_id,
-                    "engineer_id": d.user_engineer_id,
-                }
-                for d in p.defects
-            ]
-        })
-
-    return {
-        "id": company.id,
-        "name": company.name,
-        "projects": projects,
-        "managers": managers,
-        "engineers": engineers,
-    }
+    # consistent=1 собирает снимок по текущим данным, не дожидаясь фоновой пересборки
+    snapshot = None if consistent else await snapshot_store.get(company_id)
+    stale = False
+    if snapshot is None:
+        snapshot = await snapshot_store.build(db, company_id, version)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Company not found")
+    else:
+        # Реплика может отставать от основной БД, где собран снимок: более новый снимок не устарел
+        stale = snapshot.version < version
+        if stale:
+            # Пересборку мог поставить другой процесс; здесь она схлопнется с уже запланированной
+            snapshot_store.schedule_rebuild([company_id])
+            snapshot_store.stale_served += 1
+    snapshot_store.served += 1
+
+    headers = {SNAPSHOT_AGE_HEADER: str(int(snapshot.age()))}
+    if stale:
+        headers[SNAPSHOT_STALE_HEADER] = "1"
+    # Тег описывает отданные байты, а не текущую версию компании
+    headers["ETag"] = version_etag(company_id, snapshot.version, "snapshot-json")
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers["ETag"])
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 
 @router.get("/all", response_model=list[CompanyListItemOut])
 @require_role(models.UserRole.ADMIN)
-async def list_companies(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    companies = db.query(models.Company).all()
+async def list_companies(
+        response: Response,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=1000, description="Без cursor и limit возвращается весь список"),
+        name: Optional[str] = None,
+        db: AsyncSession = Depends(get_read_db),
+        current_user: models.User = Depends(auth.get_current_user)
+):
+    query = select(
+        models.Company.id,
+        models.Company.name,
+        models.Company.projects_count,
+        models.Company.users_count,
+    ).order_by(models.Company.id)
+
+    # Клиенты, не знающие о курсоре, по-прежнему получают все компании
+    if cursor and limit is None:
+        limit = COMPANY_PAGE_SIZE
+    if limit is not None:
+        query = query.limit(limit + 1)
+    if cursor:
+        (after_id,) = decode_cursor(cursor)
+        query = query.where(models.Company.id > after_id)
+    if name:
+        # % и _ в строке поиска - обычные символы, а не шаблоны LIKE
+        query = query.where(models.Company.name.icontains(name, autoescape=True))
+
+    async def load_page():
+        rows = (await db.execute(query)).all()
+        next_cursor = None
+        if limit is not None:
+            rows, next_cursor = split_next_cursor(rows, limit, key=lambda row: [row.id])
+        return {
+            "items": [
+                CompanyListItemOut(
+                    id=row.id,
+                    name=row.name,
+                    projects_count=row.projects_count,
+                    users_count=row.users_count
+                ).model_dump()
+                for row in rows
+            ],
+            "next_cursor": next_cursor,
+        }
 
-    result: list[CompanyListItemOut] = []
-    for c in companies:
-        projects_count = db.query(models.Project).filter(models.Project.company_id == c.id).count()
-        users_count = db.query(models.User).filter(models.User.company_id == c.id).count()
-        result.append(CompanyListItemOut(
-            id=c.id,
-            name=c.name,
-            projects_count=projects_count,
-            users_count=users_count
-        ))
+    page = await read_cache.get_or_load(COMPANIES_NAMESPACE, f"all:{cursor}:{limit}:{name}", load_page)
+    if page["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
 
-    return result
+    return page["items"]
 
 
 @router.delete("/{company_id}/users/{user_id}", response_model=schemas.RemoveUserFromCompanyResponse)
@@ -229,19 +268,19 @@ async def list_companies(db: Session = Depends(get_db), current_user: models.Use
 async def remove_user_from_company(
         company_id: int,
         user_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(auth.get_current_user)
 ):
-    db_company = db.query(models.Company).filter(
+    db_company = await db.scalar(select(models.Company).where(
         models.Company.id == company_id
-    ).first()
+    ))
 
     if not db_company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
 
-    user_to_remove = db.query(models.User).filter(
+    user_to_remove = await db.scalar(select(models.User).where(
         models.User.id == user_id
-    ).first()
+    ))
 
     if not user_to_remove:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -256,10 +295,12 @@ async def remove_user_from_company(
         user_role = user_to_remove.role.value
 
         if user_to_remove.role == models.UserRole.MANAGER:
-            managed_projects = db.query(models.Project).filter(
-                models.Project.user_manager_id == user_id,
-                models.Project.company_id == company_id
-            ).count()
+            managed_projects = await db.scalar(
+                select(func.count()).select_from(models.Project).where(
+                    models.Project.user_manager_id == user_id,
+                    models.Project.company_id == company_id
+                )
+            )
 
             if managed_projects > 0:
                 raise HTTPException(
@@ -268,11 +309,13 @@ async def remove_user_from_company(
                 )
 
         if user_to_remove.role == models.UserRole.ENGINEER:
-            active_defects = db.query(models.Defect).filter(
-                models.Defect.user_engineer_id == user_id
-            ).join(models.Project).filter(
-                models.Project.company_id == company_id
-            ).count()
+            active_defects = await db.scalar(
+                select(func.count()).select_from(models.Defect).where(
+                    models.Defect.user_engineer_id == user_id
+                ).join(models.Project).where(
+                    models.Project.company_id == company_id
+                )
+            )
 
             if active_defects > 0:
                 raise HTTPException(
@@ -280,19 +323,26 @@ async def remove_user_from_company(
                     detail="Невозможно отвязать инженера, у которого есть активные дефекты в компании. Сначала перераспределите дефекты."
                 )
 
-        engineer_projects = db.query(models.Project).join(
-            models.Project.engineers
-        ).filter(
-            models.User.id == user_id,
-            models.Project.company_id == company_id
-        ).all()
+        engineer_projects = (await db.scalars(
+            select(models.Project).join(
+                models.Project.engineers
+            ).where(
+                models.User.id == user_id,
+                models.Project.company_id == company_id
+            ).options(selectinload(models.Project.engineers))
+        )).all()
 
         for project in engineer_projects:
             project.engineers.remove(user_to_remove)
 
         user_to_remove.company_id = None
-        db.commit()
-        db.refresh(user_to_remove)
+        record_change(
+            db, company_id, "company.user_removed", user_ids=[user_id],
+            user_id=user_id, role=user_role, project_ids=[project.id for project in engineer_projects],
+        )
+        await db.commit()
+        await principal_cache.invalidate_user(user_to_remove.username)
+        await db.refresh(user_to_remove)
 
         return schemas.RemoveUserFromCompanyResponse(
             message="Пользователь успешно отвязан от компании",
@@ -304,7 +354,7 @@ async def remove_user_from_company(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при отвязке пользователя от компании: {str(e)}"
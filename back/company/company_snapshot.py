@@ -0,0 +1,285 @@
+import os
+from collections import defaultdict
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from back.models import Company, Project, Defect, User, UserRole, projects_engineers
+from back.serialization import dumps
+
+STREAM_BATCH_SIZE = int(os.getenv("SNAPSHOT_STREAM_BATCH_SIZE", "1000"))
+
+
+def _defect_out(row) -> dict:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "project_id": row.project_id,
+        "engineer_id": row.user_engineer_id,
+    }
+
+
+async def load_company_snapshot(db: AsyncSession, company_id: int) -> dict | None:
+    """Собирает полный снимок компании фиксированным числом запросов без декартовых join'ов."""
+    company = (await db.execute(
+        select(Company.id, Company.name).where(Company.id == company_id)
+    )).first()
+    if company is None:
+        return None
+
+    users = (await db.execute(
+        select(User.id, User.username, User.email, User.role, User.open_defects_count)
+        .where(User.company_id == company_id)
+        .order_by(User.id)
+    )).all()
+
+    manager = User.__table__.alias("manager")
+    projects = (await db.execute(
+        select(
+            Project.id,
+            Project.name,
+            Project.user_manager_id,
+            Project.defects_count,
+            manager.c.id.label("manager_user_id"),
+            manager.c.username.label("manager_username"),
+            manager.c.email.label("manager_email"),
+        )
+        .outerjoin(manager, manager.c.id == Project.user_manager_id)
+        .where(Project.company_id == company_id)
+        .order_by(Project.id)
+    )).all()
+
+    project_engineers = (await db.execute(
+        select(projects_engineers.c.project_id, User.id, User.username, User.email, User.open_defects_count)
+        .join(User, User.id == projects_engineers.c.user_engineer_id)
+        .join(Project, Project.id == projects_engineers.c.project_id)
+        .where(Project.company_id == company_id)
+        .order_by(projects_engineers.c.project_id, User.id)
+    )).all()
+
+    company_engineer_ids = (
+        select(User.id)
+        .where(User.company_id == company_id, User.role == UserRole.ENGINEER)
+        .scalar_subquery()
+    )
+    defects = (await db.execute(
+        select(Defect.id, Defect.name, Defect.project_id, Defect.user_engineer_id)
+        .outerjoin(Project, Project.id == Defect.project_id)
+        .where(or_(
+            Project.company_id == company_id,
+            Defect.user_engineer_id.in_(company_engineer_ids),
+        ))
+        .order_by(Defect.id)
+    )).all()
+
+    company_manager_ids = (
+        select(User.id)
+        .where(User.company_id == company_id, User.role == UserRole.MANAGER)
+        .scalar_subquery()
+    )
+    managed_projects = (await db.execute(
+        select(Project.user_manager_id, Project.name)
+        .where(Project.user_manager_id.in_(company_manager_ids))
+        .order_by(Project.id)
+    )).all()
+
+    project_ids = {p.id for p in projects}
+    defects_by_project = defaultdict(list)
+    defects_by_engineer = defaultdict(list)
+    defects_by_project_engineer = defaultdict(list)
+    for d in defects:
+        out = _defect_out(d)
+        if d.project_id in project_ids:
+            defects_by_project[d.project_id].append(out)
+        if d.user_engineer_id is not None:
+            defects_by_engineer[d.user_engineer_id].append(out)
+            defects_by_project_engineer[(d.project_id, d.user_engineer_id)].append(out)
+
+    engineers_by_project = defaultdict(list)
+    for row in project_engineers:
+        engineers_by_project[row.project_id].append({
+            "id": row.id,
+            "username": row.username,
+            "email": row.email,
+            "open_defects_count": row.open_defects_count,
+            "defects": defects_by_project_engineer.get((row.project_id, row.id), []),
+        })
+
+    project_names_by_manager = defaultdict(list)
+    for row in managed_projects:
+        project_names_by_manager[row.user_manager_id].append(row.name)
+
+    managers = [
+        {
+            "id": u.id,
+            "username": u.username,
+            "email": u.email,
+            "projects": project_names_by_manager.get(u.id, []),
+        }
+        for u in users if u.role == UserRole.MANAGER
+    ]
+
+    engineers = [
+        {
+            "id": u.id,
+            "username": u.username,
+            "email": u.email,
+            "open_defects_count": u.open_defects_count,
+            "defects": defects_by_engineer.get(u.id, []),
+        }
+        for u in users if u.role == UserRole.ENGINEER
+    ]
+
+    projects_out = []
+    for p in projects:
+        manager_data = None
+        if p.manager_user_id is not None:
+            manager_data = {
+                "id": p.user_manager_id,
+                "username": p.manager_username,
+                "email": p.manager_email,
+                "projects": []
+            }
+
+        projects_out.append({
+            "id": p.id,
+            "name": p.name,
+            "manager_id": p.user_manager_id,
+            "manager": manager_data,
+            "defects_count": p.defects_count,
+            "engineers": engineers_by_project.get(p.id, []),
+            "defects": defects_by_project.get(p.id, []),
+        })
+
+    return {
+        "id": company.id,
+        "name": company.name,
+        "projects": projects_out,
+        "managers": managers,
+        "engineers": engineers,
+    }
+
+
+def _ndjson(record: dict) -> bytes:
+    return dumps(record) + b"\n"
+
+
+async def _consecutive_groups(result, key):
+    """Группирует уже упорядоченный поток строк, держа в памяти только текущую группу."""
+    current_key, group = None, []
+    async for row in result:
+        row_key = key(row)
+        if group and row_key != current_key:
+            yield current_key, group
+            group = []
+        current_key = row_key
+        group.append(row)
+    if group:
+        yield current_key, group
+
+
+async def stream_company_snapshot(session_factory, company_id: int):
+    """Отдаёт снимок компании построчно (NDJSON) через серверные курсоры.
+
+    Записи плоские: company, project, manager, engineer, defect - клиент собирает
+    вложенность по идентификаторам, а сервер держит в памяти не больше одной группы строк.
+    """
+    async with session_factory() as db:
+        company = (await db.execute(
+            select(Company.id, Company.name).where(Company.id == company_id)
+        )).first()
+        if company is None:
+            return
+        yield _ndjson({"type": "company", "id": company.id, "name": company.name})
+
+        manager = User.__table__.alias("manager")
+        projects = await db.stream(
+            select(
+                Project.id,
+                Project.name,
+                Project.user_manager_id,
+                Project.defects_count,
+                manager.c.id.label("manager_user_id"),
+                manager.c.username.label("manager_username"),
+                manager.c.email.label("manager_email"),
+                projects_engineers.c.user_engineer_id,
+            )
+            .outerjoin(manager, manager.c.id == Project.user_manager_id)
+            .outerjoin(projects_engineers, projects_engineers.c.project_id == Project.id)
+            .where(Project.company_id == company_id)
+            .order_by(Project.id, projects_engineers.c.user_engineer_id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for _, rows in _consecutive_groups(projects, key=lambda row: row.id):
+            p = rows[0]
+            yield _ndjson({
+                "type": "project",
+                "id": p.id,
+                "name": p.name,
+                "manager_id": p.user_manager_id,
+                "manager": {
+                    "id": p.manager_user_id,
+                    "username": p.manager_username,
+                    "email": p.manager_email,
+                } if p.manager_user_id is not None else None,
+                "defects_count": p.defects_count,
+                "engineer_ids": [row.user_engineer_id for row in rows if row.user_engineer_id is not None],
+            })
+
+        managers = await db.stream(
+            select(User.id, User.username, User.email, Project.name.label("project_name"))
+            .outerjoin(Project, Project.user_manager_id == User.id)
+            .where(User.company_id == company_id, User.role == UserRole.MANAGER)
+            .order_by(User.id, Project.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for _, rows in _consecutive_groups(managers, key=lambda row: row.id):
+            u = rows[0]
+            yield _ndjson({
+                "type": "manager",
+                "id": u.id,
+                "username": u.username,
+                "email": u.email,
+                "projects": [row.project_name for row in rows if row.project_name is not None],
+            })
+
+        company_project_engineer_ids = (
+            select(projects_engineers.c.user_engineer_id)
+            .join(Project, Project.id == projects_engineers.c.project_id)
+            .where(Project.company_id == company_id)
+        )
+        engineers = await db.stream(
+            select(User.id, User.username, User.email, User.open_defects_count)
+            .where(or_(
+                (User.company_id == company_id) & (User.role == UserRole.ENGINEER),
+                User.id.in_(company_project_engineer_ids),
+            ))
+            .order_by(User.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for u in engineers:
+            yield _ndjson({
+                "type": "engineer",
+                "id": u.id,
+                "username": u.username,
+                "email": u.email,
+                "open_defects_count": u.open_defects_count,
+            })
+
+        company_engineer_ids = (
+            select(User.id)
+            .where(User.company_id == company_id, User.role == UserRole.ENGINEER)
+            .scalar_subquery()
+        )
+        defects = await db.stream(
+            select(Defect.id, Defect.name, Defect.project_id, Defect.user_engineer_id)
+            .outerjoin(Project, Project.id == Defect.project_id)
+            .where(or_(
+                Project.company_id == company_id,
+                Defect.user_engineer_id.in_(company_engineer_ids),
+            ))
+            .order_by(Defect.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for d in defects:
+            yield _ndjson({"type": "defect", **_defect_out(d)})
@@ -0,0 +1,136 @@
+"""Материализованные снимки компаний: готовые байты JSON ответа /company/my-companies.
+
+Снимок хранится в бэкенде кэша чтения вместе с версией компании (companies.version),
+из которой он собран, и временем сборки. Чтение отдаёт байты как есть, без ORM и Pydantic.
+Коммит, затронувший компанию, ставит пересборку в фон с задержкой
+SNAPSHOT_DEBOUNCE_SECONDS: серия записей за это время даёт одну сборку. До её
+завершения отдаётся прежний снимок с пометкой о том, насколько он устарел.
+
+Устаревание определяется сравнением с версией в БД, а не с отметками процесса:
+с бэкендом в памяти у каждого воркера свой снимок, и запись, прошедшая через
+соседний воркер, помечает его устаревшим при первом же чтении и ставит пересборку.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+from back.cache import ReadCache, read_cache
+from back.company.company_snapshot import load_company_snapshot
+from back.database import AsyncSessionLocal, company_commit_listeners
+from back.serialization import dumps
+from back.versioning import company_version
+
+SNAPSHOT_DEBOUNCE_SECONDS = float(os.getenv("SNAPSHOT_DEBOUNCE_SECONDS", "2"))
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "86400"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StoredSnapshot:
+    version: int
+    built_at: float
+    body: bytes
+
+    def age(self) -> float:
+        return max(0.0, time.time() - self.built_at)
+
+
+class SnapshotStore:
+    def __init__(self, cache: ReadCache, session_factory, debounce: float, ttl: float):
+        self.cache = cache
+        # Фоновой сборке нужна своя сессия; тесты и нагрузочный прогон подменяют фабрику
+        self.session_factory = session_factory
+        self.debounce = debounce
+        self.ttl = ttl
+        self._pending: dict[int, asyncio.Task] = {}
+        self.builds = 0
+        self.served = 0
+        self.stale_served = 0
+        self.errors = 0
+
+    def _key(self, company_id: int) -> str:
+        return f"{self.cache.prefix}:snapshot:{company_id}"
+
+    async def get(self, company_id: int) -> StoredSnapshot | None:
+        try:
+            raw = await self.cache.backend.get(self._key(company_id))
+        except Exception:
+            logger.exception("Хранилище снимков недоступно")
+            self.errors += 1
+            return None
+        if raw is None:
+            return None
+        header, _, body = raw.partition(b"\n")
+        version, built_at = header.split(b" ")
+        return StoredSnapshot(version=int(version), built_at=float(built_at), body=body)
+
+    async def _save(self, company_id: int, stored: StoredSnapshot | None):
+        key = self._key(company_id)
+        try:
+            if stored is None:
+                await self.cache.backend.delete(key)
+            else:
+                header = f"{stored.version} {stored.built_at}\n".encode()
+                await self.cache.backend.set(key, header + stored.body, self.ttl)
+        except Exception:
+            logger.exception("Не удалось сохранить снимок компании %s", company_id)
+            self.errors += 1
+
+    async def build(self, db, company_id: int, version: int | None = None) -> StoredSnapshot | None:
+        """Собирает снимок по текущим данным и сохраняет его; None, если компании нет.
+        version - уже прочитанная вызывающим версия компании."""
+        # Версия читается до загрузки, как в ReadCache: параллельная запись оставит снимок устаревшим
+        if version is None:
+            version = await company_version(db, company_id)
+        snapshot = await load_company_snapshot(db, company_id) if version is not None else None
+        stored = None
+        if snapshot is not None:
+            stored = StoredSnapshot(
+                version=version,
+                built_at=time.time(),
+                # Снимок собран по схеме CompanyFullOut, проверять его повторно незачем
+                body=dumps(snapshot),
+            )
+            self.builds += 1
+        await self._save(company_id, stored)
+        return stored
+
+    def schedule_rebuild(self, company_ids):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for company_id in company_ids:
+            task = self._pending.get(company_id)
+            if task is None or task.done():
+                self._pending[company_id] = loop.create_task(self._rebuild_later(company_id))
+
+    async def _rebuild_later(self, company_id: int):
+        try:
+            await asyncio.sleep(self.debounce)
+        finally:
+            # Записи во время сборки поставят следующую
+            self._pending.pop(company_id, None)
+        try:
+            async with self.session_factory() as db:
+                await self.build(db, company_id)
+        except Exception:
+            logger.exception("Фоновая сборка снимка компании %s не удалась", company_id)
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "builds": self.builds,
+            "served": self.served,
+            "stale_served": self.stale_served,
+            "pending_rebuilds": len(self._pending),
+            "errors": self.errors,
+            "debounce_seconds": self.debounce,
+        }
+
+
+snapshot_store = SnapshotStore(read_cache, AsyncSessionLocal, debounce=SNAPSHOT_DEBOUNCE_SECONDS, ttl=SNAPSHOT_TTL)
+company_commit_listeners.append(snapshot_store.schedule_rebuild)
@@ -0,0 +1,182 @@
+import asyncio
+import codecs
+import csv
+import json
+import os
+from collections import Counter
+
+from pydantic import ValidationError
+from sqlalchemy import select, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from back import schemas
+from back.auth.hashing import hash_password, import_password_hasher
+from back.counters import adjust_counters
+from back.models import Company, User, UserRole
+from back.feed.change_feed import record_change
+from back.versioning import mark_companies_changed
+
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", "500"))
+
+CSV_MEDIA_TYPES = {"text/csv", "application/csv"}
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(content_type: str | None, explicit: str | None) -> str:
+    if explicit:
+        if explicit not in ("csv", "ndjson"):
+            raise ImportFormatError("Формат импорта должен быть csv или ndjson")
+        return explicit
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type in CSV_MEDIA_TYPES:
+        return "csv"
+    if media_type in NDJSON_MEDIA_TYPES:
+        return "ndjson"
+    raise ImportFormatError("Ожидается text/csv или application/x-ndjson")
+
+
+async def iter_lines(chunks):
+    """Построчно декодирует поток байтов, не собирая тело запроса целиком."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_no + 1, buffer.rstrip("\r")
+
+
+async def iter_records(chunks, fmt: str):
+    """Отдаёт (номер строки, словарь полей или текст ошибки). Запись CSV занимает одну строку."""
+    header = None
+    async for line_no, line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            if len(values) != len(header):
+                yield line_no, f"Ожидалось полей: {len(header)}, получено: {len(values)}"
+                continue
+            yield line_no, dict(zip(header, values))
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, "Некорректный JSON"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, "Ожидался JSON-объект"
+                continue
+            yield line_no, record
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+class UserImport:
+    """Импорт пользователей в компанию пакетами по USER_IMPORT_BATCH_SIZE строк.
+
+    На пакет приходится один запрос проверки уникальности, параллельное хеширование
+    паролей в пуле процессов и один многострочный INSERT. Каждый пакет коммитится
+    отдельно, поэтому ошибка в конце файла не откатывает уже загруженных пользователей.
+    """
+
+    def __init__(self, db: AsyncSession, company_id: int):
+        self.db = db
+        self.company_id = company_id
+        self.created = 0
+        self.errors: list[schemas.UserImportError] = []
+        self._seen_usernames: set[str] = set()
+        self._seen_emails: set[str] = set()
+
+    def _fail(self, line: int, error: str, username: str | None = None):
+        self.errors.append(schemas.UserImportError(line=line, username=username, error=error))
+
+    async def run(self, records) -> schemas.UserImportResponse:
+        batch = []
+        async for line, record in records:
+            if isinstance(record, str):
+                self._fail(line, record)
+                continue
+            try:
+                row = schemas.UserImportRow.model_validate(record)
+            except ValidationError as e:
+                self._fail(line, _validation_message(e), record.get("username"))
+                continue
+            if row.role == UserRole.ADMIN:
+                self._fail(line, "Импорт администраторов запрещён", row.username)
+                continue
+            if row.username in self._seen_usernames or row.email in self._seen_emails:
+                self._fail(line, "Имя или email повторяется в файле", row.username)
+                continue
+            self._seen_usernames.add(row.username)
+            self._seen_emails.add(row.email)
+            batch.append((line, row))
+            if len(batch) >= USER_IMPORT_BATCH_SIZE:
+                await self._import_batch(batch)
+                batch = []
+        if batch:
+            await self._import_batch(batch)
+
+        self.errors.sort(key=lambda error: error.line)
+        return schemas.UserImportResponse(created=self.created, failed=len(self.errors), errors=self.errors)
+
+    async def _import_batch(self, batch: list[tuple[int, schemas.UserImportRow]]):
+        existing = (await self.db.execute(
+            select(User.username, User.email).where(or_(
+                User.username.in_([row.username for _, row in batch]),
+                User.email.in_([row.email for _, row in batch]),
+            ))
+        )).all()
+        taken_usernames = {r.username for r in existing}
+        taken_emails = {r.email for r in existing}
+
+        accepted = []
+        for line, row in batch:
+            if row.username in taken_usernames or row.email in taken_emails:
+                self._fail(line, "Пользователь с таким именем или email уже существует", row.username)
+            else:
+                accepted.append((line, row))
+        if not accepted:
+            return
+
+        hashes = await asyncio.gather(*(
+            import_password_hasher.run(hash_password, row.password) for _, row in accepted
+        ))
+        values = [{
+            "username": row.username,
+            "email": row.email,
+            "hashed_password": hashed_password,
+            "role": row.role,
+            "company_id": self.company_id,
+        } for (_, row), hashed_password in zip(accepted, hashes)]
+
+        try:
+            await self.db.execute(insert(User), values)
+            await adjust_counters(self.db, Company.users_count, Counter({self.company_id: len(values)}))
+            mark_companies_changed(self.db, self.company_id)
+            record_change(self.db, self.company_id, "company.users_imported", created=len(values))
+            await self.db.commit()
+        except IntegrityError:
+            # Параллельная регистрация заняла имя после проверки: пакет целиком не вставлен
+            await self.db.rollback()
+            for line, row in accepted:
+                self._fail(line, "Конфликт уникальности при вставке, повторите импорт строки", row.username)
+            return
+        self.created += len(accepted)
@@ -0,0 +1,328 @@
+"""Сжатие ответов API по Accept-Encoding.
+
+nginx сжимает только то, что проксирует под /api/, а мобильные приложения и
+интеграции ходят на порт 8000 напрямую. Middleware сжимает ответы от
+COMPRESSION_MIN_SIZE байт: zstd или brotli, если установлены zstandard и brotli и
+клиент их принимает, иначе gzip. При равном q у клиента выбор идёт в порядке
+ENCODING_PREFERENCE.
+
+Обычный ответ сжимается целиком. Потоковый (NDJSON-снимок компании) сжимается по
+мере отдачи: накопленное сбрасывается клиенту каждые COMPRESSION_STREAM_FLUSH_BYTES
+исходных байт, так что сжатие не копит весь ответ в памяти. Тела больше
+COMPRESSION_THREAD_MIN_SIZE сжимаются в пуле потоков, чтобы не занимать цикл событий.
+
+Маршрут меняет настройки декоратором route_compression. Ответы с секретами, которые
+зависят от ввода клиента (выдача токена), не сжимаются вовсе: сжатие позволило бы
+подбирать секрет по длине ответа (BREACH). Коэффициент сжатия и процессорное время
+попадают в Server-Timing обычных ответов и в /internal/metrics.
+"""
+import os
+import time
+import zlib
+from dataclasses import dataclass, field
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstd необязателен
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+COMPRESSION_BROTLI_LEVEL = int(os.getenv("COMPRESSION_BROTLI_LEVEL", "4"))
+COMPRESSION_STREAM_FLUSH_BYTES = int(os.getenv("COMPRESSION_STREAM_FLUSH_BYTES", "32768"))
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "262144"))
+
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+COMPRESSIBLE_TYPES = frozenset({
+    "application/json",
+    "application/x-ndjson",
+    "application/problem+json",
+    "application/javascript",
+    "application/xml",
+})
+
+
+class GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_LEVEL)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+ENCODERS = {"gzip": GzipEncoder}
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+
+
+@dataclass(frozen=True)
+class CompressionSettings:
+    enabled: bool = True
+    min_size: int | None = None
+    encodings: tuple[str, ...] | None = None
+
+
+DEFAULT_SETTINGS = CompressionSettings()
+
+
+def route_compression(enabled: bool = True, min_size: int | None = None, encodings: tuple[str, ...] | None = None):
+    """Настройки сжатия маршрута: порог в байтах и допустимые кодировки."""
+    settings = CompressionSettings(enabled, min_size, tuple(encodings) if encodings else None)
+
+    def decorator(func):
+        func.__compression__ = settings
+        return func
+    return decorator
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str | None:
+    """Кодировка из available с наибольшим q у клиента; None - отдавать без сжатия."""
+    available = [name for name in ENCODING_PREFERENCE if name in available]
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name] = quality
+    wildcard = weights.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in available:
+        quality = weights.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def is_compressible(content_type: str | None) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type.endswith("+json") or media_type in COMPRESSIBLE_TYPES
+
+
+@dataclass
+class EncodingStats:
+    responses: int = 0
+    streamed: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    cpu_ms: float = 0.0
+
+
+@dataclass
+class CompressionMetrics:
+    encodings: dict = field(default_factory=dict)
+    below_threshold: int = 0
+    not_accepted: int = 0
+
+    def observe(self, encoding: str, bytes_in: int, bytes_out: int, cpu_ms: float, streamed: bool):
+        stats = self.encodings.setdefault(encoding, EncodingStats())
+        stats.responses += 1
+        stats.streamed += streamed
+        stats.bytes_in += bytes_in
+        stats.bytes_out += bytes_out
+        stats.cpu_ms += cpu_ms
+
+    def stats(self) -> dict:
+        return {
+            "enabled": COMPRESSION_ENABLED,
+            "min_size": COMPRESSION_MIN_SIZE,
+            "available": [name for name in ENCODING_PREFERENCE if name in ENCODERS],
+            "below_threshold": self.below_threshold,
+            "not_accepted": self.not_accepted,
+            "encodings": {
+                name: {
+                    "responses": stats.responses,
+                    "streamed": stats.streamed,
+                    "bytes_in": stats.bytes_in,
+                    "bytes_out": stats.bytes_out,
+                    "ratio": round(stats.bytes_in / stats.bytes_out, 2) if stats.bytes_out else None,
+                    "cpu_ms": round(stats.cpu_ms, 3),
+                    "cpu_ms_per_mb": round(stats.cpu_ms / (stats.bytes_in / 1_000_000), 3) if stats.bytes_in else None,
+                }
+                for name, stats in self.encodings.items()
+            },
+        }
+
+
+compression_metrics = CompressionMetrics()
+
+
+def compress_body(encoding: str, body: bytes) -> tuple[bytes, float]:
+    """Сжатое тело и процессорное время сжатия в мс (время потока, где шло сжатие)."""
+    started = time.thread_time()
+    encoder = ENCODERS[encoding]()
+    compressed = encoder.compress(body) + encoder.finish()
+    return compressed, (time.thread_time() - started) * 1000
+
+
+def _weak_etag(headers: MutableHeaders):
+    # Сжатое представление побайтно отличается от исходного, сильный тег ему не подходит
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["etag"] = f"W/{etag}"
+
+
+class CompressionMiddleware:
+    """ASGI middleware: сжатие ответов по Accept-Encoding с учётом настроек маршрута."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        start_message = None
+        encoder = None
+        encoding = None
+        pending = 0
+        bytes_in = bytes_out = 0
+        cpu_ms = 0.0
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, encoding, pending, bytes_in, bytes_out, cpu_ms
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if start_message is not None:
+                start, start_message = start_message, None
+                headers = MutableHeaders(scope=start)
+                # Маршрут известен только после маршрутизации, поэтому настройки читаются здесь
+                settings = getattr(scope.get("endpoint"), "__compression__", DEFAULT_SETTINGS)
+                eligible = (
+                    settings.enabled
+                    and 200 <= start["status"] < 300 and start["status"] != 204
+                    and "content-encoding" not in headers
+                    and "no-transform" not in headers.get("cache-control", "")
+                    and is_compressible(headers.get("content-type"))
+                )
+                if not eligible:
+                    await send(start)
+                    await send(message)
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                available = [name for name in settings.encodings or ENCODING_PREFERENCE if name in ENCODERS]
+                encoding = negotiate_encoding(accept_encoding, available)
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if encoding is None:
+                    compression_metrics.not_accepted += 1
+                    await send(start)
+                    await send(message)
+                    return
+                min_size = COMPRESSION_MIN_SIZE if settings.min_size is None else settings.min_size
+                if not more_body and len(body) < min_size:
+                    compression_metrics.below_threshold += 1
+                    encoding = None
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                _weak_etag(headers)
+                if not more_body:
+                    if len(body) >= COMPRESSION_THREAD_MIN_SIZE:
+                        compressed, elapsed_ms = await anyio.to_thread.run_sync(compress_body, encoding, body)
+                    else:
+                        compressed, elapsed_ms = compress_body(encoding, body)
+                    compression_metrics.observe(encoding, len(body), len(compressed), elapsed_ms, streamed=False)
+                    headers["Content-Length"] = str(len(compressed))
+                    ratio = len(body) / len(compressed) if compressed else 0
+                    headers.append("Server-Timing", f'compress;dur={elapsed_ms:.1f};desc="{encoding} {ratio:.1f}x"')
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    encoding = None
+                    return
+
+                # Потоковый ответ: длина заранее неизвестна
+                del headers["Content-Length"]
+                encoder = ENCODERS[encoding]()
+                await send(start)
+
+            if encoder is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            started = time.thread_time()
+            chunk = encoder.compress(body)
+            pending += len(body)
+            if not more_body:
+                chunk += encoder.finish()
+            elif pending >= COMPRESSION_STREAM_FLUSH_BYTES:
+                chunk += encoder.flush()
+                pending = 0
+            cpu_ms += (time.thread_time() - started) * 1000
+            bytes_in += len(body)
+            bytes_out += len(chunk)
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            if not more_body:
+                compression_metrics.observe(encoding, bytes_in, bytes_out, cpu_ms, streamed=True)
+                encoder = None
+
+        await self.app(scope, receive, send_compressed)
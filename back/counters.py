@@ -0,0 +1,134 @@
+"""Денормализованные счётчики: companies.projects_count, companies.users_count,
+projects.defects_count и users.open_defects_count.
+
+Слушатель after_flush любой сессии переводит изменения внешних ключей (вставки,
+удаления, в том числе каскадные через ORM, и переназначения) в приращения
+count = count + delta. Приращение под блокировкой строки не теряет параллельные
+записи, в отличие от пересчёта через COUNT. Массовые INSERT в обход unit of work
+сообщают о себе через adjust_counters. Если данные менялись мимо ORM (ручной SQL,
+каскад ON DELETE в самой БД), счётчики чинит пересчёт:
+
+    python -m back.counters --database-url postgresql://...
+"""
+import argparse
+from collections import Counter
+
+from sqlalchemy import bindparam, create_engine, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+
+from back.models import Company, Defect, Project, User
+
+# Счётчик -> (внешний ключ, по которому считаются строки)
+COUNTERS = {
+    Company.projects_count: Project.company_id,
+    Company.users_count: User.company_id,
+    Project.defects_count: Defect.project_id,
+    User.open_defects_count: Defect.user_engineer_id,
+}
+
+
+def _noop(target, value, oldvalue, initiator):
+    pass
+
+
+# Прежнее значение ключа нужно, даже если до присваивания атрибут не был загружен
+for _foreign_key in COUNTERS.values():
+    event.listen(_foreign_key, "set", _noop, active_history=True)
+
+
+def _transition(obj, attribute: str, status: str) -> tuple:
+    history = inspect(obj).attrs[attribute].history
+    unchanged = next(iter(history.unchanged), None)
+    previous = history.deleted[0] if history.deleted else unchanged
+    current = history.added[0] if history.added else unchanged
+    if status == "new":
+        return None, current
+    if status == "deleted":
+        return previous, None
+    return previous, current
+
+
+def _collect_deltas(session) -> dict:
+    deltas = {counter: Counter() for counter in COUNTERS}
+    for status, objects in (("new", session.new), ("dirty", session.dirty), ("deleted", session.deleted)):
+        for obj in objects:
+            for counter, foreign_key in COUNTERS.items():
+                if not isinstance(obj, foreign_key.class_):
+                    continue
+                previous, current = _transition(obj, foreign_key.key, status)
+                if previous == current:
+                    continue
+                if previous is not None:
+                    deltas[counter][previous] -= 1
+                if current is not None:
+                    deltas[counter][current] += 1
+    return deltas
+
+
+def apply_counter_deltas(session: Session, counter, deltas: Counter):
+    """Прибавляет deltas[id] к счётчику одним executemany и обновляет загруженные объекты."""
+    params = [{"row_id": row_id, "delta": delta} for row_id, delta in deltas.items() if delta]
+    if not params:
+        return
+    table = counter.class_.__table__
+    session.connection().execute(
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values({counter.key: table.c[counter.key] + bindparam("delta")}),
+        params,
+    )
+    # Иначе при expire_on_commit=False ответ после записи отдал бы старое значение
+    for param in params:
+        obj = session.identity_map.get(identity_key(counter.class_, param["row_id"]))
+        if obj is not None and counter.key in obj.__dict__:
+            set_committed_value(obj, counter.key, obj.__dict__[counter.key] + param["delta"])
+
+
+@event.listens_for(Session, "after_flush")
+def update_counters(session, flush_context):
+    for counter, deltas in _collect_deltas(session).items():
+        apply_counter_deltas(session, counter, deltas)
+
+
+async def adjust_counters(db, counter, deltas: Counter):
+    """Для массовых INSERT в обход unit of work (аналог mark_companies_changed)."""
+    await db.run_sync(apply_counter_deltas, counter, deltas)
+
+
+def recount_counters(connection) -> dict[str, int]:
+    """Пересчитывает все счётчики через COUNT; возвращает число исправленных строк."""
+    repaired = {}
+    for counter, foreign_key in COUNTERS.items():
+        owner = counter.class_
+        actual = (
+            select(func.count())
+            .select_from(foreign_key.class_)
+            .where(foreign_key == owner.id)
+            .scalar_subquery()
+        )
+        result = connection.execute(update(owner).where(counter != actual).values({counter.key: actual}))
+        repaired[f"{owner.__tablename__}.{counter.key}"] = result.rowcount
+    return repaired
+
+
+def main():
+    from back.database import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="Пересчёт денормализованных счётчиков")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    try:
+        with engine.begin() as connection:
+            repaired = recount_counters(connection)
+    finally:
+        engine.dispose()
+    for name, rows in repaired.items():
+        print(f"{name}: исправлено строк {rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,188 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, insert, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from back import schemas, models
 from back.auth import auth
+from back.auth.authorization import AuthorizationContext, get_authorization_context
+from back.counters import adjust_counters
 from back.database import get_db
 from back.decorators import require_role
+from back.feed.change_feed import record_change
+from back.list_filters import NAME_PREFIX_MAX_LENGTH, SortKey, defect_list_query, sort_key
+from back.pagination import set_next_cursor
+from back.read_session import get_read_db
+from back.versioning import company_etag, etag_matches, mark_companies_changed, not_modified
 
 router = APIRouter(prefix="/defect", tags=["defect"])
 
 @router.post("", response_model=schemas.DefectCreate)
 @require_role(models.UserRole.ENGINEER)
-async def create_defect(defect: schemas.DefectCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+async def create_defect(defect: schemas.DefectCreate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_defect = models.Defect(name=defect.name,project_id=defect.project_id,user_engineer_id=current_user.id)
     db.add(db_defect)
-    db.commit()
-    db.refresh(db_defect)
+    # Проект в identity map нужен и событию, и учёту версий компаний: запрос один
+    project = await db.get(models.Project, defect.project_id) if defect.project_id is not None else None
+    await db.flush()
+    record_change(
+        db, project.company_id if project else current_user.company_id, "defect.created",
+        user_ids=[current_user.id], defect_id=db_defect.id, project_id=db_defect.project_id, engineer_id=current_user.id,
+    )
+    await db.commit()
+    await db.refresh(db_defect)
     return db_defect
 
+@router.post("/bulk", response_model=schemas.DefectBulkCreateResponse)
+@require_role(models.UserRole.ENGINEER)
+async def create_defects_bulk(
+        payload: schemas.DefectBulkCreate,
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user)
+):
+    # Доступ проверяется одним запросом на все различные проекты пакета:
+    # проект компании инженера или проект, в команду которого он входит
+    project_ids = {item.project_id for item in payload.defects if item.project_id is not None}
+    allowed_projects = {}
+    if project_ids:
+        rows = (await db.execute(
+            select(models.Project.id, models.Project.company_id).where(
+                models.Project.id.in_(project_ids),
+                or_(
+                    models.Project.company_id == current_user.company_id,
+                    models.Project.id.in_(
+                        select(models.projects_engineers.c.project_id).where(
+                            models.projects_engineers.c.user_engineer_id == current_user.id
+                        )
+                    ),
+                ),
+            )
+        )).all()
+        allowed_projects = {row.id: row.company_id for row in rows}
+
+    results = [None] * len(payload.defects)
+    values, indexes = [], []
+    for index, item in enumerate(payload.defects):
+        if item.project_id is not None and item.project_id not in allowed_projects:
+            results[index] = schemas.DefectBulkItemResult(
+                index=index,
+                error="Проект не найден или у вас нет к нему доступа"
+            )
+            continue
+        values.append({
+            "name": item.name,
+            "project_id": item.project_id,
+            "user_engineer_id": current_user.id,
+        })
+        indexes.append(index)
+
+    if values:
+        # Один INSERT ... RETURNING на весь пакет; порядок строк совпадает с порядком values
+        defect_ids = (await db.scalars(
+            insert(models.Defect).returning(models.Defect.id, sort_by_parameter_order=True),
+            values,
+        )).all()
+        for index, defect_id in zip(indexes, defect_ids):
+            results[index] = schemas.DefectBulkItemResult(index=index, defect_id=defect_id)
+
+        await adjust_counters(db, models.Project.defects_count, Counter(
+            value["project_id"] for value in values if value["project_id"] is not None
+        ))
+        await adjust_counters(db, models.User.open_defects_count, Counter({current_user.id: len(values)}))
+        mark_companies_changed(db, current_user.company_id, *allowed_projects.values())
+        created_by_company = {}
+        for value, defect_id in zip(values, defect_ids):
+            company_id = allowed_projects.get(value["project_id"], current_user.company_id)
+            created_by_company.setdefault(company_id, []).append(defect_id)
+        for company_id, company_defect_ids in created_by_company.items():
+            record_change(
+                db, company_id, "defect.bulk_created",
+                user_ids=[current_user.id], defect_ids=company_defect_ids, engineer_id=current_user.id,
+            )
+        await db.commit()
+
+    return schemas.DefectBulkCreateResponse(
+        created=len(values),
+        failed=len(results) - len(values),
+        results=results,
+    )
+
 @router.delete("/{defect_id}")
 @require_role(models.UserRole.ENGINEER)
-async def delete_defect(defect_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_defect = db.query(models.Defect).filter(
+async def delete_defect(defect_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+    db_defect = await db.scalar(select(models.Defect).where(
         models.Defect.id == defect_id,
         models.Defect.user_engineer_id == current_user.id
-    ).first()
+    ))
 
     if not db_defect:
         raise HTTPException(status_code=404, detail="Дефект не найдена")
 
-    db.delete(db_defect)
-    db.commit()
+    project = await db.get(models.Project, db_defect.project_id) if db_defect.project_id is not None else None
+    record_change(
+        db, project.company_id if project else current_user.company_id, "defect.deleted",
+        user_ids=[current_user.id], defect_id=db_defect.id, project_id=db_defect.project_id,
+    )
+    await db.delete(db_defect)
+    await db.commit()
     return {"message": "Дефект удален"}
 
 @router.get("/my-defects")
 @require_role(models.UserRole.ENGINEER)
 async def get_my_defects(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    project_id: Optional[int] = None,
+    name_prefix: Optional[str] = Query(None, min_length=1, max_length=NAME_PREFIX_MAX_LENGTH),
+    sort: SortKey = "id",
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
-    defects = db.query(models.Defect).options(
+    # Любое изменение дефекта повышает версию компании его инженера
+    etag = await company_etag(
+        db,
+        current_user.company_id,
+        f"my-defects:{current_user.id}:{skip}:{limit}:{cursor}:{project_id}:{name_prefix}:{sort}",
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    query = defect_list_query(
+        current_user.id, project_id=project_id, name_prefix=name_prefix, sort=sort, cursor=cursor
+    ).options(
         joinedload(models.Defect.engineer),
         joinedload(models.Defect.project)
-    ).filter(
-        models.Defect.user_engineer_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    ).limit(limit + 1)
+
+    if not cursor:
+        query = query.offset(skip)
 
-    return defects
+    defects = (await db.scalars(query)).all()
+
+    if etag:
+        response.headers["ETag"] = etag
+    return set_next_cursor(response, defects, limit, key=sort_key(sort))
 
 @router.get("/my-defects/{defect_id}")
 @require_role(models.UserRole.ENGINEER)
 async def get_my_defect(defect_id: int,
-                         db: Session = Depends(get_db),
+                         db: AsyncSession = Depends(get_read_db),
                          current_user: models.User = Depends(auth.get_current_user)
 ):
 
-    defect = db.query(models.Defect).options(
+    defect = await db.scalar(select(models.Defect).options(
         joinedload(models.Defect.engineer),
         joinedload(models.Defect.project)
-    ).filter(
+    ).where(
         models.Defect.id == defect_id,
         models.Defect.user_engineer_id == current_user.id
-    ).first()
+    ))
 
     if not defect:
         raise HTTPException(
@@ -77,27 +197,18 @@ async def get_my_defect(defect_id: int,
 @require_role([models.UserRole.MANAGER, models.UserRole.ADMIN])
 async def remove_engineer_from_defect(
         defect_id: int,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user),
+        authz: AuthorizationContext = Depends(get_authorization_context)
 ):
-    db_defect = db.query(models.Defect).filter(
-        models.Defect.id == defect_id
-    ).first()
+    access = await authz.defect(defect_id)
+    db_defect = access.defect
 
-    if not db_defect:
-        raise HTTPException(status_code=404, detail="Дефект не найден")
-
-    if current_user.role == models.UserRole.MANAGER:
-        project = db.query(models.Project).filter(
-            models.Project.id == db_defect.project_id,
-            models.Project.user_manager_id == current_user.id
-        ).first()
-
-        if not project:
-            raise HTTPException(
-                status_code=403,
-                detail="Недостаточно прав. Вы не являетесь менеджером проекта этого дефекта"
-            )
+    if authz.is_manager and not access.manages_project:
+        raise HTTPException(
+            status_code=403,
+            detail="Недостаточно прав. Вы не являетесь менеджером проекта этого дефекта"
+        )
 
     if not db_defect.user_engineer_id:
         raise HTTPException(
@@ -107,21 +218,23 @@ async def remove_engineer_from_defect(
 
     try:
         engineer_id = db_defect.user_engineer_id
-        defect_name = db_defect.name
 
         db_defect.user_engineer_id = None
-        db.commit()
-        db.refresh(db_defect)
+        record_change(
+            db, access.project.company_id if access.project else current_user.company_id, "defect.engineer_removed",
+            user_ids=[engineer_id], defect_id=db_defect.id, project_id=db_defect.project_id, engineer_id=engineer_id,
+        )
+        await db.commit()
 
         return schemas.RemoveDefectResponse(
             message="Инженер успешно удален из дефекта",
             defect_id=db_defect.id,
-            defect_name=defect_name,
+            defect_name=db_defect.name,
             engineer_id=engineer_id
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при удалении инженера из дефекта: {str(e)}"
@@ -133,38 +246,25 @@ async def remove_engineer_from_defect(
 async def assign_engineer_to_defect(
         defect_id: int,
         engineer_data: schemas.AssignEngineerToDefect,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user),
+        authz: AuthorizationContext = Depends(get_authorization_context)
 ):
-    db_defect = db.query(models.Defect).filter(
-        models.Defect.id == defect_id
-    ).first()
-
-    if not db_defect:
-        raise HTTPException(status_code=404, detail="Дефект не найден")
-
-    db_engineer = db.query(models.User).filter(
-        models.User.id == engineer_data.engineer_id,
-        models.User.role == models.UserRole.ENGINEER
-    ).first()
+    # Дефект, его проект и назначаемый инженер приходят одним запросом
+    access = await authz.defect(defect_id, engineer_id=engineer_data.engineer_id)
+    db_defect = access.defect
+    db_engineer = access.engineer
 
     if not db_engineer:
         raise HTTPException(status_code=404, detail="Инженер не найден")
 
-    if current_user.role == models.UserRole.MANAGER:
-        project = db.query(models.Project).filter(
-            models.Project.id == db_defect.project_id,
-            models.Project.user_manager_id == current_user.id
-        ).first()
-
-        if not project:
-            raise HTTPException(
-                status_code=403,
-                detail="Недостаточно прав. Вы не являетесь менеджером проекта этого дефекта"
-            )
+    if authz.is_manager and not access.manages_project:
+        raise HTTPException(
+            status_code=403,
+            detail="Недостаточно прав. Вы не являетесь менеджером проекта этого дефекта"
+        )
 
-    project = db.query(models.Project).filter(models.Project.id == db_defect.project_id).first()
-    if db_engineer.company_id != project.company_id:
+    if access.project is None or db_engineer.company_id != access.project.company_id:
         raise HTTPException(
             status_code=400,
             detail="Инженер должен состоять в той же компании что и проект дефекта"
@@ -180,8 +280,13 @@ async def assign_engineer_to_defect(
         previous_engineer_id = db_defect.user_engineer_id
 
         db_defect.user_engineer_id = engineer_data.engineer_id
-        db.commit()
-        db.refresh(db_defect)
+        record_change(
+            db, access.project.company_id, "defect.engineer_assigned",
+            user_ids=[engineer_data.engineer_id, previous_engineer_id],
+            defect_id=db_defect.id, project_id=db_defect.project_id,
+            engineer_id=engineer_data.engineer_id, previous_engineer_id=previous_engineer_id,
+        )
+        await db.commit()
 
         message = "Инженер успешно привязан к дефекту"
         if previous_engineer_id:
@@ -195,7 +300,7 @@ async def assign_engineer_to_defect(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при привязке инженера к дефекту: {str(e)}"
@@ -0,0 +1,5 @@
+from fastapi import APIRouter
+from .feed_routes import router as feed_routes
+
+feed_crud_routes = APIRouter()
+feed_crud_routes.include_router(feed_routes)
\ No newline at end of file
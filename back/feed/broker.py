@@ -0,0 +1,89 @@
+"""Доставка событий изменений между воркерами.
+
+Брокер получает сериализованное событие от воркера, закоммитившего изменение, и
+передаёт его обработчику каждого воркера, включая отправителя. Дальше событие
+раздаёт подписчикам уже сам процесс (back.feed.change_feed).
+"""
+import asyncio
+import logging
+import os
+
+from back.cache import REDIS_URL
+
+CHANGE_FEED_BACKEND = os.getenv("CHANGE_FEED_BACKEND", "redis" if os.getenv("REDIS_URL") else "local")
+CHANGE_FEED_CHANNEL = os.getenv("CHANGE_FEED_CHANNEL", "ysi:changes")
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """Брокер в памяти процесса. При нескольких воркерах подписчик видит только
+    изменения, закоммиченные его воркером, поэтому он годится для одного процесса
+    и тестов."""
+
+    def __init__(self):
+        self._handler = None
+
+    async def start(self, handler):
+        self._handler = handler
+
+    async def publish(self, payload: bytes):
+        if self._handler is not None:
+            self._handler(payload)
+
+    async def close(self):
+        self._handler = None
+
+
+class RedisBroker:
+    """Канал Redis pub/sub: каждый воркер слушает его в фоновой задаче."""
+
+    def __init__(self, url: str, channel: str):
+        from redis import asyncio as redis_asyncio
+
+        self._client = redis_asyncio.Redis.from_url(url)
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+
+    async def start(self, handler):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub, handler))
+
+    async def _listen(self, pubsub, handler):
+        try:
+            while True:
+                try:
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            handler(message["data"])
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # Пропущенное за время переподключения подписчики заметят по разрыву номеров
+                    logger.exception("Ошибка чтения канала изменений %s, переподключение", self.channel)
+                    await asyncio.sleep(1)
+                    await pubsub.subscribe(self.channel)
+        finally:
+            await pubsub.aclose()
+
+    async def publish(self, payload: bytes):
+        await self._client.publish(self.channel, payload)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._client.aclose()
+
+
+def create_broker(kind: str):
+    if kind == "redis":
+        return RedisBroker(REDIS_URL, CHANGE_FEED_CHANNEL)
+    if kind == "local":
+        return LocalBroker()
+    raise ValueError(f"Неизвестный брокер изменений: {kind}")
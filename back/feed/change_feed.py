@@ -0,0 +1,296 @@
+"""Лента изменений компании: события о дефектах, проектах и составе компании.
+
+Маршрут, меняющий данные, записывает событие в сессию (record_change). После
+успешного коммита TrackedAsyncSession отдаёт события ленте, откат их отменяет, как
+и повышение версий компаний в back.versioning. Лента нумерует события счётчиком
+компании в бэкенде кэша чтения (в Redis он общий для всех воркеров) и рассылает их
+через брокер (back.feed.broker). Каждый воркер кладёт пришедшие события в кольцевой
+буфер компании и раздаёт своим подписчикам.
+
+Подписчик, переподключившийся с Last-Event-ID, получает из буфера пропущенное.
+Если буфер уже не покрывает разрыв (событий было больше CHANGE_FEED_BUFFER_SIZE или
+воркер перезапускался), первым приходит событие reset: списки надо перечитать.
+Подписчик, который не успевает читать, отключается при переполнении очереди и
+продолжает с Last-Event-ID.
+
+Доступ к ленте проверяется при подписке, поэтому события о потере доступа
+(ACCESS_REVOKING_EVENTS) закрывают подписки затронутых пользователей во всех
+воркерах: исключённый из компании получает это событие последним, а при удалении
+компании закрываются все её подписки.
+
+Видимость повторяет читающие маршруты: администратор и менеджер видят все события
+компании, клиент - всё, кроме состава компании (company.*), инженер - события,
+в которых он участвует (свои дефекты, свои назначения в проекты).
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict, deque
+from dataclasses import dataclass
+
+from sqlalchemy import event
+
+from back.auth.principal_cache import Principal
+from back.cache import read_cache
+from back.database import COMMITTED_EVENTS_KEY, PENDING_EVENTS_KEY, TrackedSession, change_event_publishers
+from back.feed.broker import CHANGE_FEED_BACKEND, create_broker
+from back.models import UserRole
+from back.serialization import dumps
+
+CHANGE_FEED_BUFFER_SIZE = int(os.getenv("CHANGE_FEED_BUFFER_SIZE", "1000"))
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "256"))
+
+# Событие -> закрывает ли оно подписки всех пользователей компании (иначе только user_ids)
+ACCESS_REVOKING_EVENTS = {
+    "company.deleted": True,
+    "company.user_removed": False,
+}
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    company_id: int
+    type: str
+    data: dict
+    # Пользователи, которых событие касается напрямую; по ним инженер видит событие
+    user_ids: tuple[int, ...] = ()
+    id: int | None = None
+
+    def to_message(self) -> dict:
+        return {"id": self.id, "type": self.type, "company_id": self.company_id, "data": self.data}
+
+
+def record_change(session, company_id: int | None, event_type: str, user_ids=(), **data):
+    """Событие уйдёт подписчикам после коммита транзакции сессии; откат его отменяет."""
+    if company_id is None:
+        return
+    change = ChangeEvent(company_id, event_type, data, tuple(uid for uid in user_ids if uid is not None))
+    session.sync_session.info.setdefault(PENDING_EVENTS_KEY, []).append(change)
+
+
+@event.listens_for(TrackedSession, "after_commit")
+def move_committed_events(session):
+    pending = session.info.pop(PENDING_EVENTS_KEY, None)
+    if pending:
+        session.info.setdefault(COMMITTED_EVENTS_KEY, []).extend(pending)
+
+
+@event.listens_for(TrackedSession, "after_soft_rollback")
+def drop_pending_events(session, previous_transaction):
+    session.info.pop(PENDING_EVENTS_KEY, None)
+
+
+def visible_to(change: ChangeEvent, principal: Principal) -> bool:
+    if principal.role in (UserRole.ADMIN, UserRole.MANAGER):
+        return True
+    if principal.role == UserRole.CLIENT:
+        return not change.type.startswith("company.")
+    return principal.id in change.user_ids
+
+
+def revokes_access(change: ChangeEvent, principal: Principal) -> bool:
+    whole_company = ACCESS_REVOKING_EVENTS.get(change.type)
+    if whole_company is None:
+        return False
+    return whole_company or principal.id in change.user_ids
+
+
+class Subscription:
+    def __init__(self, feed: "ChangeFeed", principal: Principal, company_id: int):
+        self.feed = feed
+        self.principal = principal
+        self.company_id = company_id
+        self.queue: asyncio.Queue[ChangeEvent] = asyncio.Queue(CHANGE_FEED_QUEUE_SIZE)
+        self.backlog: deque[ChangeEvent] = deque()
+        self.reset = False
+        self.overflowed = False
+        self.revoked = False
+        self._backlog_ids: set[int] = set()
+        self._loop = asyncio.get_running_loop()
+
+    def _call(self, callback, *args):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        # Публикация из другого цикла событий (служебный поток) передаётся в цикл подписчика
+        if running is self._loop:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def offer(self, change: ChangeEvent):
+        if visible_to(change, self.principal):
+            self._call(self._put, change)
+
+    def revoke(self):
+        """Закрывает подписку после уже отданных в очередь событий."""
+        self._call(self._revoke)
+
+    def _put(self, change: ChangeEvent):
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def _revoke(self):
+        self.revoked = True
+        # Будит ожидающий next(), чтобы поток закрылся сразу, а не после пинга
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    def add_backlog(self, changes):
+        for change in changes:
+            if visible_to(change, self.principal):
+                self.backlog.append(change)
+                self._backlog_ids.add(change.id)
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+    @property
+    def closed(self) -> bool:
+        return (self.overflowed or self.revoked) and not self.backlog and self.queue.empty()
+
+    async def next(self, timeout: float) -> ChangeEvent | None:
+        """Следующее событие или None, если за timeout секунд событий не было."""
+        if self.backlog:
+            return self.backlog.popleft()
+        while True:
+            try:
+                change = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            # Событие, пришедшее во время чтения буфера, уже отдано из backlog
+            if change is None or change.id not in self._backlog_ids:
+                return change
+
+
+class ChangeFeed:
+    def __init__(self, broker, buffer_size: int):
+        self.broker = broker
+        self.buffer_size = buffer_size
+        self.buffers: dict[int, deque[ChangeEvent]] = {}
+        self.subscribers: defaultdict[int, set[Subscription]] = defaultdict(set)
+        self._started = False
+        self.published = 0
+        self.delivered = 0
+        self.resets = 0
+        self.overflows = 0
+        self.revoked = 0
+        self.errors = 0
+
+    def _counter_key(self, company_id: int) -> str:
+        return f"{read_cache.prefix}:feed:{company_id}"
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        try:
+            await self.broker.start(self.deliver)
+        except Exception:
+            self._started = False
+            raise
+
+    async def publish(self, changes: list[ChangeEvent]):
+        # Коммит уже прошёл: сбой ленты не должен превращать его в ошибку запроса
+        try:
+            await self.start()
+            for change in changes:
+                change_id = await read_cache.backend.incr(self._counter_key(change.company_id))
+                await self.broker.publish(dumps({**change.to_message(), "id": change_id, "users": change.user_ids}))
+                self.published += 1
+        except Exception:
+            self.errors += 1
+            logger.exception("Не удалось опубликовать изменения компаний")
+
+    def deliver(self, payload: bytes):
+        message = json.loads(payload)
+        change = ChangeEvent(
+            company_id=message["company_id"],
+            type=message["type"],
+            data=message["data"],
+            user_ids=tuple(message["users"]),
+            id=message["id"],
+        )
+        buffer = self.buffers.get(change.company_id)
+        if buffer is None:
+            buffer = self.buffers[change.company_id] = deque(maxlen=self.buffer_size)
+        elif change.id == 1:
+            # Счётчик начался заново (Redis очищен или перезапущен без сохранения): события
+            # в буфере пронумерованы прежним счётчиком и смешались бы с новыми номерами
+            buffer.clear()
+        buffer.append(change)
+        self.delivered += 1
+        for subscription in list(self.subscribers.get(change.company_id, ())):
+            subscription.offer(change)
+            if subscription.overflowed:
+                self.overflows += 1
+                self.subscribers[change.company_id].discard(subscription)
+            elif revokes_access(change, subscription.principal):
+                subscription.revoke()
+                self.revoked += 1
+                self.subscribers[change.company_id].discard(subscription)
+
+    async def subscribe(self, principal: Principal, company_id: int, last_event_id: int | None = None) -> Subscription:
+        await self.start()
+        subscription = Subscription(self, principal, company_id)
+        # Подписка регистрируется до чтения буфера, чтобы не потерять событие между ними
+        self.subscribers[company_id].add(subscription)
+        if last_event_id is None:
+            return subscription
+
+        buffered = list(self.buffers.get(company_id, ()))
+        try:
+            current = int(await read_cache.backend.get(self._counter_key(company_id)) or 0)
+        except Exception:
+            current = None
+        covered = current is not None and (
+            last_event_id == current
+            or (last_event_id < current and buffered and buffered[0].id <= last_event_id + 1)
+        )
+        if covered:
+            subscription.add_backlog(change for change in buffered if change.id > last_event_id)
+        else:
+            subscription.reset = True
+            self.resets += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self.subscribers.get(subscription.company_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscribers[subscription.company_id]
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.broker).__name__,
+            "subscribers": sum(len(subscriptions) for subscriptions in self.subscribers.values()),
+            "buffered_companies": len(self.buffers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resets": self.resets,
+            "overflows": self.overflows,
+            "revoked": self.revoked,
+            "errors": self.errors,
+        }
+
+    def clear(self):
+        self.buffers.clear()
+        self.subscribers.clear()
+
+    async def close(self):
+        await self.broker.close()
+        self._started = False
+
+
+change_feed = ChangeFeed(create_broker(CHANGE_FEED_BACKEND), CHANGE_FEED_BUFFER_SIZE)
+change_event_publishers.append(change_feed.publish)
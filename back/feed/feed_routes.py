@@ -0,0 +1,147 @@
+import os
+from datetime import timedelta
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from back import models, schemas
+from back.auth import auth
+from back.auth.principal_cache import Principal
+from back.cache import read_cache
+from back.compression import route_compression
+from back.database import get_session_factory
+from back.feed.change_feed import Subscription, change_feed
+from back.serialization import dumps
+
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+# Пауза перед переподключением EventSource, мс
+CHANGE_FEED_RETRY_MS = int(os.getenv("CHANGE_FEED_RETRY_MS", "3000"))
+# Срок билета для открытия WebSocket, секунды
+FEED_TICKET_TTL_SECONDS = int(os.getenv("FEED_TICKET_TTL_SECONDS", "30"))
+FEED_TICKET_SCOPE = "feed"
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+
+def feed_company(principal: Principal, company_id: int | None) -> int:
+    if principal.role == models.UserRole.ADMIN:
+        if company_id is None:
+            raise HTTPException(status_code=400, detail="Не указана компания")
+        return company_id
+    if principal.company_id is None:
+        raise HTTPException(status_code=403, detail="Пользователь не состоит в компании")
+    if company_id is not None and company_id != principal.company_id:
+        raise HTTPException(status_code=403, detail="Недостаточно прав для получения данных этой компании")
+    return principal.company_id
+
+
+def parse_event_id(value: str | None) -> int | None:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def sse_message(change) -> bytes:
+    return f"id: {change.id}\nevent: {change.type}\ndata: ".encode() + dumps(change.to_message()) + b"\n\n"
+
+
+async def sse_stream(subscription: Subscription, heartbeat: float = CHANGE_FEED_HEARTBEAT_SECONDS):
+    try:
+        yield f"retry: {CHANGE_FEED_RETRY_MS}\n\n".encode()
+        if subscription.reset:
+            yield b'event: reset\ndata: {"type":"reset"}\n\n'
+        # При переполнении поток завершается, клиент переподключится с Last-Event-ID;
+        # после потери доступа переподключение получит отказ
+        while not subscription.closed:
+            change = await subscription.next(heartbeat)
+            if change is not None:
+                yield sse_message(change)
+            elif not subscription.closed:
+                # Комментарий держит соединение через прокси и выявляет отключившихся клиентов
+                yield b": ping\n\n"
+    finally:
+        subscription.close()
+
+
+async def consume_ticket(ticket: str, db) -> Principal:
+    """Пользователь билета; повторное предъявление билета отклоняется."""
+    payload = auth.decode_token(ticket, scope=FEED_TICKET_SCOPE)
+    if not await read_cache.backend.add(f"{read_cache.prefix}:feed-ticket:{payload['jti']}", b"1", FEED_TICKET_TTL_SECONDS):
+        raise auth.credentials_exception()
+    return await auth.load_principal(payload, db)
+
+
+@router.get("/events")
+# Сжатие копило бы события до сброса буфера, а лента должна доходить сразу
+@route_compression(enabled=False)
+async def stream_changes(
+        company_id: int | None = None,
+        last_event_id: int | None = Query(None, description="Для клиентов, которые не могут передать заголовок"),
+        last_event_id_header: str | None = Header(None, alias="Last-Event-ID"),
+        current_user: Principal = Depends(auth.get_current_user)
+):
+    company_id = feed_company(current_user, company_id)
+    resume_from = parse_event_id(last_event_id_header)
+    subscription = await change_feed.subscribe(
+        current_user, company_id, resume_from if resume_from is not None else last_event_id
+    )
+    return StreamingResponse(
+        sse_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/ticket", response_model=schemas.FeedTicket)
+async def create_ticket(current_user: Principal = Depends(auth.get_current_user)):
+    """Одноразовый короткий билет для /feed/ws.
+
+    Браузер не передаёт заголовки при открытии WebSocket, и учётные данные попадают в
+    строку запроса, а с ней в журналы прокси. Поэтому туда идёт не токен доступа, а
+    билет: он годится для одного подключения и истекает через FEED_TICKET_TTL_SECONDS.
+    """
+    ticket = auth.create_access_token(
+        {"sub": current_user.username, "scope": FEED_TICKET_SCOPE},
+        expires_delta=timedelta(seconds=FEED_TICKET_TTL_SECONDS),
+    )
+    return {"ticket": ticket, "expires_in": FEED_TICKET_TTL_SECONDS}
+
+
+@router.websocket("/ws")
+async def changes_websocket(
+        websocket: WebSocket,
+        ticket: str,
+        company_id: int | None = None,
+        last_event_id: int | None = None,
+        session_factory=Depends(get_session_factory)
+):
+    try:
+        async with session_factory() as db:
+            principal = await consume_ticket(ticket, db)
+        company_id = feed_company(principal, company_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    subscription = await change_feed.subscribe(principal, company_id, last_event_id)
+    try:
+        if subscription.reset:
+            await websocket.send_text('{"type":"reset"}')
+        while not subscription.closed:
+            change = await subscription.next(CHANGE_FEED_HEARTBEAT_SECONDS)
+            if change is not None:
+                await websocket.send_text(dumps(change.to_message()).decode())
+            elif not subscription.closed:
+                await websocket.send_text('{"type":"ping"}')
+        if subscription.revoked:
+            # 1008: доступа к ленте компании больше нет, переподключаться незачем
+            await websocket.close(code=1008, reason="Доступ к ленте компании отозван")
+        else:
+            # 1013: клиент не успевал читать, пусть переподключится с last_event_id
+            await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
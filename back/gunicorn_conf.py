@@ -0,0 +1,36 @@
+"""Конфигурация gunicorn для продакшен-профиля (APP_PROFILE=production).
+
+Воркеры uvicorn сами выбирают uvloop и httptools, если они установлены.
+"""
+import os
+
+from back.serve import worker_count
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = worker_count("production")
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Приложение импортируется один раз в мастере, воркеры получают его через fork
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Перезапуск воркера после N запросов ограничивает рост памяти; jitter разводит перезапуски во времени
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Пулы созданы в мастере до fork; соединения мастера воркеру использовать нельзя
+    from back.database import async_engine, engine, replica_engines
+
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    for replica in replica_engines:
+        replica.sync_engine.dispose(close=False)
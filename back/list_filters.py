@@ -0,0 +1,92 @@
+"""Фильтры и сортировки списков /defect/my-defects и /project/my-projects.
+
+Каждый список принадлежит владельцу (инженеру дефектов или компании проектов), и
+каждое допустимое сочетание фильтров и сортировки обслуживается составным индексом,
+начинающимся с владельца. back.benchmarks.filter_plans проверяет это по EXPLAIN для
+всех сочетаний, поэтому новый фильтр добавляется вместе с индексом.
+
+Имя может быть NULL, а сравнение с NULL ложно, и курсор по такой строке не находил бы
+продолжения. Поэтому имя везде - в индексах, сортировке, курсоре и фильтре по
+префиксу - берётся как coalesce(name, ''): строки без имени идут первыми, как пустые.
+"""
+from typing import Literal
+
+from sqlalchemy import and_, func, literal_column, select, tuple_
+
+from back.models import Defect, Project, projects_engineers
+from back.pagination import decode_cursor
+
+SortKey = Literal["id", "-id", "name", "-name"]
+SORT_KEYS: tuple[str, ...] = SortKey.__args__
+
+NAME_PREFIX_MAX_LENGTH = 100
+
+
+def sort_name(model):
+    # Литерал, а не параметр: выражение должно совпасть с выражением индекса
+    return func.coalesce(model.name, literal_column("''"))
+
+
+def name_prefix_filter(column, prefix: str):
+    # Диапазон ведёт поиск по индексу (LIKE индекс не использует), LIKE отсекает
+    # строки, попавшие в диапазон из-за правил сравнения строк
+    upper = prefix[:-1] + chr(min(ord(prefix[-1]) + 1, 0x10FFFF))
+    return and_(column >= prefix, column < upper, column.startswith(prefix, autoescape=True))
+
+
+def sort_columns(model, sort: SortKey) -> list:
+    return [model.id] if sort.lstrip("-") == "id" else [sort_name(model), model.id]
+
+
+def sort_key(sort: SortKey):
+    """Значения курсора для последней строки страницы."""
+    if sort.lstrip("-") == "id":
+        return lambda row: [row.id]
+    return lambda row: [row.name or "", row.id]
+
+
+def apply_sort(query, model, sort: SortKey, cursor: str | None):
+    columns = sort_columns(model, sort)
+    descending = sort.startswith("-")
+    if cursor:
+        values = decode_cursor(cursor, (int,) if len(columns) == 1 else (str, int))
+        key, after = (columns[0], values[0]) if len(columns) == 1 else (tuple_(*columns), tuple_(*values))
+        query = query.where(key < after if descending else key > after)
+    return query.order_by(*(column.desc() if descending else column for column in columns))
+
+
+def defect_list_query(
+        engineer_id: int,
+        project_id: int | None = None,
+        name_prefix: str | None = None,
+        sort: SortKey = "id",
+        cursor: str | None = None,
+):
+    """Дефекты инженера; индексы ix_defects_user_engineer_id_*."""
+    query = select(Defect).where(Defect.user_engineer_id == engineer_id)
+    if project_id is not None:
+        query = query.where(Defect.project_id == project_id)
+    if name_prefix:
+        query = query.where(name_prefix_filter(sort_name(Defect), name_prefix))
+    return apply_sort(query, Defect, sort, cursor)
+
+
+def project_list_query(
+        company_id: int | None,
+        manager_id: int | None = None,
+        engineer_id: int | None = None,
+        name_prefix: str | None = None,
+        sort: SortKey = "id",
+        cursor: str | None = None,
+):
+    """Проекты компании; индексы ix_projects_company_id_* и ix_projects_engineers_user_engineer_id."""
+    query = select(Project).where(Project.company_id == company_id)
+    if manager_id is not None:
+        query = query.where(Project.user_manager_id == manager_id)
+    if engineer_id is not None:
+        query = query.where(Project.id.in_(
+            select(projects_engineers.c.project_id).where(projects_engineers.c.user_engineer_id == engineer_id)
+        ))
+    if name_prefix:
+        query = query.where(name_prefix_filter(sort_name(Project), name_prefix))
+    return apply_sort(query, Project, sort, cursor)
@@ -1,19 +1,57 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from back.auth import token_routes
+from back.auth.hashing import import_password_hasher, password_hasher
+from back.cache import read_cache
+from back.compression import CompressionMiddleware
 from back.company import company_crud_routes
+from back.company.company_crud_routes import SNAPSHOT_AGE_HEADER, SNAPSHOT_STALE_HEADER
 from back.defect import defect_crud_routes
+from back.feed import feed_crud_routes
+from back.feed.change_feed import change_feed
+from back.metrics import internal_metrics_routes
+from back.metrics.queries import QUERIES_HEADER, QUERY_TIME_HEADER, QueryInstrumentationMiddleware
+from back.pagination import NEXT_CURSOR_HEADER
 from back.project import project_crud_routes
-app = FastAPI()
+from back.search import search_crud_routes
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    password_hasher.shutdown()
+    import_password_hasher.shutdown()
+    await read_cache.backend.close()
+    await change_feed.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(token_routes)
 app.include_router(company_crud_routes)
 app.include_router(defect_crud_routes)
 app.include_router(project_crud_routes)
+app.include_router(search_crud_routes)
+app.include_router(feed_crud_routes)
+app.include_router(internal_metrics_routes)
 
+# Внутренний слой: CORS и счётчик запросов видят уже сжатый ответ
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+    expose_headers=[
+        NEXT_CURSOR_HEADER,
+        "ETag",
+        QUERIES_HEADER,
+        QUERY_TIME_HEADER,
+        "Server-Timing",
+        SNAPSHOT_AGE_HEADER,
+        SNAPSHOT_STALE_HEADER,
+    ],
+)
+app.add_middleware(QueryInstrumentationMiddleware)
\ No newline at end of file
@@ -0,0 +1,5 @@
+from fastapi import APIRouter
+from .metrics_routes import router as metrics_routes
+
+internal_metrics_routes = APIRouter()
+internal_metrics_routes.include_router(metrics_routes)
\ No newline at end of file
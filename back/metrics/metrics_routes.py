@@ -0,0 +1,52 @@
+import os
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from back import models
+from back.auth import auth
+from back.auth.hashing import import_password_hasher, password_hasher
+from back.auth.principal_cache import principal_cache
+from back.cache import read_cache
+from back.company.snapshot_store import snapshot_store
+from back.compression import compression_metrics
+from back.database import async_engine, get_db, pool_metrics, read_router
+from back.feed.change_feed import change_feed
+from back.metrics.queries import query_metrics
+
+# Токен для сборщика метрик; без него метрики видит только администратор
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
+
+
+async def check_metrics_access(
+        x_metrics_token: str | None = Header(default=None),
+        token: str | None = Depends(optional_oauth2_scheme),
+        db: AsyncSession = Depends(get_db)
+):
+    if METRICS_TOKEN and x_metrics_token and secrets.compare_digest(x_metrics_token, METRICS_TOKEN):
+        return
+    if token is not None and (await auth.get_current_user(token, db)).role == models.UserRole.ADMIN:
+        return
+    raise HTTPException(status_code=403, detail="Недостаточно прав для просмотра метрик")
+
+
+@router.get("/metrics", dependencies=[Depends(check_metrics_access)])
+async def get_metrics():
+    return {
+        "db_pool": pool_metrics.snapshot(async_engine.sync_engine.pool),
+        "db_reads": read_router.stats(),
+        "password_hashing": password_hasher.stats(),
+        "import_password_hashing": import_password_hasher.stats(),
+        "principal_cache": principal_cache.stats(),
+        "read_cache": read_cache.stats(),
+        "company_snapshots": snapshot_store.stats(),
+        "sql": query_metrics.stats(),
+        "compression": compression_metrics.stats(),
+        "change_feed": change_feed.stats(),
+    }
@@ -0,0 +1,143 @@
+"""Учёт SQL-запросов в рамках одного HTTP-запроса.
+
+Слушатели курсора подключены ко всем движкам SQLAlchemy и считают запросы в
+QueryStats из контекстной переменной. Middleware открывает такой счётчик на каждый
+запрос, отдаёт итоги в заголовках X-DB-Queries, X-DB-Time-ms и Server-Timing и
+пишет в лог запросы, вышедшие за бюджет: по числу запросов, по времени в БД или по
+повторам одного и того же SQL (типичный признак N+1).
+"""
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "true").lower() in ("1", "true", "yes")
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "30"))
+DB_TIME_BUDGET_MS = float(os.getenv("DB_TIME_BUDGET_MS", "500"))
+DB_REPEATED_QUERY_BUDGET = int(os.getenv("DB_REPEATED_QUERY_BUDGET", "10"))
+
+QUERIES_HEADER = "X-DB-Queries"
+QUERY_TIME_HEADER = "X-DB-Time-ms"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+    parent: "QueryStats | None" = None
+    count: int = 0
+    time_ms: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed_ms: float):
+        # Вложенные счётчики (нагрузочный прогон вокруг middleware) видят те же запросы
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.time_ms += elapsed_ms
+            stats.statements[statement] += 1
+            stats = stats.parent
+
+    def most_repeated(self) -> tuple[str, int]:
+        if not self.statements:
+            return "", 0
+        return self.statements.most_common(1)[0]
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("sql_query_stats", default=None)
+
+
+@contextmanager
+def track_queries():
+    """Считает SQL-запросы, выполненные в текущем контексте (задаче asyncio)."""
+    stats = QueryStats(parent=_current_stats.get())
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = conn.info.get("query_started_at")
+    if stats is None or not started:
+        return
+    stats.record(statement, (time.perf_counter() - started.pop()) * 1000)
+
+
+class QueryMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.over_budget = 0
+
+    def observe(self, method: str, path: str, stats: QueryStats):
+        self.requests += 1
+        self.queries += stats.count
+        statement, repeats = stats.most_repeated()
+        if stats.count <= DB_QUERY_BUDGET and stats.time_ms <= DB_TIME_BUDGET_MS and repeats <= DB_REPEATED_QUERY_BUDGET:
+            return
+        self.over_budget += 1
+        logger.warning(
+            "Запрос %s %s превысил бюджет БД: %d запросов, %.1f мс; чаще всего (%d раз): %s",
+            method, path, stats.count, stats.time_ms, repeats, " ".join(statement.split())[:300],
+        )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SQL_INSTRUMENTATION,
+            "requests": self.requests,
+            "queries": self.queries,
+            "over_budget": self.over_budget,
+            "query_budget": DB_QUERY_BUDGET,
+            "time_budget_ms": DB_TIME_BUDGET_MS,
+            "repeated_query_budget": DB_REPEATED_QUERY_BUDGET,
+        }
+
+
+query_metrics = QueryMetrics()
+
+
+class QueryInstrumentationMiddleware:
+    """ASGI middleware: заголовки с числом и временем SQL-запросов и лог превышений бюджета.
+
+    Заголовки уходят вместе с началом ответа, поэтому у потоковых ответов они не
+    учитывают запросы, выполненные во время отдачи тела; в лог попадают все.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_INSTRUMENTATION:
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers[QUERIES_HEADER] = str(stats.count)
+                    headers[QUERY_TIME_HEADER] = f"{stats.time_ms:.1f}"
+                    headers.append("Server-Timing", f'db;dur={stats.time_ms:.1f};desc="{stats.count} queries"')
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                query_metrics.observe(scope["method"], scope["path"], stats)
@@ -0,0 +1,49 @@
+"""add denormalized counters
+
+Revision ID: 5e2a9d7c41b3
+Revises: c61c13fd201f
+Create Date: 2026-10-17 14:05:12.532871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a9d7c41b3'
+down_revision: Union[str, Sequence[str], None] = 'c61c13fd201f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('companies', sa.Column('projects_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('companies', sa.Column('users_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('projects', sa.Column('defects_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('open_defects_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Начальные значения; дальше счётчики ведёт приложение (back.counters)
+    op.execute(
+        'UPDATE companies SET '
+        'projects_count = (SELECT count(*) FROM projects WHERE projects.company_id = companies.id), '
+        'users_count = (SELECT count(*) FROM users WHERE users.company_id = companies.id)'
+    )
+    op.execute(
+        'UPDATE projects SET '
+        'defects_count = (SELECT count(*) FROM defects WHERE defects.project_id = projects.id)'
+    )
+    op.execute(
+        'UPDATE users SET '
+        'open_defects_count = (SELECT count(*) FROM defects WHERE defects.user_engineer_id = users.id)'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'open_defects_count')
+    op.drop_column('projects', 'defects_count')
+    op.drop_column('companies', 'users_count')
+    op.drop_column('companies', 'projects_count')
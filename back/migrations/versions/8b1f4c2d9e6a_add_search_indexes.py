@@ -0,0 +1,61 @@
+"""add search indexes
+
+Revision ID: 8b1f4c2d9e6a
+Revises: 5e2a9d7c41b3
+Create Date: 2026-10-17 18:40:27.114905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from back.search.search_index import SQLITE_SEARCH_DROP, install_sqlite_search
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1f4c2d9e6a'
+down_revision: Union[str, Sequence[str], None] = '5e2a9d7c41b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_TABLES = ('defects', 'projects')
+SQLITE_SEARCH_TRIGGERS = (
+    'search_defects_insert', 'search_defects_update', 'search_defects_delete',
+    'search_projects_insert', 'search_projects_update', 'search_projects_delete',
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # FTS5-индекс и триггеры, которые его ведут (back.search.search_index)
+        install_sqlite_search(bind)
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in SEARCH_TABLES:
+        op.create_index(
+            f'ix_{table}_name_tsv', table, [sa.text("to_tsvector('russian', name)")],
+            unique=False, postgresql_using='gin',
+        )
+        op.create_index(
+            f'ix_{table}_name_trgm', table, ['name'],
+            unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for trigger in SQLITE_SEARCH_TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        for statement in SQLITE_SEARCH_DROP:
+            op.execute(statement)
+        return
+
+    for table in SEARCH_TABLES:
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_name_tsv', table_name=table)
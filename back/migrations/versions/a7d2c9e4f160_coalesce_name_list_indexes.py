@@ -0,0 +1,34 @@
+"""coalesce name in list filter indexes
+
+Revision ID: a7d2c9e4f160
+Revises: f4c8a1e6b372
+Create Date: 2026-10-17 23:52:18.640913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2c9e4f160'
+down_revision: Union[str, Sequence[str], None] = 'f4c8a1e6b372'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_projects_company_id_name_id', table_name='projects')
+    op.create_index('ix_projects_company_id_name_id', 'projects', ['company_id', sa.text("coalesce(name, '')"), 'id'], unique=False)
+    op.drop_index('ix_defects_user_engineer_id_name_id', table_name='defects')
+    op.create_index('ix_defects_user_engineer_id_name_id', 'defects', ['user_engineer_id', sa.text("coalesce(name, '')"), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_defects_user_engineer_id_name_id', table_name='defects')
+    op.create_index('ix_defects_user_engineer_id_name_id', 'defects', ['user_engineer_id', 'name', 'id'], unique=False)
+    op.drop_index('ix_projects_company_id_name_id', table_name='projects')
+    op.create_index('ix_projects_company_id_name_id', 'projects', ['company_id', 'name', 'id'], unique=False)
@@ -0,0 +1,38 @@
+"""add foreign key and role indexes
+
+Revision ID: c61c13fd201f
+Revises: 2bc0b0c79f4d
+Create Date: 2026-10-17 10:12:41.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61c13fd201f'
+down_revision: Union[str, Sequence[str], None] = '2bc0b0c79f4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_company_id_role', 'users', ['company_id', 'role'], unique=False)
+    op.create_index(op.f('ix_projects_user_manager_id'), 'projects', ['user_manager_id'], unique=False)
+    op.create_index('ix_projects_company_id_id', 'projects', ['company_id', 'id'], unique=False)
+    op.create_index(op.f('ix_defects_project_id'), 'defects', ['project_id'], unique=False)
+    op.create_index('ix_defects_user_engineer_id_id', 'defects', ['user_engineer_id', 'id'], unique=False)
+    op.create_index('ix_projects_engineers_user_engineer_id', 'projects_engineers', ['user_engineer_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_projects_engineers_user_engineer_id', table_name='projects_engineers')
+    op.drop_index('ix_defects_user_engineer_id_id', table_name='defects')
+    op.drop_index(op.f('ix_defects_project_id'), table_name='defects')
+    op.drop_index('ix_projects_company_id_id', table_name='projects')
+    op.drop_index(op.f('ix_projects_user_manager_id'), table_name='projects')
+    op.drop_index('ix_users_company_id_role', table_name='users')
@@ -0,0 +1,34 @@
+"""add list filter indexes
+
+Revision ID: d3a7e5b1c820
+Revises: 8b1f4c2d9e6a
+Create Date: 2026-10-17 20:16:03.582217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a7e5b1c820'
+down_revision: Union[str, Sequence[str], None] = '8b1f4c2d9e6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_projects_company_id_user_manager_id_id', 'projects', ['company_id', 'user_manager_id', 'id'], unique=False)
+    op.create_index('ix_projects_company_id_name_id', 'projects', ['company_id', 'name', 'id'], unique=False)
+    op.create_index('ix_defects_user_engineer_id_project_id_id', 'defects', ['user_engineer_id', 'project_id', 'id'], unique=False)
+    op.create_index('ix_defects_user_engineer_id_name_id', 'defects', ['user_engineer_id', 'name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_defects_user_engineer_id_name_id', table_name='defects')
+    op.drop_index('ix_defects_user_engineer_id_project_id_id', table_name='defects')
+    op.drop_index('ix_projects_company_id_name_id', table_name='projects')
+    op.drop_index('ix_projects_company_id_user_manager_id_id', table_name='projects')
@@ -0,0 +1,29 @@
+"""add company version
+
+Revision ID: f4c8a1e6b372
+Revises: d3a7e5b1c820
+Create Date: 2026-10-17 22:41:37.104526
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c8a1e6b372'
+down_revision: Union[str, Sequence[str], None] = 'd3a7e5b1c820'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Версию повышает приложение при каждом коммите, изменившем компанию (back.versioning)
+    op.add_column('companies', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('companies', 'version')
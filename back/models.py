@@ -1,15 +1,28 @@
-from sqlalchemy import Column, String, Enum, Integer, ForeignKey, Table
+from sqlalchemy import Column, String, Enum, Integer, ForeignKey, Table, Index, text
 from sqlalchemy.orm import relationship
 import enum
 
 from back.database import Base
 
 
+def search_indexes(table: str) -> tuple:
+    """GIN-индексы поиска по name на PostgreSQL: словарный (russian) и триграммный для опечаток.
+    На SQLite поиск идёт через FTS5 (back.search.search_index)."""
+    return (
+        Index(f"ix_{table}_name_tsv", text("to_tsvector('russian', name)"), postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index(
+            f"ix_{table}_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
 projects_engineers = Table(
     "projects_engineers",
     Base.metadata,
     Column("project_id", Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
     Column("user_engineer_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    # Первичный ключ (project_id, user_engineer_id) не помогает искать проекты инженера
+    Index("ix_projects_engineers_user_engineer_id", "user_engineer_id"),
 )
 
 class UserRole(str, enum.Enum):
@@ -24,6 +37,11 @@ class Company(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
+    # Счётчики ведёт back.counters при каждой записи
+    projects_count = Column(Integer, nullable=False, default=0, server_default="0")
+    users_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Версию данных компании повышает back.versioning при каждом коммите, изменившем их
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
     users = relationship("User", back_populates="company")
     projects = relationship("Project", back_populates="company", cascade="all, delete-orphan")
@@ -38,6 +56,12 @@ class User(Base):
     hashed_password = Column(String)
     role = Column(Enum(UserRole))
     company_id = Column(Integer, ForeignKey("companies.id"))
+    # Дефекты, назначенные инженеру (у дефекта нет статуса, назначенный считается открытым)
+    open_defects_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_users_company_id_role", "company_id", "role"),
+    )
 
     company = relationship("Company", back_populates="users")
 
@@ -65,8 +89,17 @@ class Project(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
-    user_manager_id = Column(Integer, ForeignKey("users.id"))
+    user_manager_id = Column(Integer, ForeignKey("users.id"), index=True)
     company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"))
+    defects_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_projects_company_id_id", "company_id", "id"),
+        # Фильтры и сортировки списка проектов (back.list_filters)
+        Index("ix_projects_company_id_user_manager_id_id", "company_id", "user_manager_id", "id"),
+        Index("ix_projects_company_id_name_id", "company_id", text("coalesce(name, '')"), "id"),
+        *search_indexes("projects"),
+    )
 
     manager = relationship(
         "User",
@@ -99,7 +132,15 @@ class Defect(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     user_engineer_id = Column(Integer, ForeignKey("users.id"))
-    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
+
+    __table_args__ = (
+        Index("ix_defects_user_engineer_id_id", "user_engineer_id", "id"),
+        # Фильтры и сортировки списка дефектов (back.list_filters)
+        Index("ix_defects_user_engineer_id_project_id_id", "user_engineer_id", "project_id", "id"),
+        Index("ix_defects_user_engineer_id_name_id", "user_engineer_id", text("coalesce(name, '')"), "id"),
+        *search_indexes("defects"),
+    )
 
     engineer = relationship(
         "User",
@@ -0,0 +1,42 @@
+import base64
+import json
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: tuple = (int,)) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(isinstance(value, t) for value, t in zip(values, types))
+    ):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return values
+
+
+def split_next_cursor(rows: list, limit: int, key) -> tuple[list, str | None]:
+    """Отрезает лишнюю строку выборки (limit + 1) и возвращает курсор следующей страницы."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(key(rows[-1]))
+    return rows, None
+
+
+def set_next_cursor(response: Response, rows: list, limit: int, key) -> list:
+    """Отрезает лишнюю строку выборки (limit + 1) и выставляет заголовок со следующим курсором."""
+    rows, next_cursor = split_next_cursor(rows, limit, key)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
 
 from back import schemas, models
 from back.auth import auth
+from back.auth.authorization import AuthorizationContext, get_authorization_context
+from back.cache import company_namespace, read_cache
 from back.database import get_db
 from back.decorators import require_role
+from back.feed.change_feed import record_change
+from back.list_filters import NAME_PREFIX_MAX_LENGTH, SortKey, project_list_query, sort_key
+from back.pagination import NEXT_CURSOR_HEADER, split_next_cursor
+from back.read_session import get_read_db
+from back.serialization import FastJSONResponse, to_jsonable
+from back.versioning import mark_companies_changed
 
 router = APIRouter(prefix="/project", tags=["project"])
 
@@ -13,7 +23,7 @@ router = APIRouter(prefix="/project", tags=["project"])
 @router.post("", response_model=schemas.ProjectCreate)
 @require_role([models.UserRole.ADMIN, models.UserRole.MANAGER])
 async def create_project(project: schemas.ProjectCreate,
-                        db: Session = Depends(get_db),
+                        db: AsyncSession = Depends(get_db),
                         current_user: models.User = Depends(auth.get_current_user)):
     db_project = models.Project(
         name=project.name,
@@ -25,64 +35,110 @@ async def create_project(project: schemas.ProjectCreate,
     if project.engineer_ids:
         # Для админов проверяем только роль инженера, для менеджеров - еще и компанию
         if current_user.role == models.UserRole.ADMIN:
-            engineers = db.query(models.User).filter(
+            engineers = (await db.scalars(select(models.User).where(
                 models.User.id.in_(project.engineer_ids),
                 models.User.role == models.UserRole.ENGINEER
-            ).all()
+            ))).all()
         else:
-            engineers = db.query(models.User).filter(
+            engineers = (await db.scalars(select(models.User).where(
                 models.User.id.in_(project.engineer_ids),
                 models.User.role == models.UserRole.ENGINEER,
                 models.User.company_id == current_user.company_id
-            ).all()
+            ))).all()
         db_project.engineers.extend(engineers)
 
-    db.commit()
-    db.refresh(db_project)
+    await db.flush()
+    engineer_ids = [engineer.id for engineer in engineers] if project.engineer_ids else []
+    record_change(
+        db, db_project.company_id, "project.created",
+        user_ids=engineer_ids, project_id=db_project.id, manager_id=db_project.user_manager_id, engineer_ids=engineer_ids,
+    )
+    await db.commit()
+    await db.refresh(db_project)
 
     return db_project
 
 @router.delete("/{project_id}")
 @require_role([models.UserRole.ADMIN, models.UserRole.MANAGER])
 async def delete_project(project_id: int,
-                         db: Session = Depends(get_db),
+                         db: AsyncSession = Depends(get_db),
                          current_user: models.User = Depends(auth.get_current_user)):
-    db_project = db.query(models.Project).filter(
+    db_project = await db.scalar(select(models.Project).where(
         models.Project.id == project_id,
-    ).first()
+    ))
 
     if not db_project:
         raise HTTPException(status_code=404, detail="Проект не найдена")
 
-    db.delete(db_project)
-    db.commit()
+    # Инженеры команды узнают об удалении своего проекта
+    engineer_ids = (await db.scalars(select(models.projects_engineers.c.user_engineer_id).where(
+        models.projects_engineers.c.project_id == project_id
+    ))).all()
+    record_change(db, db_project.company_id, "project.deleted", user_ids=engineer_ids, project_id=project_id)
+    await db.delete(db_project)
+    await db.commit()
     return {"message": "Проект удалён"}
 
 @router.get("/my-projects", response_model=List[schemas.ProjectOut])
 @require_role([models.UserRole.MANAGER, models.UserRole.CLIENT])
-async def get_my_projects(db: Session = Depends(get_db),
+async def get_my_projects(db: AsyncSession = Depends(get_read_db),
                           current_user: models.User = Depends(auth.get_current_user),
-                          skip: int = 0,
-                          limit: int = 100
+                          skip: int = Query(0, ge=0),
+                          limit: int = Query(100, ge=1, le=1000),
+                          cursor: Optional[str] = None,
+                          manager_id: Optional[int] = None,
+                          engineer_id: Optional[int] = None,
+                          name_prefix: Optional[str] = Query(None, min_length=1, max_length=NAME_PREFIX_MAX_LENGTH),
+                          sort: SortKey = "id"
 ):
 
-    projects = db.query(models.Project).filter(
-        models.Project.company_id == current_user.company_id,
-    ).offset(skip).limit(limit).all()
-
-    return projects
+    query = project_list_query(
+        current_user.company_id,
+        manager_id=manager_id,
+        engineer_id=engineer_id,
+        name_prefix=name_prefix,
+        sort=sort,
+        cursor=cursor,
+    ).options(
+        selectinload(models.Project.manager),
+        selectinload(models.Project.engineers),
+        selectinload(models.Project.defects),
+    ).limit(limit + 1)
+
+    if not cursor:
+        query = query.offset(skip)
+
+    async def load_page():
+        projects = (await db.scalars(query)).all()
+        projects, next_cursor = split_next_cursor(projects, limit, key=sort_key(sort))
+        return {
+            "items": to_jsonable(List[schemas.ProjectOut], projects, from_attributes=True),
+            "next_cursor": next_cursor,
+        }
+
+    if current_user.company_id is None:
+        page = await load_page()
+    else:
+        page = await read_cache.get_or_load(
+            company_namespace(current_user.company_id),
+            f"my-projects:{skip}:{limit}:{cursor}:{manager_id}:{engineer_id}:{name_prefix}:{sort}",
+            load_page,
+        )
+    # Страница уже собрана по ProjectOut, повторная проверка по response_model не нужна
+    headers = {NEXT_CURSOR_HEADER: page["next_cursor"]} if page["next_cursor"] else None
+    return FastJSONResponse(page["items"], headers=headers)
 
 @router.get("/my-projects/{project_id}")
 @require_role(models.UserRole.MANAGER)
 async def get_my_project(project_id: int,
-                         db: Session = Depends(get_db),
+                         db: AsyncSession = Depends(get_read_db),
                          current_user: models.User = Depends(auth.get_current_user)
 ):
 
-    project = db.query(models.Project).filter(
+    project = await db.scalar(select(models.Project).where(
         models.Project.id == project_id,
         models.Project.user_manager_id == current_user.id
-    ).first()
+    ))
 
     if not project:
         raise HTTPException(
@@ -97,15 +153,12 @@ async def get_my_project(project_id: int,
 @require_role(models.UserRole.ADMIN)
 async def remove_manager_from_project(
         project_id: int,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user),
+        authz: AuthorizationContext = Depends(get_authorization_context)
 ):
-    db_project = db.query(models.Project).filter(
-        models.Project.id == project_id
-    ).first()
-
-    if not db_project:
-        raise HTTPException(status_code=404, detail="Проект не найден")
+    access = await authz.project(project_id)
+    db_project = access.project
 
     if not db_project.user_manager_id:
         raise HTTPException(
@@ -113,31 +166,31 @@ async def remove_manager_from_project(
             detail="У этого проекта нет назначенного менеджера"
         )
 
-    if current_user.role == models.UserRole.MANAGER:
-        if db_project.user_manager_id != current_user.id:
-            raise HTTPException(
-                status_code=403,
-                detail="Недостаточно прав. Вы не являетесь менеджером этого проекта"
-            )
+    if authz.is_manager and not access.manages_project:
+        raise HTTPException(
+            status_code=403,
+            detail="Недостаточно прав. Вы не являетесь менеджером этого проекта"
+        )
 
 
     try:
         previous_manager_id = db_project.user_manager_id
-        project_name = db_project.name
 
         db_project.user_manager_id = None
-        db.commit()
-        db.refresh(db_project)
+        record_change(
+            db, db_project.company_id, "project.manager_removed", project_id=db_project.id, manager_id=previous_manager_id,
+        )
+        await db.commit()
 
         return schemas.RemoveProjectFromManagerResponse(
             message="Менеджер успешно удален из проекта",
             project_id=db_project.id,
-            project_name=project_name,
+            project_name=db_project.name,
             previous_manager_id=previous_manager_id
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при удалении менеджера из проекта: {str(e)}"
@@ -149,30 +202,22 @@ async def remove_manager_from_project(
 async def assign_project_to_manager(
         project_id: int,
         manager_data: schemas.AssignProjectToManager,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user),
+        authz: AuthorizationContext = Depends(get_authorization_context)
 ):
-    db_project = db.query(models.Project).filter(
-        models.Project.id == project_id
-    ).first()
-
-    if not db_project:
-        raise HTTPException(status_code=404, detail="Проект не найден")
-
-    db_manager = db.query(models.User).filter(
-        models.User.id == manager_data.manager_id,
-        models.User.role == models.UserRole.MANAGER
-    ).first()
+    access = await authz.project(project_id, target_ids=[manager_data.manager_id], target_role=models.UserRole.MANAGER)
+    db_project = access.project
+    db_manager = access.targets.get(manager_data.manager_id)
 
     if not db_manager:
         raise HTTPException(status_code=404, detail="Менеджер не найден")
 
-    if current_user.role == models.UserRole.MANAGER:
-        if db_project.user_manager_id and db_project.user_manager_id != current_user.id:
-            raise HTTPException(
-                status_code=403,
-                detail="Недостаточно прав. Вы не являетесь менеджером этого проекта"
-            )
+    if authz.is_manager and db_project.user_manager_id and not access.manages_project:
+        raise HTTPException(
+            status_code=403,
+            detail="Недостаточно прав. Вы не являетесь менеджером этого проекта"
+        )
 
     if db_manager.company_id != db_project.company_id:
         raise HTTPException(
@@ -190,8 +235,11 @@ async def assign_project_to_manager(
         previous_manager_id = db_project.user_manager_id
 
         db_project.user_manager_id = manager_data.manager_id
-        db.commit()
-        db.refresh(db_project)
+        record_change(
+            db, db_project.company_id, "project.manager_assigned",
+            project_id=db_project.id, manager_id=manager_data.manager_id, previous_manager_id=previous_manager_id,
+        )
+        await db.commit()
 
         message = "Проект успешно привязан к менеджеру"
         if previous_manager_id:
@@ -205,7 +253,7 @@ async def assign_project_to_manager(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при привязке проекта к менеджеру: {str(e)}"
@@ -217,22 +265,21 @@ async def assign_project_to_manager(
 async def add_engineers_to_project(
         project_id: int,
         engineers_data: schemas.AddEngineersToProject,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user),
+        authz: AuthorizationContext = Depends(get_authorization_context)
 ):
-    db_project = db.query(models.Project).filter(
-        models.Project.id == project_id
-    ).first()
-
-    if not db_project:
-        raise HTTPException(status_code=404, detail="Проект не найден")
+    # Проект, запрошенные инженеры и их членство в команде - одним запросом
+    access = await authz.project(
+        project_id, target_ids=engineers_data.engineer_ids, target_role=models.UserRole.ENGINEER
+    )
+    db_project = access.project
 
-    if current_user.role == models.UserRole.MANAGER:
-        if db_project.user_manager_id != current_user.id:
-            raise HTTPException(
-                status_code=403,
-                detail="Недостаточно прав. Вы не являетесь менеджером этого проекта"
-            )
+    if authz.is_manager and not access.manages_project:
+        raise HTTPException(
+            status_code=403,
+            detail="Недостаточно прав. Вы не являетесь менеджером этого проекта"
+        )
 
     if not engineers_data.engineer_ids:
         raise HTTPException(
@@ -240,13 +287,8 @@ async def add_engineers_to_project(
             detail="Список инженеров не может быть пустым"
         )
 
-    db_engineers = db.query(models.User).filter(
-        models.User.id.in_(engineers_data.engineer_ids),
-        models.User.role == models.UserRole.ENGINEER
-    ).all()
-
-    found_engineer_ids = [engineer.id for engineer in db_engineers]
-    not_found_ids = set(engineers_data.engineer_ids) - set(found_engineer_ids)
+    db_engineers = list(access.targets.values())
+    not_found_ids = set(engineers_data.engineer_ids) - set(access.targets)
 
     if not_found_ids:
         raise HTTPException(
@@ -266,10 +308,9 @@ async def add_engineers_to_project(
             detail=f"Инженеры с ID {wrong_ids} не состоят в компании проекта"
         )
 
-    existing_engineer_ids = [eng.id for eng in db_project.engineers]
     new_engineers = [
         engineer for engineer in db_engineers
-        if engineer.id not in existing_engineer_ids
+        if engineer.id not in access.linked_target_ids
     ]
 
     if not new_engineers:
@@ -279,9 +320,17 @@ async def add_engineers_to_project(
         )
 
     try:
-        db_project.engineers.extend(new_engineers)
-        db.commit()
-        db.refresh(db_project)
+        # Связи вставляются напрямую, без загрузки всей команды проекта
+        await db.execute(insert(models.projects_engineers), [
+            {"project_id": db_project.id, "user_engineer_id": engineer.id} for engineer in new_engineers
+        ])
+        mark_companies_changed(db, db_project.company_id)
+        added_ids = [engineer.id for engineer in new_engineers]
+        record_change(
+            db, db_project.company_id, "project.engineers_added",
+            user_ids=added_ids, project_id=db_project.id, engineer_ids=added_ids,
+        )
+        await db.commit()
 
         return schemas.AddEngineersToProjectResponse(
             message=f"Успешно добавлено {len(new_engineers)} инженеров в проект",
@@ -292,7 +341,7 @@ async def add_engineers_to_project(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при добавлении инженеров в проект: {str(e)}"
@@ -304,21 +353,20 @@ async def add_engineers_to_project(
 async def remove_engineers_from_project(
         project_id: int,
         engineers_data: schemas.RemoveEngineersFromProject,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(auth.get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user),
+        authz: AuthorizationContext = Depends(get_authorization_context)
 ):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Проект не найден")
+    access = await authz.project(project_id, with_engineers=True)
+    project = access.project
 
-    if current_user.role == models.UserRole.MANAGER:
-        if project.user_manager_id != current_user.id:
-            raise HTTPException(
-                status_code=403,
-                detail="Вы можете удалять инженеров только из своих проектов"
-            )
+    if authz.is_manager and not access.manages_project:
+        raise HTTPException(
+            status_code=403,
+            detail="Вы можете удалять инженеров только из своих проектов"
+        )
 
-    current_engineers = project.engineers
+    current_engineers = access.engineers
 
     engineer_ids_to_remove = set(engineers_data.engineer_ids)
     current_engineer_ids = {engineer.id for engineer in current_engineers}
@@ -331,14 +379,20 @@ async def remove_engineers_from_project(
         )
 
     engineers_to_remove = [eng for eng in current_engineers if eng.id in engineer_ids_to_remove]
-
-    for engineer in engineers_to_remove:
-        project.engineers.remove(engineer)
+    remaining_engineers = [eng for eng in current_engineers if eng.id not in engineer_ids_to_remove]
 
     try:
-        db.commit()
-        db.refresh(project)
-        remaining_engineers = project.engineers
+        await db.execute(delete(models.projects_engineers).where(
+            models.projects_engineers.c.project_id == project.id,
+            models.projects_engineers.c.user_engineer_id.in_(engineer_ids_to_remove),
+        ))
+        mark_companies_changed(db, project.company_id)
+        removed_ids = [engineer.id for engineer in engineers_to_remove]
+        record_change(
+            db, project.company_id, "project.engineers_removed",
+            user_ids=removed_ids, project_id=project.id, engineer_ids=removed_ids,
+        )
+        await db.commit()
 
         return schemas.ProjectEngineersResponse(
             project_id=project.id,
@@ -358,5 +412,5 @@ async def remove_engineers_from_project(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка при удалении инженеров: {str(e)}")
\ No newline at end of file
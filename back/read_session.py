@@ -0,0 +1,32 @@
+"""Зависимость читающих GET-маршрутов: сессия только для чтения на реплике или в основной БД."""
+from functools import partial
+
+from fastapi import Depends
+
+from back import models
+from back.auth import auth
+from back.auth.principal_cache import Principal
+from back.cache import COMPANIES_NAMESPACE, company_namespace
+from back.database import read_router
+
+
+def read_namespaces(principal: Principal) -> list[str]:
+    """Пространства, запись в которые закрепляет чтение пользователя за основной БД."""
+    namespaces = []
+    if principal.company_id is not None:
+        namespaces.append(company_namespace(principal.company_id))
+    # Администратор читает список всех компаний, его меняет запись в любой из них
+    if principal.role == models.UserRole.ADMIN:
+        namespaces.append(COMPANIES_NAMESPACE)
+    return namespaces
+
+
+async def get_read_db(current_user: Principal = Depends(auth.get_current_user)):
+    async with read_router.session(read_namespaces(current_user)) as db:
+        yield db
+
+
+def get_read_session_factory(current_user: Principal = Depends(auth.get_current_user)):
+    """Фабрика читающих сессий для потоковых ответов: тело отправляется после выхода
+    из маршрута, и сессию открывает сам поток."""
+    return partial(read_router.session, read_namespaces(current_user))
@@ -1,7 +1,10 @@
+import os
 from typing import Optional, List
-from pydantic import BaseModel, EmailStr
+from pydantic import AliasChoices, BaseModel, EmailStr, Field
 from back.models import UserRole
 
+DEFECT_BULK_MAX_ITEMS = int(os.getenv("DEFECT_BULK_MAX_ITEMS", "500"))
+
 class UserBase(BaseModel):
     username: str
     email: EmailStr
@@ -24,6 +27,10 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class FeedTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
 class TokenData(BaseModel):
     username: str | None = None
 
@@ -54,6 +61,35 @@ class DefectCreate(DefectBase):
     class Config:
         from_attributes = True
 
+class DefectBulkCreate(BaseModel):
+    defects: List[DefectCreate] = Field(min_length=1, max_length=DEFECT_BULK_MAX_ITEMS)
+
+class DefectBulkItemResult(BaseModel):
+    index: int
+    defect_id: Optional[int] = None
+    error: Optional[str] = None
+
+class DefectBulkCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[DefectBulkItemResult]
+
+class UserImportRow(BaseModel):
+    username: str = Field(min_length=1)
+    email: EmailStr
+    password: str = Field(min_length=1)
+    role: UserRole = UserRole.ENGINEER
+
+class UserImportError(BaseModel):
+    line: int
+    username: Optional[str] = None
+    error: str
+
+class UserImportResponse(BaseModel):
+    created: int
+    failed: int
+    errors: List[UserImportError]
+
 class AddUserToCompany(BaseModel):
     user_id: int
 
@@ -71,7 +107,8 @@ class DefectOut(BaseModel):
     id: int
     name: str
     project_id: int
-    engineer_id: Optional[int]
+    # В модели поле называется user_engineer_id
+    engineer_id: Optional[int] = Field(validation_alias=AliasChoices("engineer_id", "user_engineer_id"))
 
     class Config:
         orm_mode = True
@@ -81,6 +118,7 @@ class EngineerOut(BaseModel):
     id: int
     username: str
     email: str
+    open_defects_count: int = 0
     defects: List[DefectOut] = []
 
     class Config:
@@ -100,8 +138,9 @@ class ManagerOut(BaseModel):
 class ProjectOut(BaseModel):
     id: int
     name: str
-    manager_id: Optional[int] = None
+    manager_id: Optional[int] = Field(None, validation_alias=AliasChoices("manager_id", "user_manager_id"))
     manager: Optional[ManagerOut] = None
+    defects_count: int = 0
     engineers: List[EngineerOut] = []
     defects: List[DefectOut] = []
 
@@ -190,3 +229,10 @@ class ProjectEngineersResponse(BaseModel):
     project_name: str
     removed_engineers: List[UserBase]
     remaining_engineers: List[UserBase]
+
+class SearchResultOut(BaseModel):
+    kind: str
+    id: int
+    name: str
+    project_id: Optional[int] = None
+    rank: float
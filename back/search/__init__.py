@@ -0,0 +1,5 @@
+from fastapi import APIRouter
+from .search_routes import router as search_routes
+
+search_crud_routes = APIRouter()
+search_crud_routes.include_router(search_routes)
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""Полнотекстовый и нечёткий поиск по названиям дефектов и проектов компании.
+
+На PostgreSQL поиск идёт по GIN-индексам самих таблиц (back.models.search_indexes):
+словарному to_tsvector('russian', name) с префиксами (трещ:*) и триграммному
+pg_trgm для опечаток. Ранг - ts_rank плюс word_similarity.
+
+На SQLite (тесты, встроенные развёртывания) те же данные лежат в FTS5-таблице
+search_index, которую ведут триггеры на defects и projects, в том числе при
+массовых INSERT в обход ORM. Совпадения ищутся по префиксам слов; если их меньше
+limit, запрос повторяется с близкими словами из словаря индекса (расстояние
+Левенштейна 1-2), и такие результаты идут после точных.
+"""
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import event, func, literal, literal_column, select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from back.database import Base
+from back.models import Defect, Project
+
+SEARCH_KINDS = ("defect", "project")
+# Ограничивает стоимость запроса: длинные фразы всё равно ищутся по первым словам
+MAX_SEARCH_TERMS = 8
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_TS_CONFIG = literal_column("'russian'::regconfig")
+
+SQLITE_SEARCH_DDL = (
+    # rowid: id * 2 у дефекта и id * 2 + 1 у проекта, чтобы триггеры находили строку без поиска
+    "CREATE VIRTUAL TABLE search_index USING fts5("
+    "name, kind UNINDEXED, entity_id UNINDEXED, company_id UNINDEXED, project_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 0')",
+    "CREATE VIRTUAL TABLE search_index_vocab USING fts5vocab(search_index, 'row')",
+    """CREATE TRIGGER search_defects_insert AFTER INSERT ON defects BEGIN
+        INSERT INTO search_index (rowid, name, kind, entity_id, company_id, project_id)
+        VALUES (NEW.id * 2, NEW.name, 'defect', NEW.id,
+                (SELECT company_id FROM projects WHERE id = NEW.project_id), NEW.project_id);
+    END""",
+    """CREATE TRIGGER search_defects_update AFTER UPDATE OF name, project_id ON defects BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 2;
+        INSERT INTO search_index (rowid, name, kind, entity_id, company_id, project_id)
+        VALUES (NEW.id * 2, NEW.name, 'defect', NEW.id,
+                (SELECT company_id FROM projects WHERE id = NEW.project_id), NEW.project_id);
+    END""",
+    """CREATE TRIGGER search_defects_delete AFTER DELETE ON defects BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 2;
+    END""",
+    """CREATE TRIGGER search_projects_insert AFTER INSERT ON projects BEGIN
+        INSERT INTO search_index (rowid, name, kind, entity_id, company_id, project_id)
+        VALUES (NEW.id * 2 + 1, NEW.name, 'project', NEW.id, NEW.company_id, NEW.id);
+    END""",
+    """CREATE TRIGGER search_projects_update AFTER UPDATE OF name, company_id ON projects BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+        INSERT INTO search_index (rowid, name, kind, entity_id, company_id, project_id)
+        VALUES (NEW.id * 2 + 1, NEW.name, 'project', NEW.id, NEW.company_id, NEW.id);
+        UPDATE search_index SET company_id = NEW.company_id
+        WHERE kind = 'defect' AND project_id = NEW.id AND NEW.company_id IS NOT OLD.company_id;
+    END""",
+    # Дефекты проекта удаляются и каскадом БД, который триггеры defects не видят
+    """CREATE TRIGGER search_projects_delete AFTER DELETE ON projects BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+        DELETE FROM search_index WHERE kind = 'defect' AND project_id = OLD.id;
+    END""",
+)
+
+SQLITE_SEARCH_BACKFILL = (
+    "DELETE FROM search_index",
+    "INSERT INTO search_index (rowid, name, kind, entity_id, company_id, project_id) "
+    "SELECT id * 2 + 1, name, 'project', id, company_id, id FROM projects",
+    "INSERT INTO search_index (rowid, name, kind, entity_id, company_id, project_id) "
+    "SELECT defects.id * 2, defects.name, 'defect', defects.id, projects.company_id, defects.project_id "
+    "FROM defects LEFT JOIN projects ON projects.id = defects.project_id",
+)
+
+SQLITE_SEARCH_DROP = (
+    "DROP TABLE IF EXISTS search_index_vocab",
+    "DROP TABLE IF EXISTS search_index",
+)
+
+
+def install_sqlite_search(connection):
+    """Создаёт FTS5-индекс и триггеры, если их нет, и заполняет индекс текущими данными."""
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+    ).first()
+    if exists:
+        return
+    for statement in (*SQLITE_SEARCH_DDL, *SQLITE_SEARCH_BACKFILL):
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Base.metadata, "before_create")
+def create_search_extensions(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_sqlite_search(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        install_sqlite_search(connection)
+
+
+@event.listens_for(Base.metadata, "after_drop")
+def drop_sqlite_search(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        for statement in SQLITE_SEARCH_DROP:
+            connection.exec_driver_sql(statement)
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    id: int
+    name: str
+    project_id: int | None
+    rank: float
+
+
+def search_terms(query: str) -> list[str]:
+    return _WORD.findall(query.lower())[:MAX_SEARCH_TERMS]
+
+
+def levenshtein(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна; значения больше limit не уточняются."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def typo_limit(term: str) -> int:
+    return 1 if len(term) <= 5 else 2
+
+
+def postgres_search_query(company_id: int, query: str, terms: list[str], kinds, limit: int):
+    tsquery = func.to_tsquery(_TS_CONFIG, " & ".join(f"{term}:*" for term in terms))
+    parts = []
+    for kind, model in (("defect", Defect), ("project", Project)):
+        if kind not in kinds:
+            continue
+        tsvector = func.to_tsvector(_TS_CONFIG, model.name)
+        # Выражения совпадают с индексами ix_*_name_tsv и ix_*_name_trgm
+        matches = tsvector.op("@@")(tsquery) | model.name.op("%>")(query)
+        rank = func.ts_rank(tsvector, tsquery) + func.word_similarity(query, model.name)
+        project_id = model.project_id if model is Defect else model.id
+        part = select(
+            literal(kind).label("kind"), model.id, model.name, project_id.label("project_id"), rank.label("rank")
+        ).where(matches)
+        if model is Defect:
+            part = part.join(Project, Project.id == Defect.project_id)
+        parts.append(part.where(Project.company_id == company_id))
+    combined = union_all(*parts).subquery()
+    return select(combined).order_by(combined.c.rank.desc(), combined.c.id).limit(limit)
+
+
+async def _sqlite_match(db: AsyncSession, company_id: int, match: str, kinds, limit: int) -> list[SearchHit]:
+    kinds_sql = ", ".join(f"'{kind}'" for kind in SEARCH_KINDS if kind in kinds)
+    rows = await db.execute(text(
+        "SELECT kind, entity_id, name, project_id, -rank AS score FROM search_index "
+        f"WHERE search_index MATCH :match AND company_id = :company_id AND kind IN ({kinds_sql}) "
+        "ORDER BY rank LIMIT :limit"
+    ), {"match": match, "company_id": company_id, "limit": limit})
+    return [SearchHit(row.kind, row.entity_id, row.name, row.project_id, row.score) for row in rows]
+
+
+async def _similar_terms(db: AsyncSession, term: str) -> list[str]:
+    limit = typo_limit(term)
+    # Первая буква в опечатках ошибочна редко, а без неё пришлось бы читать весь словарь
+    rows = await db.execute(
+        text("SELECT term FROM search_index_vocab WHERE term >= :low AND term < :high"),
+        {"low": term[0], "high": chr(ord(term[0]) + 1)},
+    )
+    return [row.term for row in rows if row.term != term and levenshtein(term, row.term, limit) <= limit]
+
+
+def _phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+async def sqlite_search(db: AsyncSession, company_id: int, terms: list[str], kinds, limit: int) -> list[SearchHit]:
+    exact = await _sqlite_match(db, company_id, " ".join(f"{_phrase(term)}*" for term in terms), kinds, limit)
+    if len(exact) >= limit:
+        return exact
+
+    groups = []
+    for term in terms:
+        alternatives = [f"{_phrase(term)}*", *(_phrase(similar) for similar in await _similar_terms(db, term))]
+        groups.append("(" + " OR ".join(alternatives) + ")")
+    found = {(hit.kind, hit.id) for hit in exact}
+    fuzzy = await _sqlite_match(db, company_id, " AND ".join(groups), kinds, limit)
+    return exact + [hit for hit in fuzzy if (hit.kind, hit.id) not in found][:limit - len(exact)]
+
+
+async def search(db: AsyncSession, company_id: int, query: str, kinds=SEARCH_KINDS, limit: int = 20) -> list[SearchHit]:
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        rows = await db.execute(postgres_search_query(company_id, query, terms, kinds, limit))
+        return [SearchHit(row.kind, row.id, row.name, row.project_id, row.rank) for row in rows]
+    return await sqlite_search(db, company_id, terms, kinds, limit)
@@ -0,0 +1,27 @@
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from back import schemas, models
+from back.auth import auth
+from back.read_session import get_read_db
+from back.search.search_index import SEARCH_KINDS, search
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("", response_model=List[schemas.SearchResultOut])
+async def search_company(
+        q: str = Query(..., min_length=2, max_length=200),
+        kind: Optional[Literal["defect", "project"]] = None,
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(get_read_db),
+        current_user: models.User = Depends(auth.get_current_user)
+):
+    # Поиск идёт только по данным компании пользователя
+    if current_user.company_id is None:
+        raise HTTPException(status_code=403, detail="Пользователь не состоит в компании")
+
+    hits = await search(db, current_user.company_id, q, kinds=(kind,) if kind else SEARCH_KINDS, limit=limit)
+    return [schemas.SearchResultOut(**hit.__dict__) for hit in hits]
@@ -0,0 +1,53 @@
+"""Быстрый путь сериализации больших ответов из доверенных данных сервера.
+
+FastAPI проверяет возвращаемое значение по response_model и только потом
+сериализует его. Для снимка компании или списка проектов это вторая полная
+проверка данных, которые сервер сам только что собрал по той же схеме (словари
+из back.company.company_snapshot, страницы из кэша чтения). Маршрут, который
+отдаёт такие данные, возвращает FastJSONResponse: тело сериализуется сразу, без
+проверки и без обхода атрибутов from_attributes, а response_model остаётся для
+документации OpenAPI. Данные от клиента этим путём не отдаются.
+
+Сериализует orjson, если он установлен, иначе pydantic_core.to_json. Оба пишут
+компактный UTF-8 без экранирования кириллицы, так что байты ответа совпадают с
+тем, что отдавала проверка по схеме. Замеры: python -m back.benchmarks.serialization
+"""
+from functools import lru_cache
+
+import pydantic_core
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+
+def dumps(data) -> bytes:
+    """JSON доверенных данных (словари, списки, строки, числа, Enum) без проверки по схеме."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return pydantic_core.to_json(data)
+
+
+@lru_cache(maxsize=None)
+def type_adapter(annotation) -> TypeAdapter:
+    """Схема и сериализатор типа собираются один раз на процесс."""
+    return TypeAdapter(annotation)
+
+
+def to_jsonable(annotation, data, from_attributes: bool = False):
+    """Один проход схемы по данным, которым она ещё нужна (ORM-объекты), вместо
+    model_validate и model_dump для каждого элемента списка."""
+    adapter = type_adapter(annotation)
+    return adapter.dump_python(adapter.validate_python(data, from_attributes=from_attributes), mode="json")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,62 @@
+"""Запуск API в профиле, выбранном переменной APP_PROFILE.
+
+    development - один процесс uvicorn с --reload (по умолчанию)
+    production  - gunicorn с воркерами uvicorn, см. back/gunicorn_conf.py
+
+Несколько воркеров должны делить кэш чтения и ленту изменений через Redis
+(REDIS_URL). Без него продакшен-профиль с несколькими воркерами не запускается:
+задайте REDIS_URL или WEB_CONCURRENCY=1.
+
+Запуск:
+    APP_PROFILE=production python -m back.serve
+"""
+import os
+import sys
+
+APP_PROFILE = os.getenv("APP_PROFILE", "development")
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = os.getenv("PORT", "8000")
+
+
+def worker_count(profile: str = APP_PROFILE) -> int:
+    """Число процессов API в профиле; gunicorn берёт его же (back/gunicorn_conf.py)."""
+    if profile != "production":
+        return 1
+    return int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+
+def check_shared_backends(workers: int, backends: dict[str, str]):
+    """Отказ запуска, если воркеров несколько, а бэкенды в памяти процесса: запись в
+    одном воркере не сбросила бы кэш соседних и не дошла бы до их подписчиков ленты."""
+    local = [name for name, kind in backends.items() if kind != "redis"]
+    if workers > 1 and local:
+        raise SystemExit(
+            f"Воркеров {workers}, но {', '.join(local)} не redis: задайте REDIS_URL "
+            f"или запустите один воркер (WEB_CONCURRENCY=1)"
+        )
+
+
+def command(profile: str) -> list[str]:
+    if profile == "production":
+        return [sys.executable, "-m", "gunicorn", "-c", "python:back.gunicorn_conf", "back.main:app"]
+    if profile == "development":
+        return [sys.executable, "-m", "uvicorn", "back.main:app", "--host", HOST, "--port", PORT, "--reload"]
+    raise SystemExit(f"Неизвестный профиль запуска: {profile}")
+
+
+def main():
+    args = command(APP_PROFILE)
+    if APP_PROFILE == "production":
+        # Импорт здесь: back.cache сам берёт worker_count из этого модуля
+        from back.cache import READ_CACHE_BACKEND
+        from back.feed.broker import CHANGE_FEED_BACKEND
+
+        check_shared_backends(worker_count(APP_PROFILE), {
+            "READ_CACHE_BACKEND": READ_CACHE_BACKEND,
+            "CHANGE_FEED_BACKEND": CHANGE_FEED_BACKEND,
+        })
+    os.execv(args[0], args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,79 @@
+from contextlib import contextmanager
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from fastapi.testclient import TestClient
 from back.main import app
-from back.database import get_db, Base
+from back.database import get_db, get_session_factory, read_router, read_session_factory, Base, TrackedAsyncSession
 from back.models import User, Company, Project, Defect, UserRole
 from back.auth.auth import get_password_hash
+from back.auth.principal_cache import principal_cache
+from back.cache import FakeCacheBackend, read_cache
+from back.company.snapshot_store import snapshot_store
+from back.feed.change_feed import change_feed
 
 # Тестовая база данных в памяти
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+AsyncTestingSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=TrackedAsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+async def override_get_db():
+    async with AsyncTestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_session_factory] = lambda: AsyncTestingSessionLocal
+snapshot_store.session_factory = AsyncTestingSessionLocal
+read_router.primary.session_factory = read_session_factory(async_engine)
 
 @pytest.fixture(scope="function")
 def db_session():
     Base.metadata.create_all(bind=engine)
+    read_cache.backend = FakeCacheBackend()
+    # Номера событий ленты идут от счётчиков бэкенда кэша и начинаются заново вместе с ним
+    change_feed.clear()
     db = TestingSessionLocal()
     try:
         yield db
     finally:
         db.close()
         Base.metadata.drop_all(bind=engine)
+        principal_cache.clear()
 
 @pytest.fixture
 def client():
     return TestClient(app)
 
+@pytest.fixture
+def assert_max_queries():
+    """Проверяет, что блок выполнил не больше limit SQL-запросов; при провале выводит их текст.
+
+        with assert_max_queries(3) as statements:
+            client.get(...)
+    """
+    @contextmanager
+    def check(limit):
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+        assert len(statements) <= limit, f"Ожидалось не больше {limit} запросов, выполнено {len(statements)}:\n" + "\n".join(statements)
+    return check
+
 @pytest.fixture
 def test_company(db_session):
     company = Company(name="Test Company")
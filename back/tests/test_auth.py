@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
-from back.auth.auth import verify_password, get_password_hash, create_access_token, authenticate_user
+from back.auth.auth import verify_password, get_password_hash, create_access_token, authenticate_user, verify_password_async
+from back.auth.hashing import password_hasher
 from back.models import User, UserRole
 from datetime import timedelta
 
@@ -27,6 +28,15 @@ class TestAuthFunctions:
         assert hashed != password
         assert len(hashed) > 0
     
+    @pytest.mark.asyncio
+    async def test_verify_password_async(self):
+        """Тест проверки пароля в пуле хеширования"""
+        hashed = get_password_hash("test_password")
+        completed = password_hasher.stats()["completed"]
+        assert await verify_password_async("test_password", hashed) == True
+        assert await verify_password_async("wrong_password", hashed) == False
+        assert password_hasher.stats()["completed"] == completed + 2
+    
     def test_create_access_token(self):
         """Тест создания токена доступа"""
         data = {"sub": "test_user"}
@@ -124,3 +134,60 @@ class TestAuthEndpoints:
         response = client.get("/auth/users/me/", headers=headers)
         assert response.status_code == 401
         assert "Could not validate credentials" in response.json()["detail"]
+    
+    def test_login_rehashes_outdated_password(self, client, db_session, test_admin_user, monkeypatch):
+        """Тест обновления устаревшего хеша пароля при входе"""
+        from passlib.hash import bcrypt
+        from back.auth import auth_routes
+        monkeypatch.setattr(auth_routes, "PASSWORD_REHASH_ON_LOGIN", True)
+        test_admin_user.hashed_password = bcrypt.using(rounds=4).hash("password")
+        db_session.commit()
+        
+        response = client.post("/auth/token", data={"username": "admin", "password": "password"})
+        assert response.status_code == 200
+        db_session.refresh(test_admin_user)
+        assert test_admin_user.hashed_password.startswith("$2b$12$")
+        assert verify_password("password", test_admin_user.hashed_password)
+    
+    def test_get_current_user_uses_principal_cache(self, client, test_admin_user, assert_max_queries):
+        """Тест отсутствия запросов к БД при повторной аутентификации"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        assert client.get("/auth/users/me/", headers=headers).status_code == 200
+        
+        with assert_max_queries(0):
+            response = client.get("/auth/users/me/", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["username"] == "admin"
+        assert response.headers["X-DB-Queries"] == "0"
+    
+    def test_principal_cache_invalidated_on_company_change(self, client, test_admin_user, test_company, test_engineer_user_without_company):
+        """Тест сброса кэша пользователя при добавлении в компанию"""
+        admin_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer1', 'password': 'password'}).json()['access_token']}"}
+        assert client.get("/auth/users/me/", headers=headers).json()["company_id"] is None
+        
+        response = client.post(f"/company/{test_company.id}/users", json={"user_id": test_engineer_user_without_company.id}, headers=admin_headers)
+        assert response.status_code == 200
+        assert client.get("/auth/users/me/", headers=headers).json()["company_id"] == test_company.id
+
+    @pytest.mark.asyncio
+    async def test_principal_cache_invalidation_shared_between_workers(self, monkeypatch):
+        """Тест сброса кэша пользователя в соседнем воркере и отключения кэша без общего бэкенда"""
+        from back import cache
+        from back.auth.principal_cache import Principal, PrincipalCache
+        from back.cache import FakeCacheBackend, ReadCache
+
+        shared = ReadCache(FakeCacheBackend(), ttl=60, prefix="test")
+        worker1 = PrincipalCache(shared, max_size=10, max_ttl=60)
+        worker2 = PrincipalCache(shared, max_size=10, max_ttl=60)
+        principal = Principal(id=1, username="engineer", email="e@test.ru", role=UserRole.ENGINEER, company_id=1)
+        worker2.set(("engineer", "jti"), principal, None, await worker2.generation("engineer"))
+        assert await worker2.get(("engineer", "jti")) == principal
+
+        await worker1.invalidate_user("engineer")
+        assert await worker2.get(("engineer", "jti")) is None
+
+        monkeypatch.setattr(cache, "worker_count", lambda: 4)
+        assert not worker2.enabled
+        worker2.set(("engineer", "jti"), principal, None, await worker2.generation("engineer"))
+        assert await worker2.get(("engineer", "jti")) is None
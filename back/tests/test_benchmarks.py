@@ -0,0 +1,54 @@
+from back.benchmarks.dataset import DatasetSize
+from back.benchmarks.filter_plans import run_filter_plans
+from back.benchmarks.load import percentile, compare_reports, run_benchmark
+from back.benchmarks.serialization import run_serialization_benchmark
+
+
+class TestLoadBenchmark:
+    """Тесты для нагрузочного прогона"""
+
+    def test_percentile(self):
+        """Тест перцентиля методом ближайшего ранга"""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 95) == 0.0
+
+    def test_compare_reports(self):
+        """Тест обнаружения регрессий относительно базовой линии"""
+        baseline = {"routes": {"GET /company/all": {"latency_ms_p95": 10.0, "queries_per_request": 1.0}}}
+        current = {"routes": {"GET /company/all": {"latency_ms_p95": 11.0, "queries_per_request": 1.0}}}
+        assert compare_reports(baseline, current, max_regression=20) == []
+        current["routes"]["GET /company/all"] = {"latency_ms_p95": 30.0, "queries_per_request": 3.0}
+        assert len(compare_reports(baseline, current, max_regression=20)) == 2
+
+    def test_run_benchmark_covers_all_routes(self, tmp_path):
+        """Тест прогона всех маршрутов на маленьком наборе данных"""
+        report = run_benchmark(
+            f"sqlite:///{tmp_path / 'bench.db'}",
+            DatasetSize(companies=1, users_per_company=12, projects_per_company=1, defects_per_project=2),
+            scenarios=["auth", "company", "project", "defect", "search"],
+            concurrency=1,
+            iterations=1,
+        )
+        assert report["missing_routes"] == []
+        assert report["total"]["requests"] > 0
+        assert report["routes"]["GET /company/all"]["errors"] == 0
+        assert report["routes"]["GET /company/all"]["queries_per_request"] >= 1
+
+    def test_every_list_filter_uses_index(self, tmp_path):
+        """Тест планов всех сочетаний фильтров и сортировок списков: без полного просмотра таблиц"""
+        report = run_filter_plans(
+            f"sqlite:///{tmp_path / 'filters.db'}",
+            DatasetSize(companies=2, users_per_company=12, projects_per_company=3, defects_per_project=5),
+        )
+        assert len(report) == 32 + 64
+        assert {name: entry["full_scans"] for name, entry in report.items() if entry["full_scans"]} == {}
+
+    def test_serialization_benchmark(self):
+        """Тест замера сериализации: быстрый путь отдаёт тот же документ, что и проверка по схеме"""
+        report = run_serialization_benchmark(defects=120, repeat=1)
+        assert set(report["cases"]) == {"company_snapshot", "my_projects"}
+        for entry in report["cases"].values():
+            assert entry["bytes"] > 0
+            assert entry["before_ms_per_10k_defects"] > 0
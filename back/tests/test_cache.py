@@ -0,0 +1,108 @@
+import pytest
+from back.cache import LocalCacheBackend, FakeCacheBackend, ReadCache
+
+
+class TestReadCache:
+    """Тесты для кэша читающих маршрутов"""
+
+    @pytest.mark.asyncio
+    async def test_get_or_load_hit_and_invalidate(self):
+        """Тест повторного чтения из кэша и сброса по компании"""
+        cache = ReadCache(FakeCacheBackend(), ttl=60, prefix="test")
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            return {"value": len(loads)}
+
+        assert await cache.get_or_load("company:1", "snapshot", loader) == {"value": 1}
+        assert await cache.get_or_load("company:1", "snapshot", loader) == {"value": 1}
+        assert len(loads) == 1
+
+        await cache.invalidate_companies(1)
+        assert await cache.get_or_load("company:1", "snapshot", loader) == {"value": 2}
+        assert cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_get_or_load_bypassed_without_shared_backend(self, monkeypatch):
+        """Тест чтения мимо кэша в памяти при нескольких воркерах: запись в соседнем его не сбросила бы"""
+        from back import cache as module
+        monkeypatch.setattr(module, "worker_count", lambda: 2)
+        backend = FakeCacheBackend()
+        cache = ReadCache(backend, ttl=60, prefix="test")
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            return {"value": len(loads)}
+
+        assert await cache.get_or_load("company:1", "snapshot", loader) == {"value": 1}
+        assert await cache.get_or_load("company:1", "snapshot", loader) == {"value": 2}
+        assert backend.calls == []
+        assert cache.stats()["bypassed"] == 2 and cache.stats()["hits"] == 0
+
+    @pytest.mark.asyncio
+    async def test_backend_error_falls_back_to_loader(self):
+        """Тест чтения мимо кэша при недоступном бэкенде"""
+        class BrokenBackend(FakeCacheBackend):
+            async def get(self, key):
+                raise ConnectionError()
+
+        cache = ReadCache(BrokenBackend(), ttl=60, prefix="test")
+
+        async def loader():
+            return [1, 2]
+
+        assert await cache.get_or_load("companies", "all", loader) == [1, 2]
+        assert cache.stats()["errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_local_backend_evicts_entries_but_keeps_generations(self):
+        """Тест вытеснения LRU без потери счётчиков поколений"""
+        backend = LocalCacheBackend(max_size=2)
+        generation = await backend.incr("gen")
+        for key in ("a", "b", "c"):
+            await backend.set(key, key.encode())
+        assert await backend.get("a") is None
+        assert await backend.get("c") == b"c"
+        assert await backend.get("gen") == str(generation).encode()
+
+
+class TestSnapshotStore:
+    """Тесты для хранилища материализованных снимков компаний"""
+
+    @pytest.mark.asyncio
+    async def test_rebuild_is_debounced(self, monkeypatch):
+        """Тест одной фоновой сборки на серию изменений компании"""
+        import asyncio
+        from contextlib import asynccontextmanager
+        from back.company import snapshot_store as module
+
+        builds = []
+
+        async def fake_load(db, company_id):
+            builds.append(company_id)
+            return {"id": company_id, "name": f"Company {len(builds)}", "projects": [], "managers": [], "engineers": []}
+
+        @asynccontextmanager
+        async def session_factory():
+            yield None
+
+        async def fake_version(db, company_id):
+            return 1
+
+        monkeypatch.setattr(module, "load_company_snapshot", fake_load)
+        monkeypatch.setattr(module, "company_version", fake_version)
+        cache = ReadCache(FakeCacheBackend(), ttl=60, prefix="test")
+        store = module.SnapshotStore(cache, session_factory, debounce=0.01, ttl=60)
+
+        for _ in range(3):
+            store.schedule_rebuild({1})
+        assert store.stats()["pending_rebuilds"] == 1
+        await asyncio.sleep(0.05)
+
+        assert builds == [1]
+        snapshot = await store.get(1)
+        assert snapshot.version == 1
+        assert snapshot.body == b'{"id":1,"name":"Company 1","projects":[],"managers":[],"engineers":[]}'
+        assert store.stats()["pending_rebuilds"] == 0
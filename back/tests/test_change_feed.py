@@ -0,0 +1,232 @@
+import json
+
+import pytest
+
+from back.auth.principal_cache import Principal
+from back.cache import FakeCacheBackend, read_cache
+from back.feed.broker import LocalBroker
+from back.feed.change_feed import ChangeEvent, ChangeFeed, change_feed, record_change
+from back.feed.feed_routes import sse_stream
+from back.models import Company, UserRole
+from back.tests.conftest import AsyncTestingSessionLocal, get_auth_headers
+
+
+def principal(role: UserRole, user_id: int = 1, company_id: int | None = 1) -> Principal:
+    return Principal(id=user_id, username=f"user{user_id}", email=f"user{user_id}@test.ru", role=role, company_id=company_id)
+
+
+def ticket(client, username: str) -> str:
+    response = client.post("/feed/ticket", headers=get_auth_headers(client, username, "password"))
+    assert response.status_code == 200
+    return response.json()["ticket"]
+
+
+class TestChangeFeed:
+    """Тесты для ленты изменений"""
+
+    def test_websocket_receives_visible_changes(self, client, test_manager_user, test_admin_user, test_engineer_user, test_defect_without_engineer):
+        """Тест доставки события по WebSocket менеджеру и назначенному инженеру"""
+        admin_headers = get_auth_headers(client, "admin", "password")
+        with client.websocket_connect(f"/feed/ws?ticket={ticket(client, 'manager')}") as manager_ws, \
+                client.websocket_connect(f"/feed/ws?ticket={ticket(client, 'engineer')}") as engineer_ws:
+            response = client.patch(
+                f"/defect/defects/{test_defect_without_engineer.id}/assign-engineer",
+                json={"engineer_id": test_engineer_user.id},
+                headers=admin_headers,
+            )
+            assert response.status_code == 200
+
+            for ws in (manager_ws, engineer_ws):
+                message = ws.receive_json()
+                assert message["type"] == "defect.engineer_assigned"
+                assert message["company_id"] == test_defect_without_engineer.project.company_id
+                assert message["data"] == {
+                    "defect_id": test_defect_without_engineer.id,
+                    "project_id": test_defect_without_engineer.project_id,
+                    "engineer_id": test_engineer_user.id,
+                    "previous_engineer_id": None,
+                }
+            last_id = message["id"]
+
+        # Переподключение с last_event_id: пропущенное приходит из буфера
+        client.delete(f"/defect/{test_defect_without_engineer.id}/remove-engineer", headers=admin_headers)
+        with client.websocket_connect(f"/feed/ws?ticket={ticket(client, 'manager')}&last_event_id={last_id}") as manager_ws:
+            message = manager_ws.receive_json()
+            assert (message["id"], message["type"]) == (last_id + 1, "defect.engineer_removed")
+
+    def test_websocket_rejects_foreign_company(self, client, test_manager_user):
+        """Тест отказа в подписке на чужую компанию"""
+        from starlette.websockets import WebSocketDisconnect
+
+        with pytest.raises(WebSocketDisconnect) as error:
+            with client.websocket_connect(f"/feed/ws?ticket={ticket(client, 'manager')}&company_id=999"):
+                pass
+        assert error.value.code == 1008
+
+    def test_websocket_ticket_single_use(self, client, test_manager_user):
+        """Тест билета WebSocket: одноразовый, не заменяет токен доступа и не заменяется им"""
+        from starlette.websockets import WebSocketDisconnect
+
+        access_token = get_auth_headers(client, "manager", "password")["Authorization"].removeprefix("Bearer ")
+        manager_ticket = ticket(client, "manager")
+
+        def rejected(credentials):
+            with pytest.raises(WebSocketDisconnect) as error:
+                with client.websocket_connect(f"/feed/ws?ticket={credentials}"):
+                    pass
+            return error.value.code == 1008
+
+        assert rejected(access_token)
+        with client.websocket_connect(f"/feed/ws?ticket={manager_ticket}"):
+            pass
+        assert rejected(manager_ticket)
+        assert client.get("/project/my-projects", headers={"Authorization": f"Bearer {manager_ticket}"}).status_code == 401
+        assert client.post("/feed/ticket").status_code == 401
+
+    def test_websocket_closed_when_user_removed(self, client, test_admin_user, test_manager_user, test_company):
+        """Тест закрытия ленты пользователя, исключённого из компании: событие об исключении приходит последним"""
+        from starlette.websockets import WebSocketDisconnect
+
+        admin_headers = get_auth_headers(client, "admin", "password")
+        with client.websocket_connect(f"/feed/ws?ticket={ticket(client, 'manager')}") as manager_ws:
+            response = client.delete(f"/company/{test_company.id}/users/{test_manager_user.id}", headers=admin_headers)
+            assert response.status_code == 200
+            assert manager_ws.receive_json()["type"] == "company.user_removed"
+            with pytest.raises(WebSocketDisconnect) as error:
+                manager_ws.receive_json()
+            assert error.value.code == 1008
+        assert change_feed.stats()["revoked"] == 1
+
+    def test_sse_route_checks_company(self, client, test_admin_user, test_engineer_user_without_company):
+        """Тест проверки компании до открытия потока SSE"""
+        admin_headers = get_auth_headers(client, "admin", "password")
+        assert client.get("/feed/events", headers=admin_headers).status_code == 400
+        engineer_headers = get_auth_headers(client, "engineer1", "password")
+        assert client.get("/feed/events", headers=engineer_headers).status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_resume_and_reset(self):
+        """Тест продолжения с Last-Event-ID и события reset, когда буфер не покрывает разрыв"""
+        read_cache.backend = FakeCacheBackend()
+        feed = ChangeFeed(LocalBroker(), buffer_size=3)
+        await feed.publish([ChangeEvent(1, "defect.created", {"defect_id": i}) for i in range(1, 6)])
+        manager = principal(UserRole.MANAGER)
+
+        resumed = await feed.subscribe(manager, 1, last_event_id=3)
+        assert not resumed.reset
+        assert [(await resumed.next(0.01)).id for _ in range(2)] == [4, 5]
+        assert await resumed.next(0.01) is None
+
+        assert (await feed.subscribe(manager, 1, last_event_id=1)).reset
+        assert (await feed.subscribe(manager, 1, last_event_id=99)).reset
+        up_to_date = await feed.subscribe(manager, 1, last_event_id=5)
+        assert not up_to_date.reset and not up_to_date.backlog
+
+        await feed.publish([ChangeEvent(1, "project.created", {"project_id": 7})])
+        assert (await up_to_date.next(0.1)).type == "project.created"
+        assert feed.stats()["subscribers"] == 4
+
+    @pytest.mark.asyncio
+    async def test_visibility_by_role(self):
+        """Тест фильтрации событий по роли подписчика"""
+        read_cache.backend = FakeCacheBackend()
+        feed = ChangeFeed(LocalBroker(), buffer_size=10)
+        subscriptions = {
+            name: await feed.subscribe(p, 1)
+            for name, p in {
+                "admin": principal(UserRole.ADMIN, 1, None),
+                "client": principal(UserRole.CLIENT, 2),
+                "engineer": principal(UserRole.ENGINEER, 3),
+                "other_engineer": principal(UserRole.ENGINEER, 4),
+            }.items()
+        }
+        await feed.publish([
+            ChangeEvent(1, "defect.engineer_assigned", {"defect_id": 1}, user_ids=(3,)),
+            ChangeEvent(1, "company.user_added", {"user_id": 5}, user_ids=(5,)),
+            ChangeEvent(2, "project.created", {"project_id": 1}),
+        ])
+
+        async def received(name):
+            types = []
+            while (change := await subscriptions[name].next(0.01)) is not None:
+                types.append(change.type)
+            return types
+
+        assert await received("admin") == ["defect.engineer_assigned", "company.user_added"]
+        assert await received("client") == ["defect.engineer_assigned"]
+        assert await received("engineer") == ["defect.engineer_assigned"]
+        assert await received("other_engineer") == []
+
+    @pytest.mark.asyncio
+    async def test_access_revoking_events_close_subscriptions(self):
+        """Тест закрытия подписок: исключение из компании - только исключённого, удаление компании - всех"""
+        read_cache.backend = FakeCacheBackend()
+        feed = ChangeFeed(LocalBroker(), buffer_size=10)
+        admin = await feed.subscribe(principal(UserRole.ADMIN, 1, None), 1)
+        manager = await feed.subscribe(principal(UserRole.MANAGER, 2), 1)
+        engineer = await feed.subscribe(principal(UserRole.ENGINEER, 3), 1)
+
+        await feed.publish([ChangeEvent(1, "company.user_removed", {"user_id": 3}, user_ids=(3,))])
+        assert (await engineer.next(0.01)).type == "company.user_removed"
+        assert await engineer.next(0.01) is None and engineer.closed
+        assert not manager.closed and feed.stats()["subscribers"] == 2
+
+        await feed.publish([ChangeEvent(1, "company.deleted", {})])
+        for subscription in (admin, manager):
+            assert [(await subscription.next(0.01)).type for _ in range(2)] == ["company.user_removed", "company.deleted"]
+            assert await subscription.next(0.01) is None and subscription.closed
+        assert feed.stats()["subscribers"] == 0
+        assert feed.stats()["revoked"] == 3
+
+    @pytest.mark.asyncio
+    async def test_event_ids_after_counter_restart(self):
+        """Тест номеров событий: счётчики процессов не совпадают, сброс счётчика очищает буфер"""
+        from back.cache import LocalCacheBackend
+
+        first, second = LocalCacheBackend(max_size=10), LocalCacheBackend(max_size=10)
+        assert await first.incr("feed:1") != await second.incr("feed:1")
+
+        read_cache.backend = FakeCacheBackend()
+        feed = ChangeFeed(LocalBroker(), buffer_size=10)
+        await feed.publish([ChangeEvent(1, "defect.created", {"defect_id": i}) for i in range(1, 4)])
+        # Redis очищен: счётчик начался заново, прежние номера в буфере недействительны
+        read_cache.backend = FakeCacheBackend()
+        await feed.publish([ChangeEvent(1, "project.created", {"project_id": 1})])
+        assert [change.id for change in feed.buffers[1]] == [1]
+        assert (await feed.subscribe(principal(UserRole.MANAGER), 1, last_event_id=3)).reset
+
+    @pytest.mark.asyncio
+    async def test_events_published_only_after_commit(self, db_session):
+        """Тест: откат транзакции отменяет события, коммит публикует"""
+        published = change_feed.published
+        async with AsyncTestingSessionLocal() as db:
+            company = Company(name="Лента")
+            db.add(company)
+            await db.flush()
+            record_change(db, company.id, "company.created", name=company.name)
+            await db.rollback()
+            assert change_feed.published == published
+
+            db.add(company := Company(name="Лента"))
+            await db.flush()
+            record_change(db, company.id, "company.created", name=company.name)
+            await db.commit()
+        assert change_feed.published == published + 1
+        assert [change.type for change in change_feed.buffers[company.id]] == ["company.created"]
+
+    @pytest.mark.asyncio
+    async def test_sse_stream_format(self):
+        """Тест формата SSE: пауза переподключения, событие с id и комментарий-пинг"""
+        read_cache.backend = FakeCacheBackend()
+        feed = ChangeFeed(LocalBroker(), buffer_size=10)
+        subscription = await feed.subscribe(principal(UserRole.MANAGER), 1)
+        await feed.publish([ChangeEvent(1, "project.engineers_added", {"project_id": 1, "engineer_ids": [3]})])
+
+        stream = sse_stream(subscription, heartbeat=0.01)
+        assert (await anext(stream)).startswith(b"retry: ")
+        message = (await anext(stream)).decode()
+        assert message.startswith("id: 1\nevent: project.engineers_added\ndata: ")
+        assert json.loads(message.split("data: ", 1)[1])["data"] == {"project_id": 1, "engineer_ids": [3]}
+        assert await anext(stream) == b": ping\n\n"
+        await stream.aclose()
+        assert feed.stats()["subscribers"] == 0
@@ -78,6 +78,69 @@ class TestCompanyCRUD:
         assert "managers" in data
         assert "engineers" in data
     
+    def test_get_full_company_info_with_projects(self, client, test_admin_user, test_company, test_project, test_defect):
+        """Тест получения информации о компании с проектами и дефектами"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        response = client.get(f"/company/my-companies?company_id={test_company.id}", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["projects"][0]["id"] == test_project.id
+        assert data["projects"][0]["manager"]["username"] == "manager"
+        assert data["projects"][0]["defects"][0]["id"] == test_defect.id
+        assert data["managers"][0]["projects"] == [test_project.name]
+        assert data["engineers"][0]["defects"][0]["id"] == test_defect.id
+    
+    def test_get_full_company_info_query_count_is_constant(self, client, db_session, test_admin_user, test_company, test_project, test_engineer_user, test_defect, assert_max_queries):
+        """Тест фиксированного числа запросов при сборке снимка компании"""
+        from back.models import Project, Defect
+        test_project.engineers.append(test_engineer_user)
+        for i in range(5):
+            project = Project(name=f"Project {i}", company_id=test_company.id, user_manager_id=test_project.user_manager_id)
+            project.engineers.append(test_engineer_user)
+            project.defects.append(Defect(name=f"Defect {i}", user_engineer_id=test_engineer_user.id))
+            db_session.add(project)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        client.get("/auth/users/me/", headers=headers)
+        
+        # Версия компании для ETag и пять запросов сборки снимка
+        with assert_max_queries(7):
+            response = client.get(f"/company/my-companies?company_id={test_company.id}", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["projects"]) == 6
+        assert data["projects"][0]["engineers"][0]["defects"][0]["id"] == test_defect.id
+        assert [d["name"] for d in data["projects"][1]["engineers"][0]["defects"]] == ["Defect 0"]
+        assert len(data["engineers"][0]["defects"]) == 6
+        assert len(data["managers"][0]["projects"]) == 6
+    
+    def test_get_full_company_info_stream(self, client, db_session, test_admin_user, test_company, test_project, test_engineer_user, test_defect):
+        """Тест потоковой выдачи снимка компании в формате NDJSON"""
+        import json
+        test_project.engineers.append(test_engineer_user)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        response = client.get(f"/company/my-companies?company_id={test_company.id}&stream=1", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert records[0] == {"type": "company", "id": test_company.id, "name": test_company.name}
+        by_type = {}
+        for record in records:
+            by_type.setdefault(record["type"], []).append(record)
+        assert by_type["project"][0]["engineer_ids"] == [test_engineer_user.id]
+        assert by_type["project"][0]["manager"]["username"] == "manager"
+        assert by_type["manager"][0]["projects"] == [test_project.name]
+        assert by_type["engineer"][0]["id"] == test_engineer_user.id
+        assert by_type["defect"][0]["id"] == test_defect.id
+        
+        accept_headers = {**headers, "Accept": "application/x-ndjson"}
+        response = client.get(f"/company/my-companies?company_id={test_company.id}", headers=accept_headers)
+        assert [json.loads(line) for line in response.text.splitlines()] == records
+        
+        missing = client.get("/company/my-companies?company_id=999&stream=1", headers=headers)
+        assert missing.status_code == 404
+    
     def test_get_full_company_info_forbidden(self, client, test_engineer_user_without_company, test_company):
         """Тест получения информации о компании без прав"""
         headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer1', 'password': 'password'}).json()['access_token']}"}
@@ -98,6 +161,48 @@ class TestCompanyCRUD:
         assert "projects_count" in data[0]
         assert "users_count" in data[0]
     
+    def test_list_companies_counts_and_pagination(self, client, db_session, test_admin_user, test_company, test_project, test_engineer_user):
+        """Тест подсчёта проектов и пользователей и постраничной выдачи компаний"""
+        from back.models import Company
+        db_session.add_all([Company(name="Alpha"), Company(name="Beta")])
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        
+        response = client.get("/company/all?limit=2", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert [c["name"] for c in data] == ["Test Company", "Alpha"]
+        assert data[0]["projects_count"] == 1
+        assert data[0]["users_count"] == 3
+        assert data[1]["projects_count"] == 0
+        
+        next_page = client.get(f"/company/all?limit=2&cursor={response.headers['X-Next-Cursor']}", headers=headers)
+        assert [c["name"] for c in next_page.json()] == ["Beta"]
+        assert "X-Next-Cursor" not in next_page.headers
+        
+        filtered = client.get("/company/all?name=alp", headers=headers)
+        assert [c["name"] for c in filtered.json()] == ["Alpha"]
+    
+    def test_list_companies_full_list_and_literal_name_filter(self, client, db_session, test_admin_user, test_company, monkeypatch):
+        """Тест полного списка без cursor и limit и поиска по имени с % и _"""
+        from importlib import import_module
+        from back.models import Company
+        monkeypatch.setattr(import_module("back.company.company_crud_routes"), "COMPANY_PAGE_SIZE", 1)
+        db_session.add_all([Company(name="Рост 100%"), Company(name="ООО_Север")])
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        
+        response = client.get("/company/all", headers=headers)
+        assert len(response.json()) == 3
+        assert "X-Next-Cursor" not in response.headers
+        
+        first = client.get("/company/all?limit=1", headers=headers)
+        page = client.get(f"/company/all?cursor={first.headers['X-Next-Cursor']}", headers=headers)
+        assert [c["name"] for c in page.json()] == ["Рост 100%"]
+        
+        assert [c["name"] for c in client.get("/company/all?name=%25", headers=headers).json()] == ["Рост 100%"]
+        assert [c["name"] for c in client.get("/company/all?name=_", headers=headers).json()] == ["ООО_Север"]
+    
     def test_remove_user_from_company_success(self, client, test_admin_user, test_company, test_engineer_user):
         """Тест успешного удаления пользователя из компании"""
         # Сначала добавляем пользователя в компанию
@@ -117,3 +222,142 @@ class TestCompanyCRUD:
         response = client.delete(f"/company/{test_company.id}/users/{test_engineer_user_without_company.id}", headers=headers)
         assert response.status_code == 400
         assert "не состоит в указанной компании" in response.json()["detail"]
+    
+    def test_list_companies_cached_until_write(self, client, test_admin_user, test_company):
+        """Тест кэширования списка компаний и его сброса при создании компании"""
+        from back.cache import read_cache
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        hits = read_cache.hits
+        assert len(client.get("/company/all", headers=headers).json()) == 1
+        assert len(client.get("/company/all", headers=headers).json()) == 1
+        assert read_cache.hits == hits + 1
+        
+        client.post("/company/create", json={"name": "New Company"}, headers=headers)
+        assert [c["name"] for c in client.get("/company/all", headers=headers).json()] == ["Test Company", "New Company"]
+    
+    def test_get_full_company_info_snapshot_stale_after_defect(self, client, test_admin_user, test_company, test_project, test_engineer_user):
+        """Тест устаревшего снимка компании после записи и обхода через consistent=1"""
+        admin_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        engineer_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        url = f"/company/my-companies?company_id={test_company.id}"
+        first = client.get(url, headers=admin_headers)
+        assert first.json()["projects"][0]["defects"] == []
+        assert first.headers["X-Snapshot-Age"] == "0"
+        assert "X-Snapshot-Stale" not in first.headers
+        
+        client.post("/defect", json={"name": "Crack", "project_id": test_project.id}, headers=engineer_headers)
+        # Фоновая пересборка ещё не прошла: отдаётся прежний снимок с пометкой
+        stale = client.get(url, headers=admin_headers)
+        assert stale.json()["projects"][0]["defects"] == []
+        assert stale.headers["X-Snapshot-Stale"] == "1"
+        assert stale.headers["ETag"] == first.headers["ETag"]
+        
+        consistent = client.get(f"{url}&consistent=1", headers=admin_headers)
+        assert [d["name"] for d in consistent.json()["projects"][0]["defects"]] == ["Crack"]
+        assert "X-Snapshot-Stale" not in consistent.headers
+        # Собранный по запросу снимок сохраняется и отдаётся дальше без сборки
+        fresh = client.get(url, headers=admin_headers)
+        assert [d["name"] for d in fresh.json()["projects"][0]["defects"]] == ["Crack"]
+        assert "X-Snapshot-Stale" not in fresh.headers
+    
+    def test_get_full_company_info_snapshot_stale_after_write_in_other_worker(self, client, test_admin_user, test_company, test_project, test_engineer_user):
+        """Тест устаревания снимка воркера после записи, прошедшей через другой воркер"""
+        from back.cache import FakeCacheBackend, read_cache
+        from back.company.snapshot_store import snapshot_store
+        admin_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        engineer_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        url = f"/company/my-companies?company_id={test_company.id}"
+        client.get(url, headers=admin_headers)
+        
+        # У другого воркера свой бэкенд в памяти: ни отметок, ни отложенной пересборки здесь
+        backend = read_cache.backend
+        read_cache.backend = FakeCacheBackend()
+        client.post("/defect", json={"name": "Crack", "project_id": test_project.id}, headers=engineer_headers)
+        read_cache.backend = backend
+        
+        stale_served = snapshot_store.stale_served
+        stale = client.get(url, headers=admin_headers)
+        assert stale.headers["X-Snapshot-Stale"] == "1"
+        assert stale.json()["projects"][0]["defects"] == []
+        assert snapshot_store.stale_served == stale_served + 1
+    
+    def test_get_full_company_info_etag(self, client, test_admin_user, test_company, test_project, test_engineer_user_without_company):
+        """Тест условного GET снимка компании по ETag"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        url = f"/company/my-companies?company_id={test_company.id}"
+        response = client.get(url, headers=headers)
+        etag = response.headers["ETag"]
+        assert etag.startswith('W/"')
+        
+        cached = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        
+        client.post(f"/company/{test_company.id}/users", json={"user_id": test_engineer_user_without_company.id}, headers=headers)
+        fresh = client.get(f"{url}&consistent=1", headers={**headers, "If-None-Match": etag})
+        assert fresh.status_code == 200
+        assert fresh.headers["ETag"] != etag
+        assert [e["username"] for e in fresh.json()["engineers"]] == ["engineer1"]
+    
+    def test_import_company_users_csv(self, client, db_session, test_admin_user, test_company, test_engineer_user):
+        """Тест импорта пользователей из CSV с построчным отчётом об ошибках"""
+        from back.models import User, UserRole
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        body = (
+            "username,email,password,role\n"
+            "ivanov,ivanov@test.com,secret1,engineer\n"
+            "petrov,petrov@test.com,secret2,manager\n"
+            "engineer,other@test.com,secret3,engineer\n"
+            "ivanov,ivanov2@test.com,secret4,engineer\n"
+            "sidorov,not-an-email,secret5,engineer\n"
+            "root,root@test.com,secret6,admin\n"
+        )
+        response = client.post(
+            f"/company/{test_company.id}/users/import",
+            content=body.encode(),
+            headers={**headers, "Content-Type": "text/csv"},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 2
+        assert data["failed"] == 4
+        assert [e["line"] for e in data["errors"]] == [4, 5, 6, 7]
+        
+        petrov = db_session.query(User).filter(User.username == "petrov").one()
+        assert petrov.company_id == test_company.id
+        assert petrov.role == UserRole.MANAGER
+        login = client.post("/auth/token", data={"username": "ivanov", "password": "secret1"})
+        assert login.status_code == 200
+    
+    def test_import_company_users_ndjson(self, client, test_admin_user, test_company):
+        """Тест импорта пользователей из NDJSON"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        body = '{"username": "a", "email": "a@test.com", "password": "p"}\nnot json\n'
+        response = client.post(
+            f"/company/{test_company.id}/users/import",
+            content=body.encode(),
+            headers={**headers, "Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        assert response.json()["created"] == 1
+        assert response.json()["errors"] == [{"line": 2, "username": None, "error": "Некорректный JSON"}]
+        
+        unsupported = client.post(f"/company/{test_company.id}/users/import", content=b"", headers={**headers, "Content-Type": "text/plain"})
+        assert unsupported.status_code == 415
+    
+    def test_list_companies_query_budget(self, client, db_session, test_admin_user, test_company, assert_max_queries):
+        """Тест числа запросов списка компаний, не зависящего от числа компаний"""
+        from back.models import Company, Project
+        for i in range(10):
+            company = Company(name=f"Company {i}")
+            company.projects.append(Project(name=f"Project {i}"))
+            db_session.add(company)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        client.get("/auth/users/me/", headers=headers)
+        
+        with assert_max_queries(2):
+            response = client.get("/company/all", headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()) == 11
+        assert int(response.headers["X-DB-Queries"]) <= 2
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import zlib
+
+from back import compression
+from back.compression import CompressionMiddleware, compression_metrics, negotiate_encoding
+from back.models import Defect
+from back.tests.conftest import get_auth_headers
+
+
+def run_middleware(chunks, accept_encoding="gzip", content_type="application/x-ndjson"):
+    """Прогоняет потоковый ответ через middleware и возвращает отправленные сообщения."""
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type.encode())]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app)(scope, None, send))
+    return sent
+
+
+class TestCompression:
+    """Тесты для сжатия ответов"""
+
+    def test_negotiate_encoding(self):
+        """Тест выбора кодировки по Accept-Encoding и предпочтению сервера"""
+        available = ("zstd", "br", "gzip")
+        assert negotiate_encoding("gzip, deflate, br, zstd", available) == "zstd"
+        assert negotiate_encoding("gzip, deflate, br, zstd", ("br", "gzip")) == "br"
+        assert negotiate_encoding("gzip;q=1.0, br;q=0.5", available) == "gzip"
+        assert negotiate_encoding("*;q=0.1, gzip;q=0", ("gzip",)) is None
+        assert negotiate_encoding("*", ("br", "gzip")) == "br"
+        assert negotiate_encoding("identity", available) is None
+        assert negotiate_encoding("", available) is None
+
+    def test_streaming_response_compressed_incrementally(self, monkeypatch):
+        """Тест сжатия потока по частям: сжатые куски уходят до конца ответа"""
+        monkeypatch.setattr(compression, "COMPRESSION_STREAM_FLUSH_BYTES", 1024)
+        chunks = [json.dumps({"type": "defect", "id": i, "name": f"Трещина {i}"}, ensure_ascii=False).encode() + b"\n"
+                  for i in range(500)]
+        sent = run_middleware(chunks)
+
+        headers = dict(sent[0]["headers"])
+        assert headers[b"content-encoding"] == b"gzip"
+        assert b"content-length" not in headers
+        bodies = [message["body"] for message in sent[1:]]
+        assert len([body for body in bodies if body]) > 10
+        assert sent[-1]["more_body"] is False
+        assert zlib.decompress(b"".join(bodies), zlib.MAX_WBITS | 16) == b"".join(chunks)
+
+        # Уже отданные куски разжимаются без конца потока
+        partial = zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(b"".join(bodies[:len(bodies) // 2]))
+        assert len(partial) > 1024 and b"".join(chunks).startswith(partial)
+
+    def test_small_and_unsupported_responses_not_compressed(self):
+        """Тест ответов меньше порога и клиентов без поддержки сжатия"""
+        sent = run_middleware([b'{"ok":true}'])
+        assert b"content-encoding" not in dict(sent[0]["headers"])
+        assert sent[1]["body"] == b'{"ok":true}'
+
+        sent = run_middleware([b"x" * 4096, b""], accept_encoding="identity")
+        assert b"content-encoding" not in dict(sent[0]["headers"])
+
+        sent = run_middleware([b"x" * 4096], content_type="image/png")
+        assert b"content-encoding" not in dict(sent[0]["headers"])
+
+    def test_company_snapshot_compressed(self, client, db_session, test_admin_user, test_company, test_project):
+        """Тест сжатия снимка компании: то же содержимое, слабый ETag и метрики"""
+        test_project.defects.extend(Defect(name=f"Трещина в стяжке {i}") for i in range(40))
+        db_session.commit()
+        headers = get_auth_headers(client, "admin", "password")
+        url = f"/company/my-companies?company_id={test_company.id}"
+
+        plain = client.get(url, headers={**headers, "Accept-Encoding": "identity"})
+        compressed = client.get(url, headers={**headers, "Accept-Encoding": "gzip"})
+        assert plain.status_code == compressed.status_code == 200
+        assert "content-encoding" not in plain.headers
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in compressed.headers["vary"]
+        assert "compress;dur=" in compressed.headers["server-timing"]
+        assert compressed.json() == plain.json()
+        assert compressed.headers["etag"] == plain.headers["etag"]
+
+        streamed = client.get(url + "&stream=true", headers={**headers, "Accept-Encoding": "gzip"})
+        assert streamed.headers["content-encoding"] == "gzip"
+        assert [json.loads(line)["type"] for line in streamed.text.splitlines()].count("defect") == 40
+
+        stats = client.get("/internal/metrics", headers=headers).json()["compression"]
+        assert stats["encodings"]["gzip"]["ratio"] > 1
+        assert stats["encodings"]["gzip"]["streamed"] >= 1
+
+    def test_token_response_never_compressed(self, client, test_manager_user, monkeypatch):
+        """Тест отключения сжатия для выдачи токена"""
+        monkeypatch.setattr(compression, "COMPRESSION_MIN_SIZE", 0)
+        response = client.post(
+            "/auth/token", data={"username": "manager", "password": "password"}, headers={"Accept-Encoding": "gzip"}
+        )
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+
+        me = client.get("/auth/users/me/", headers={
+            "Authorization": f"Bearer {response.json()['access_token']}", "Accept-Encoding": "gzip",
+        })
+        assert me.headers["content-encoding"] == "gzip"
+        assert compression_metrics.stats()["encodings"]["gzip"]["responses"] >= 1
@@ -0,0 +1,85 @@
+from sqlalchemy import select
+
+from back.counters import recount_counters
+from back.models import Company, Defect, Project, User
+from back.tests.conftest import engine, get_auth_headers
+
+
+def counters(db_session, company, project, engineer):
+    db_session.expire_all()
+    return (
+        db_session.get(Company, company.id).projects_count,
+        db_session.get(Company, company.id).users_count,
+        db_session.get(Project, project.id).defects_count,
+        db_session.get(User, engineer.id).open_defects_count,
+    )
+
+
+class TestCounters:
+    """Тесты для денормализованных счётчиков"""
+
+    def test_counters_follow_defect_writes(self, client, db_session, test_company, test_admin_user, test_project, test_engineer_user):
+        """Тест счётчиков при создании, переназначении и удалении дефектов"""
+        assert counters(db_session, test_company, test_project, test_engineer_user) == (1, 3, 0, 0)
+
+        headers = get_auth_headers(client, "engineer", "password")
+        created = client.post("/defect", json={"name": "Трещина", "project_id": test_project.id}, headers=headers)
+        assert created.status_code == 200
+        bulk = client.post("/defect/bulk", json={"defects": [
+            {"name": f"Скол {i}", "project_id": test_project.id} for i in range(3)
+        ]}, headers=headers)
+        assert bulk.json()["created"] == 3
+        assert counters(db_session, test_company, test_project, test_engineer_user) == (1, 3, 4, 4)
+
+        defect_id = db_session.scalar(select(Defect.id).where(Defect.name == "Скол 0"))
+        admin_headers = get_auth_headers(client, "admin", "password")
+        assert client.delete(f"/defect/{defect_id}/remove-engineer", headers=admin_headers).status_code == 200
+        assert counters(db_session, test_company, test_project, test_engineer_user) == (1, 3, 4, 3)
+        response = client.patch(f"/defect/defects/{defect_id}/assign-engineer", json={"engineer_id": test_engineer_user.id}, headers=admin_headers)
+        assert response.status_code == 200
+        assert client.delete(f"/defect/{defect_id}", headers=headers).status_code == 200
+        assert counters(db_session, test_company, test_project, test_engineer_user) == (1, 3, 3, 3)
+
+        # Удаление проекта каскадно удаляет дефекты и уменьшает счётчик инженера
+        assert client.delete(f"/project/{test_project.id}", headers=admin_headers).status_code == 200
+        db_session.expire_all()
+        assert db_session.get(Company, test_company.id).projects_count == 0
+        assert db_session.get(User, test_engineer_user.id).open_defects_count == 0
+
+    def test_counters_follow_company_membership(self, client, db_session, test_company, test_admin_user, test_client_user, test_engineer_user_without_company):
+        """Тест счётчика пользователей при добавлении, отвязке и импорте"""
+        headers = get_auth_headers(client, "admin", "password")
+        assert db_session.get(Company, test_company.id).users_count == 2
+
+        response = client.post(f"/company/{test_company.id}/users", json={"user_id": test_engineer_user_without_company.id}, headers=headers)
+        assert response.status_code == 200
+        db_session.expire_all()
+        assert db_session.get(Company, test_company.id).users_count == 3
+
+        assert client.delete(f"/company/{test_company.id}/users/{test_client_user.id}", headers=headers).status_code == 200
+        db_session.expire_all()
+        assert db_session.get(Company, test_company.id).users_count == 2
+
+        body = "username,email,password\nnew1,new1@test.com,secret123\nnew2,new2@test.com,secret123\n"
+        response = client.post(f"/company/{test_company.id}/users/import", content=body, headers={**headers, "Content-Type": "text/csv"})
+        assert response.json()["created"] == 2
+        db_session.expire_all()
+        assert db_session.get(Company, test_company.id).users_count == 4
+
+        listed = client.get("/company/all", headers=headers).json()
+        assert listed[0]["users_count"] == 4
+
+    def test_recount_repairs_drift(self, db_session, test_company, test_project, test_engineer_user, test_defect):
+        """Тест пересчёта счётчиков, разошедшихся после записи мимо ORM"""
+        with engine.begin() as connection:
+            connection.execute(Defect.__table__.insert(), [
+                {"name": "Без ORM", "project_id": test_project.id, "user_engineer_id": test_engineer_user.id}
+            ])
+            assert recount_counters(connection) == {
+                "companies.projects_count": 0,
+                "companies.users_count": 0,
+                "projects.defects_count": 1,
+                "users.open_defects_count": 1,
+            }
+            assert recount_counters(connection)["projects.defects_count"] == 0
+        assert counters(db_session, test_company, test_project, test_engineer_user) == (1, 2, 2, 2)
@@ -61,6 +61,31 @@ class TestDefectCRUD:
         assert data[0]["id"] == test_defect.id
         assert data[0]["name"] == test_defect.name
     
+    def test_get_my_defects_cursor_pagination(self, client, db_session, test_engineer_user, test_project):
+        """Тест постраничной выдачи дефектов по курсору"""
+        from back.models import Defect
+        defects = [Defect(name=f"Defect {i}", project_id=test_project.id, user_engineer_id=test_engineer_user.id) for i in range(5)]
+        db_session.add_all(defects)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        
+        seen = []
+        url = "/defect/my-defects?limit=2"
+        while True:
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200
+            seen.extend(d["id"] for d in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            url = f"/defect/my-defects?limit=2&cursor={cursor}"
+        assert seen == sorted(d.id for d in defects)
+        
+        response = client.get("/defect/my-defects?cursor=broken", headers=headers)
+        assert response.status_code == 400
+        for query in ("limit=-1", "limit=0", "limit=1001", "skip=-1"):
+            assert client.get(f"/defect/my-defects?{query}", headers=headers).status_code == 422
+    
     def test_get_my_defect_success(self, client, test_engineer_user, test_defect):
         """Тест получения конкретного дефекта"""
         headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
@@ -132,3 +157,161 @@ class TestDefectCRUD:
         response = client.patch(f"/defect/defects/{test_defect.id}/assign-engineer", json=engineer_data, headers=headers)
         assert response.status_code == 400
         assert "уже привязан к этому инженеру" in response.json()["detail"]
+    
+    def test_get_my_defects_etag(self, client, test_engineer_user, test_admin_user, test_defect):
+        """Тест условного GET дефектов инженера по ETag"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        admin_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        etag = client.get("/defect/my-defects", headers=headers).headers["ETag"]
+        assert client.get("/defect/my-defects", headers={**headers, "If-None-Match": etag}).status_code == 304
+        assert client.get("/defect/my-defects?limit=1", headers={**headers, "If-None-Match": etag}).status_code == 200
+        
+        client.delete(f"/defect/{test_defect.id}/remove-engineer", headers=admin_headers)
+        response = client.get("/defect/my-defects", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json() == []
+    
+    def test_get_my_defects_etag_independent_of_worker(self, client, test_engineer_user, test_admin_user, test_defect):
+        """Тест ETag по версии компании в БД: её видит воркер, не обрабатывавший запись, и она не сбрасывается при перезапуске"""
+        from back.cache import FakeCacheBackend, read_cache
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        admin_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        client.post("/defect", json={"name": "Crack", "project_id": test_defect.project_id}, headers=headers)
+        etag = client.get("/defect/my-defects", headers=headers).headers["ETag"]
+        
+        # Новый бэкенд кэша: перезапущенный воркер с пустыми счётчиками
+        read_cache.backend = FakeCacheBackend()
+        assert client.get("/defect/my-defects", headers={**headers, "If-None-Match": etag}).status_code == 304
+        
+        # Запись проходит через другой воркер: этот бэкенд её не видит
+        backend = read_cache.backend
+        read_cache.backend = FakeCacheBackend()
+        client.delete(f"/defect/{test_defect.id}/remove-engineer", headers=admin_headers)
+        read_cache.backend = backend
+        response = client.get("/defect/my-defects", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert [d["name"] for d in response.json()] == ["Crack"]
+    
+    def test_create_defects_bulk(self, client, db_session, test_engineer_user, test_project, test_company):
+        """Тест пакетного создания дефектов с построчным отчётом"""
+        from back.models import Company, Project, Defect
+        other_company = Company(name="Other Company")
+        db_session.add(other_company)
+        db_session.commit()
+        foreign_project = Project(name="Foreign Project", company_id=other_company.id)
+        db_session.add(foreign_project)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        
+        response = client.post("/defect/bulk", json={"defects": [
+            {"name": "Crack 1", "project_id": test_project.id},
+            {"name": "Crack 2", "project_id": foreign_project.id},
+            {"name": "Crack 3", "project_id": test_project.id},
+        ]}, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 2
+        assert data["failed"] == 1
+        assert [r["index"] for r in data["results"]] == [0, 1, 2]
+        assert data["results"][1]["defect_id"] is None
+        assert "нет к нему доступа" in data["results"][1]["error"]
+        
+        created = {d.id: d for d in db_session.query(Defect).all()}
+        assert created[data["results"][0]["defect_id"]].name == "Crack 1"
+        assert created[data["results"][2]["defect_id"]].user_engineer_id == test_engineer_user.id
+    
+    def test_create_defects_bulk_invalidates_etag(self, client, test_engineer_user, test_project):
+        """Тест смены ETag списка дефектов после пакетной вставки"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        etag = client.get("/defect/my-defects", headers=headers).headers["ETag"]
+        client.post("/defect/bulk", json={"defects": [{"name": "Crack", "project_id": test_project.id}]}, headers=headers)
+        response = client.get("/defect/my-defects", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert [d["name"] for d in response.json()] == ["Crack"]
+    
+    def test_create_defects_bulk_limits(self, client, test_engineer_user, test_manager_user):
+        """Тест ограничений пакетного создания дефектов"""
+        from back.schemas import DEFECT_BULK_MAX_ITEMS
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        assert client.post("/defect/bulk", json={"defects": []}, headers=headers).status_code == 422
+        too_many = {"defects": [{"name": "Crack"}] * (DEFECT_BULK_MAX_ITEMS + 1)}
+        assert client.post("/defect/bulk", json=too_many, headers=headers).status_code == 422
+        
+        manager_headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
+        assert client.post("/defect/bulk", json={"defects": [{"name": "Crack"}]}, headers=manager_headers).status_code == 403
+    
+    def test_get_my_defects_query_budget(self, client, db_session, test_engineer_user, test_project, assert_max_queries):
+        """Тест числа запросов списка дефектов, не зависящего от числа дефектов"""
+        from back.models import Defect
+        db_session.add_all([Defect(name=f"Defect {i}", project_id=test_project.id, user_engineer_id=test_engineer_user.id) for i in range(10)])
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        client.get("/auth/users/me/", headers=headers)
+        
+        with assert_max_queries(2):
+            response = client.get("/defect/my-defects", headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()) == 10
+    
+    def test_assign_engineer_to_defect_query_budget(self, client, test_admin_user, test_engineer_user, test_defect_without_engineer, assert_max_queries):
+        """Тест числа запросов назначения инженера: дефект, проект и инженер загружаются одним запросом"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']}"}
+        client.get("/auth/users/me/", headers=headers)
+        engineer_data = {"engineer_id": test_engineer_user.id}
+        
+        # Контекст авторизации, UPDATE дефекта, счётчики и версия компании
+        with assert_max_queries(4):
+            response = client.patch(f"/defect/defects/{test_defect_without_engineer.id}/assign-engineer", json=engineer_data, headers=headers)
+        assert response.status_code == 200
+    
+    def test_get_my_defects_filters_and_sort(self, client, db_session, test_engineer_user, test_project, test_project_without_manager):
+        """Тест фильтров по проекту и префиксу названия и сортировки с курсором"""
+        from back.models import Defect
+        db_session.add_all([
+            Defect(name="Трещина в стяжке", project_id=test_project.id, user_engineer_id=test_engineer_user.id),
+            Defect(name="Протечка кровли", project_id=test_project.id, user_engineer_id=test_engineer_user.id),
+            Defect(name="Трещина в откосе", project_id=test_project_without_manager.id, user_engineer_id=test_engineer_user.id),
+        ])
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        
+        def names(**params):
+            return [defect["name"] for defect in client.get("/defect/my-defects", params=params, headers=headers).json()]
+        
+        assert names(project_id=test_project.id, sort="-name") == ["Трещина в стяжке", "Протечка кровли"]
+        assert names(name_prefix="Трещ", sort="name") == ["Трещина в откосе", "Трещина в стяжке"]
+        assert names(name_prefix="трещ") == []
+        
+        first = client.get("/defect/my-defects", params={"sort": "name", "limit": 2}, headers=headers)
+        assert [defect["name"] for defect in first.json()] == ["Протечка кровли", "Трещина в откосе"]
+        assert names(sort="name", cursor=first.headers["X-Next-Cursor"]) == ["Трещина в стяжке"]
+        
+        assert client.get("/defect/my-defects", params={"sort": "engineer"}, headers=headers).status_code == 422
+        assert client.get("/defect/my-defects", params={"sort": "name", "cursor": "WzFd"}, headers=headers).status_code == 400
+    
+    def test_name_sort_cursor_pages_through_null_names(self, client, db_session, test_engineer_user, test_project):
+        """Тест курсора сортировки по имени: строки без имени идут первыми и не теряются между страницами"""
+        from back.list_filters import defect_list_query, sort_key
+        from back.models import Defect
+        from back.pagination import encode_cursor
+        db_session.add_all([
+            Defect(name=name, project_id=test_project.id, user_engineer_id=test_engineer_user.id)
+            for name in (None, "Трещина", None, "Протечка")
+        ])
+        db_session.commit()
+        
+        for sort in ("name", "-name"):
+            ids, cursor = [], None
+            while True:
+                page = db_session.scalars(defect_list_query(test_engineer_user.id, sort=sort, cursor=cursor).limit(1)).all()
+                if not page:
+                    break
+                ids.append(page[0].id)
+                cursor = encode_cursor(sort_key(sort)(page[0]))
+            names = [db_session.get(Defect, defect_id).name for defect_id in ids]
+            expected = [None, None, "Протечка", "Трещина"]
+            assert names == (expected if sort == "name" else expected[::-1])
+        
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'engineer', 'password': 'password'}).json()['access_token']}"}
+        null_cursor = encode_cursor([None, 1])
+        assert client.get("/defect/my-defects", params={"sort": "name", "cursor": null_cursor}, headers=headers).status_code == 400
@@ -0,0 +1,84 @@
+import logging
+import sys
+
+from back.database import PoolMetrics, CHECKOUT_LATENCY_BUCKETS_MS
+from back.metrics.queries import QueryStats, track_queries
+from back.tests.conftest import get_auth_headers
+
+
+class TestPoolMetrics:
+    """Тесты для метрик пула соединений"""
+
+    def test_observe_checkout_buckets(self):
+        """Тест распределения времени выдачи соединения по корзинам"""
+        metrics = PoolMetrics()
+        metrics.observe_checkout(0.0005)
+        metrics.observe_checkout(0.02)
+        metrics.observe_checkout(10)
+        assert metrics.checkout_buckets[0] == 1
+        assert metrics.checkout_buckets[CHECKOUT_LATENCY_BUCKETS_MS.index(25)] == 1
+        assert metrics.checkout_buckets[-1] == 1
+        assert metrics.checkout_seconds_max == 10
+
+
+class TestMetricsRoutes:
+    """Тесты для внутреннего эндпоинта метрик"""
+
+    def test_get_metrics(self, client, test_admin_user):
+        """Тест получения метрик пула, хеширования и кэша"""
+        response = client.get("/internal/metrics", headers=get_auth_headers(client, "admin", "password"))
+        assert response.status_code == 200
+        data = response.json()
+        assert "checked_out" in data["db_pool"]
+        assert "timeouts" in data["db_pool"]
+        assert "checkout_latency_ms_buckets" in data["db_pool"]
+        assert "password_hashing" in data
+        assert "principal_cache" in data
+
+    def test_get_metrics_with_token(self, client, test_manager_user, monkeypatch):
+        """Тест защиты метрик токеном и закрытого доступа без него"""
+        assert client.get("/internal/metrics").status_code == 403
+        assert client.get("/internal/metrics", headers={"X-Metrics-Token": ""}).status_code == 403
+        assert client.get("/internal/metrics", headers=get_auth_headers(client, "manager", "password")).status_code == 403
+
+        monkeypatch.setattr(sys.modules["back.metrics.metrics_routes"], "METRICS_TOKEN", "secret")
+        assert client.get("/internal/metrics").status_code == 403
+        assert client.get("/internal/metrics", headers={"X-Metrics-Token": "wrong"}).status_code == 403
+        assert client.get("/internal/metrics", headers={"X-Metrics-Token": "secret"}).status_code == 200
+
+
+class TestQueryInstrumentation:
+    """Тесты для учёта SQL-запросов в рамках HTTP-запроса"""
+
+    def test_nested_tracking(self):
+        """Тест передачи запросов во внешний счётчик"""
+        with track_queries() as outer:
+            with track_queries() as inner:
+                inner.record("SELECT 1", 2.0)
+                inner.record("SELECT 1", 1.0)
+            outer.record("SELECT 2", 1.0)
+        assert inner.count == 2
+        assert outer.count == 3
+        assert outer.time_ms == 4.0
+        assert outer.most_repeated() == ("SELECT 1", 2)
+        assert QueryStats().most_repeated() == ("", 0)
+
+    def test_timing_headers(self, client, test_admin_user):
+        """Тест заголовков с числом и временем запросов к БД"""
+        response = client.post("/auth/token", data={"username": "admin", "password": "password"})
+        assert response.status_code == 200
+        assert int(response.headers["X-DB-Queries"]) >= 1
+        assert float(response.headers["X-DB-Time-ms"]) >= 0
+        assert response.headers["Server-Timing"].startswith("db;dur=")
+
+    def test_over_budget_logged(self, client, test_admin_user, monkeypatch, caplog):
+        """Тест записи в лог запроса, превысившего бюджет"""
+        queries = sys.modules["back.metrics.queries"]
+        monkeypatch.setattr(queries, "DB_QUERY_BUDGET", 0)
+        over_budget = queries.query_metrics.over_budget
+        with caplog.at_level(logging.WARNING, logger="back.metrics.queries"):
+            client.post("/auth/token", data={"username": "admin", "password": "password"})
+        assert queries.query_metrics.over_budget == over_budget + 1
+        assert "POST /auth/token" in caplog.text
+        metrics = client.get("/internal/metrics", headers=get_auth_headers(client, "admin", "password")).json()
+        assert metrics["sql"]["over_budget"] >= 1
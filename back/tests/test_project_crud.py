@@ -55,6 +55,21 @@ class TestProjectCRUD:
         assert data[0]["id"] == test_project.id
         assert data[0]["name"] == test_project.name
     
+    def test_get_my_projects_cursor_pagination(self, client, db_session, test_manager_user, test_company, test_project):
+        """Тест постраничной выдачи проектов по курсору"""
+        from back.models import Project
+        db_session.add_all([Project(name=f"Project {i}", company_id=test_company.id) for i in range(2)])
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
+        response = client.get("/project/my-projects?limit=2", headers=headers)
+        assert [p["name"] for p in response.json()] == ["Test Project", "Project 0"]
+        
+        response = client.get(f"/project/my-projects?limit=2&cursor={response.headers['X-Next-Cursor']}", headers=headers)
+        assert [p["name"] for p in response.json()] == ["Project 1"]
+        assert "X-Next-Cursor" not in response.headers
+        for query in ("limit=-1", "limit=0", "limit=1001", "skip=-1"):
+            assert client.get(f"/project/my-projects?{query}", headers=headers).status_code == 422
+    
     def test_get_my_project_success(self, client, test_manager_user, test_project):
         """Тест получения конкретного проекта"""
         headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
@@ -128,4 +143,113 @@ class TestProjectCRUD:
         assert response.status_code == 400
         assert "не может быть пустым" in response.json()["detail"]
 
+    def test_add_and_remove_engineers_query_budget(self, client, test_manager_user, test_project, test_engineer_user, assert_max_queries):
+        """Тест числа запросов добавления и удаления инженеров: права и данные проверяются одним запросом"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
+        client.get("/auth/users/me/", headers=headers)
+        engineers_data = {"engineer_ids": [test_engineer_user.id]}
+
+        with assert_max_queries(3):
+            response = client.post(f"/project/{test_project.id}/engineers", json=engineers_data, headers=headers)
+        assert response.status_code == 200
+        response = client.post(f"/project/{test_project.id}/engineers", json=engineers_data, headers=headers)
+        assert response.status_code == 400
+        assert "уже добавлены" in response.json()["detail"]
+
+        with assert_max_queries(3):
+            response = client.request("DELETE", f"/project/{test_project.id}/engineers", json=engineers_data, headers=headers)
+        assert response.status_code == 200
+        assert [eng["username"] for eng in response.json()["removed_engineers"]] == [test_engineer_user.username]
+        assert response.json()["remaining_engineers"] == []
+
+
+    
+    def test_get_my_projects_with_defects(self, client, test_manager_user, test_project, test_defect):
+        """Тест выдачи проектов вместе с дефектами"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
+        response = client.get("/project/my-projects", headers=headers)
+        assert response.status_code == 200
+        project = response.json()[0]
+        assert project["manager_id"] == test_manager_user.id
+        assert project["defects"][0]["engineer_id"] == test_defect.user_engineer_id
+    
+    def test_get_my_projects_cache_invalidated_by_delete(self, client, test_manager_user, test_project):
+        """Тест сброса кэша проектов компании при удалении проекта"""
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
+        assert len(client.get("/project/my-projects", headers=headers).json()) == 1
+        client.delete(f"/project/{test_project.id}", headers=headers)
+        assert client.get("/project/my-projects", headers=headers).json() == []
+    
+    def test_get_my_projects_filters_and_sort(self, client, db_session, test_manager_user, test_company, test_engineer_user, test_project):
+        """Тест фильтров по менеджеру, инженеру и префиксу названия и сортировки"""
+        from back.models import Project
+        db_session.add(Project(name="Жилой дом", company_id=test_company.id))
+        staffed = Project(name="Торговый центр", company_id=test_company.id, user_manager_id=test_manager_user.id)
+        staffed.engineers.append(test_engineer_user)
+        db_session.add(staffed)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
+
+        def names(**params):
+            return [project["name"] for project in client.get("/project/my-projects", params=params, headers=headers).json()]
+
+        assert names(sort="-name") == ["Торговый центр", "Жилой дом", "Test Project"]
+        assert names(manager_id=test_manager_user.id) == ["Test Project", "Торговый центр"]
+        assert names(engineer_id=test_engineer_user.id) == ["Торговый центр"]
+        assert names(name_prefix="Жил") == ["Жилой дом"]
+        assert client.get("/project/my-projects", params={"sort": "created"}, headers=headers).status_code == 422
+
+    def test_get_my_projects_query_budget(self, client, db_session, test_manager_user, test_company, test_engineer_user, assert_max_queries):
+        """Тест числа запросов списка проектов, не зависящего от числа проектов и дефектов"""
+        from back.models import Project, Defect
+        for i in range(10):
+            project = Project(name=f"Project {i}", company_id=test_company.id, user_manager_id=test_manager_user.id)
+            project.engineers.append(test_engineer_user)
+            project.defects.append(Defect(name=f"Defect {i}", user_engineer_id=test_engineer_user.id))
+            db_session.add(project)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {client.post('/auth/token', data={'username': 'manager', 'password': 'password'}).json()['access_token']}"}
+        client.get("/auth/users/me/", headers=headers)
+        
+        with assert_max_queries(4):
+            response = client.get("/project/my-projects", headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()) == 10
+
+    @pytest.mark.asyncio
+    async def test_project_access_with_targets_and_team(self, db_session, test_company, test_manager_user, assert_max_queries):
+        """Тест загрузки целей и команды проекта вместе: без произведения строк, команда вторым запросом"""
+        from back.auth.authorization import AuthorizationContext
+        from back.auth.principal_cache import Principal
+        from back.models import Project, User, UserRole
+        from back.tests.conftest import AsyncTestingSessionLocal
+        engineers = [
+            User(username=f"eng{i}", email=f"eng{i}@test.com", hashed_password="x", role=UserRole.ENGINEER, company_id=test_company.id)
+            for i in range(4)
+        ]
+        project = Project(name="Команда", company_id=test_company.id, user_manager_id=test_manager_user.id, engineers=engineers[:3])
+        db_session.add_all([project, engineers[3]])
+        db_session.commit()
+        target_ids = [engineers[0].id, engineers[1].id, engineers[3].id]
+
+        async with AsyncTestingSessionLocal() as db:
+            row_counts = []
+            execute = db.execute
+
+            async def counting_execute(statement, *args, **kwargs):
+                result = (await execute(statement, *args, **kwargs)).freeze()
+                row_counts.append(len(result.data))
+                return result()
+
+            db.execute = counting_execute
+            context = AuthorizationContext(db, Principal.from_user(test_manager_user))
+            with assert_max_queries(2):
+                access = await context.project(project.id, target_ids, UserRole.ENGINEER, with_engineers=True)
+
+        # Строка на цель и строка на инженера команды, а не цели × команда
+        assert row_counts == [len(target_ids), 3]
 
+        assert sorted(access.targets) == sorted(target_ids)
+        assert access.linked_target_ids == {engineers[0].id, engineers[1].id}
+        assert [engineer.id for engineer in access.engineers] == [engineer.id for engineer in engineers[:3]]
+        assert access.manager.id == test_manager_user.id
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from back.cache import FakeCacheBackend, read_cache
+from back.database import ReadRouter, ReadTarget, read_session_factory
+from back.tests.conftest import ASYNC_SQLALCHEMY_DATABASE_URL
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(read_cache, "backend", FakeCacheBackend())
+    engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+    broken = create_async_engine("sqlite+aiosqlite:///./missing/replica.db")
+    replicas = [
+        ReadTarget("replica0", read_session_factory(engine)),
+        ReadTarget("replica1", read_session_factory(engine)),
+        ReadTarget("broken", read_session_factory(broken)),
+    ]
+    return ReadRouter(read_session_factory(engine), replicas, sticky_seconds=5, retry_seconds=30)
+
+
+async def read(router, namespaces=()):
+    async with router.session(namespaces) as db:
+        assert (await db.execute(text("SELECT 1"))).scalar() == 1
+
+
+class TestReadRouter:
+    """Тесты для распределения чтения по репликам"""
+
+    @pytest.mark.asyncio
+    async def test_round_robin_skips_unavailable_replica(self, router):
+        """Тест выбора реплик по кругу и пропуска недоступной"""
+        for _ in range(6):
+            await read(router)
+
+        stats = router.stats()
+        assert stats["targets"]["broken"]["failures"] == 1
+        assert stats["targets"]["broken"]["down"] is True
+        assert stats["targets"]["replica0"]["reads"] + stats["targets"]["replica1"]["reads"] == 6
+        assert stats["targets"]["replica0"]["reads"] >= 2
+        assert stats["targets"]["replica1"]["reads"] >= 2
+        assert stats["targets"]["primary"]["reads"] == 0
+        assert stats["fallbacks"] == 1
+
+    @pytest.mark.asyncio
+    async def test_all_replicas_down_fall_back_to_primary(self, router):
+        """Тест чтения из основной БД, когда реплики недоступны"""
+        for replica in router.replicas:
+            replica.down_until = float("inf")
+        await read(router)
+        assert router.stats()["targets"]["primary"]["reads"] == 1
+
+    @pytest.mark.asyncio
+    async def test_read_your_writes_window(self, router):
+        """Тест закрепления чтения за основной БД после записи в компанию"""
+        await router.mark_written({1})
+
+        await read(router, ["company:1"])
+        await read(router, ["companies"])
+        assert router.stats()["targets"]["primary"]["reads"] == 2
+        assert router.sticky_reads == 2
+
+        await read(router, ["company:2"])
+        assert router.stats()["targets"]["primary"]["reads"] == 2
+
+
+class TestReadRoutes:
+    """Тесты для маршрутов, читающих через сессии только для чтения"""
+
+    def test_company_snapshot_reads_through_router(self, client, test_admin_user, test_company, test_project):
+        """Тест чтения снимка компании и его потока NDJSON через распределитель чтения"""
+        from back.database import read_router
+        from back.tests.conftest import get_auth_headers
+
+        headers = get_auth_headers(client, "admin", "password")
+        url = f"/company/my-companies?company_id={test_company.id}"
+        reads = read_router.primary.reads
+        assert client.get(f"{url}&consistent=1", headers=headers).status_code == 200
+        assert read_router.primary.reads == reads + 1
+
+        streamed = client.get(f"{url}&stream=true", headers=headers)
+        assert streamed.status_code == 200
+        assert '"type":"project"' in streamed.text
+        # Сессия маршрута и отдельная сессия потока
+        assert read_router.primary.reads == reads + 3
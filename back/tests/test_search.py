@@ -0,0 +1,70 @@
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from back.models import Company, Defect, Project
+from back.search.search_index import levenshtein, postgres_search_query
+from back.tests.conftest import get_auth_headers
+
+
+def search(client, headers, q, **params):
+    response = client.get("/search", params={"q": q, **params}, headers=headers)
+    assert response.status_code == 200
+    return [(hit["kind"], hit["name"]) for hit in response.json()]
+
+
+class TestSearch:
+    """Тесты для поиска по дефектам и проектам компании"""
+
+    def test_search_prefix_typo_and_scope(self, client, db_session, test_company, test_manager_user, test_project):
+        """Тест поиска по префиксу, с опечаткой и только в своей компании"""
+        other = Company(name="Other")
+        db_session.add(other)
+        db_session.flush()
+        foreign = Project(name="Чужой объект", company_id=other.id)
+        foreign.defects.append(Defect(name="Трещина в фасаде"))
+        db_session.add(foreign)
+        test_project.defects.extend([
+            Defect(name="Трещина в стяжке"),
+            Defect(name="Протечка кровли"),
+            Defect(name="Откос окна не заделан"),
+        ])
+        db_session.commit()
+        headers = get_auth_headers(client, "manager", "password")
+
+        assert search(client, headers, "трещ") == [("defect", "Трещина в стяжке")]
+        assert search(client, headers, "ПРОТЕЧКА кровли") == [("defect", "Протечка кровли")]
+        assert search(client, headers, "откас") == [("defect", "Откос окна не заделан")]
+        assert search(client, headers, "test", kind="project") == [("project", "Test Project")]
+        assert search(client, headers, "test", kind="defect") == []
+        assert search(client, headers, "фасад") == []
+
+    def test_search_index_follows_writes(self, client, db_session, test_manager_user, test_engineer_user, test_project):
+        """Тест обновления индекса при создании, переименовании и удалении"""
+        engineer_headers = get_auth_headers(client, "engineer", "password")
+        client.post("/defect/bulk", json={"defects": [{"name": "Скол плитки", "project_id": test_project.id}]}, headers=engineer_headers)
+        headers = get_auth_headers(client, "manager", "password")
+        assert search(client, headers, "скол") == [("defect", "Скол плитки")]
+
+        defect = db_session.query(Defect).filter_by(name="Скол плитки").one()
+        defect.name = "Отслоение штукатурки"
+        db_session.commit()
+        assert search(client, headers, "скол") == []
+        assert search(client, headers, "штукатурка") == [("defect", "Отслоение штукатурки")]
+
+        client.delete(f"/project/{test_project.id}", headers=headers)
+        assert search(client, headers, "отслоение") == []
+
+    def test_search_validation(self, client, test_manager_user, test_engineer_user_without_company):
+        """Тест проверки запроса и пользователя без компании"""
+        headers = get_auth_headers(client, "manager", "password")
+        assert client.get("/search", params={"q": "a"}, headers=headers).status_code == 422
+        assert client.get("/search", params={"q": "!!"}, headers=headers).json() == []
+        headers = get_auth_headers(client, "engineer1", "password")
+        assert client.get("/search", params={"q": "трещина"}, headers=headers).status_code == 403
+
+    def test_postgres_query_uses_search_indexes(self):
+        """Тест выражений запроса PostgreSQL, совпадающих с GIN-индексами"""
+        sql = str(postgres_search_query(1, "трещ", ["трещ"], ("defect", "project"), 20).compile(dialect=asyncpg.dialect()))
+        assert sql.count("to_tsvector('russian'::regconfig, defects.name)") == 2
+        assert "defects.name %> " in sql and "projects.name %> " in sql
+        assert levenshtein("откас", "откос", 1) == 1
+        assert levenshtein("откас", "стяжке", 1) == 2
@@ -0,0 +1,32 @@
+import pytest
+
+from back import serve
+
+
+class TestServeProfiles:
+    """Тесты выбора команды запуска по профилю"""
+
+    def test_production_uses_gunicorn_with_uvicorn_workers(self):
+        """Тест продакшен-профиля: gunicorn с конфигурацией из back.gunicorn_conf"""
+        args = serve.command("production")
+        assert args[1:4] == ["-m", "gunicorn", "-c"]
+        assert "python:back.gunicorn_conf" in args
+        assert "--reload" not in args
+
+    def test_development_keeps_reload(self):
+        """Тест профиля разработки: один процесс uvicorn с перезагрузкой"""
+        args = serve.command("development")
+        assert args[1:3] == ["-m", "uvicorn"]
+        assert "--reload" in args
+
+    def test_unknown_profile(self):
+        """Тест неизвестного профиля"""
+        with pytest.raises(SystemExit):
+            serve.command("staging")
+
+    def test_several_workers_require_shared_backends(self):
+        """Тест отказа запуска нескольких воркеров с кэшем и лентой в памяти процесса"""
+        with pytest.raises(SystemExit, match="READ_CACHE_BACKEND"):
+            serve.check_shared_backends(4, {"READ_CACHE_BACKEND": "local", "CHANGE_FEED_BACKEND": "redis"})
+        serve.check_shared_backends(1, {"READ_CACHE_BACKEND": "local", "CHANGE_FEED_BACKEND": "local"})
+        serve.check_shared_backends(4, {"READ_CACHE_BACKEND": "redis", "CHANGE_FEED_BACKEND": "redis"})
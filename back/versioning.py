@@ -0,0 +1,146 @@
+"""Версии компаний для условных GET и снимков, поколения кэша чтения.
+
+Слушатели сессии собирают компании, чьи данные изменил flush. Перед коммитом их
+версия в companies.version повышается в той же транзакции, а после коммита
+TrackedAsyncSession повышает поколения кэша чтения (back.cache). Версия из БД общая
+для всех воркеров и не начинается заново при их перезапуске, поэтому ETag на ней
+не совпадёт со старым тегом. Она входит в слабый ETag: клиент с актуальным тегом
+получает 304 без загрузки и сериализации данных.
+Записи в обход TrackedAsyncSession (миграции, служебные скрипты) версии не меняют.
+"""
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import bindparam, event, inspect, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from back.database import COMMITTED_COMPANIES_KEY, PENDING_COMPANIES_KEY, TrackedSession
+from back.models import Company, Defect, Project, User
+
+
+def _values(obj, attribute: str) -> set:
+    """Текущее и прежнее (до flush) значение атрибута."""
+    history = inspect(obj).attrs[attribute].history
+    return {value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None}
+
+
+def _resolve_loaded(session, model, ids: set, company_ids: set) -> set:
+    """Берёт company_id уже загруженных объектов из identity map; возвращает ненайденные id."""
+    missing = set()
+    for row_id in ids:
+        obj = session.identity_map.get(identity_key(model, row_id))
+        if obj is not None and "company_id" in obj.__dict__:
+            company_ids.add(obj.__dict__["company_id"])
+        else:
+            missing.add(row_id)
+    return missing
+
+
+@event.listens_for(TrackedSession, "after_flush")
+def collect_changed_companies(session, flush_context):
+    company_ids, project_ids, user_ids = set(), set(), set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Company):
+            company_ids.add(obj.id)
+        elif isinstance(obj, User):
+            company_ids |= _values(obj, "company_id")
+        elif isinstance(obj, Project):
+            # Изменения projects_engineers помечают проект изменённым через коллекцию engineers
+            company_ids |= _values(obj, "company_id")
+            user_ids |= _values(obj, "user_manager_id")
+        elif isinstance(obj, Defect):
+            project_ids |= _values(obj, "project_id")
+            user_ids |= _values(obj, "user_engineer_id")
+
+    # Контекст авторизации обычно уже загрузил проект и пользователей, запрос не нужен
+    project_ids = _resolve_loaded(session, Project, project_ids, company_ids)
+    user_ids = _resolve_loaded(session, User, user_ids, company_ids)
+    connection = session.connection()
+    if project_ids:
+        company_ids.update(connection.execute(
+            select(Project.company_id).where(Project.id.in_(project_ids))
+        ).scalars())
+    if user_ids:
+        company_ids.update(connection.execute(
+            select(User.company_id).where(User.id.in_(user_ids))
+        ).scalars())
+
+    company_ids.discard(None)
+    if company_ids:
+        session.info.setdefault(PENDING_COMPANIES_KEY, set()).update(company_ids)
+
+
+def mark_companies_changed(session, *company_ids: int | None):
+    """Для записей в обход unit of work (bulk INSERT/UPDATE), которые after_flush не видит."""
+    company_ids = {company_id for company_id in company_ids if company_id is not None}
+    if company_ids:
+        session.sync_session.info.setdefault(PENDING_COMPANIES_KEY, set()).update(company_ids)
+
+
+@event.listens_for(TrackedSession, "before_commit")
+def bump_company_versions(session):
+    # Коммит сбрасывает изменения после before_commit; их компании нужны здесь
+    session.flush()
+    company_ids = sorted(session.info.get(PENDING_COMPANIES_KEY, ()))
+    if not company_ids:
+        return
+    table = Company.__table__
+    # Строки блокируются в порядке id, параллельные коммиты не ждут друг друга по кругу
+    session.connection().execute(
+        update(table).where(table.c.id == bindparam("company_id")).values(version=table.c.version + 1),
+        [{"company_id": company_id} for company_id in company_ids],
+    )
+    for company_id in company_ids:
+        company = session.identity_map.get(identity_key(Company, company_id))
+        if company is not None and "version" in company.__dict__:
+            set_committed_value(company, "version", company.__dict__["version"] + 1)
+
+
+@event.listens_for(TrackedSession, "after_commit")
+def move_committed_companies(session):
+    pending = session.info.pop(PENDING_COMPANIES_KEY, None)
+    if pending:
+        session.info.setdefault(COMMITTED_COMPANIES_KEY, set()).update(pending)
+
+
+@event.listens_for(TrackedSession, "after_soft_rollback")
+def drop_pending_companies(session, previous_transaction):
+    session.info.pop(PENDING_COMPANIES_KEY, None)
+
+
+def version_etag(company_id: int, version: int, variant: str) -> str:
+    digest = hashlib.blake2b(variant.encode(), digest_size=6).hexdigest()
+    return f'W/"{company_id}-{version}-{digest}"'
+
+
+async def company_version(db, company_id: int) -> int | None:
+    """Текущая версия данных компании; None, если компании нет."""
+    return await db.scalar(select(Company.version).where(Company.id == company_id))
+
+
+async def company_etag(db, company_id: int | None, variant: str) -> str | None:
+    """Слабый ETag ответа, зависящего только от данных компании и параметров variant."""
+    if company_id is None:
+        return None
+    version = await company_version(db, company_id)
+    if version is None:
+        return None
+    return version_etag(company_id, version, variant)
+
+
+def etag_matches(request: Request, etag: str | None) -> bool:
+    if etag is None:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match сравнивается слабо: префикс W/ не учитывается
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -120,9 +120,9 @@ export const projectAPI = {
     return response.data;
   },
 
-  // Получение проектов менеджера
-  getMyProjects: async (skip = 0, limit = 100) => {
-    const response = await api.get(`/project/my-projects?skip=${skip}&limit=${limit}`);
+  // Получение проектов менеджера; filters: manager_id, engineer_id, name_prefix, sort (id, -id, name, -name)
+  getMyProjects: async (skip = 0, limit = 100, filters = {}) => {
+    const response = await api.get('/project/my-projects', { params: { skip, limit, ...filters } });
     return response.data;
   },
 
@@ -176,9 +176,9 @@ export const defectAPI = {
     return response.data;
   },
 
-  // Получение дефектов инженера
-  getMyDefects: async (skip = 0, limit = 100) => {
-    const response = await api.get(`/defect/my-defects?skip=${skip}&limit=${limit}`);
+  // Получение дефектов инженера; filters: project_id, name_prefix, sort (id, -id, name, -name)
+  getMyDefects: async (skip = 0, limit = 100, filters = {}) => {
+    const response = await api.get('/defect/my-defects', { params: { skip, limit, ...filters } });
     return response.data;
   },
 
@@ -203,4 +203,47 @@ export const defectAPI = {
   },
 };
 
+export const feedAPI = {
+  // Подписка на ленту изменений компании по WebSocket; возвращает функцию отписки.
+  // onEvent получает события вида { id, type, company_id, data }; type === 'reset'
+  // означает, что часть событий потеряна и списки нужно перечитать целиком.
+  subscribe: (onEvent, companyId = null) => {
+    let socket = null;
+    let lastEventId = null;
+    let stopped = false;
+
+    const connect = async () => {
+      // В строку запроса WebSocket идёт одноразовый билет, а не токен доступа
+      let ticket;
+      try {
+        ({ ticket } = (await api.post('/feed/ticket')).data);
+      } catch (error) {
+        if (!stopped && error.response?.status !== 403) setTimeout(connect, 3000);
+        return;
+      }
+      if (stopped) return;
+      const params = new URLSearchParams({ ticket });
+      if (companyId !== null) params.set('company_id', companyId);
+      if (lastEventId !== null) params.set('last_event_id', lastEventId);
+      socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/feed/ws?${params}`);
+      socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === 'ping') return;
+        if (event.id) lastEventId = event.id;
+        onEvent(event);
+      };
+      socket.onclose = (close) => {
+        // 1008 - нет доступа к ленте или его отозвали, переподключение не поможет
+        if (!stopped && close.code !== 1008) setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      socket?.close();
+    };
+  },
+};
+
 export default api;